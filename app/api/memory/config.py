@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.schemas.memory import (
     APIResponse
 )
 from app.core.config import settings
-from app.services.memory import MemoryManager
+from app.services.memory import AsyncMemoryManager
 
 router = APIRouter()
 
@@ -14,15 +14,15 @@ router = APIRouter()
 @router.get("/app/config", response_model=APIResponse)
 async def get_app_config(
     app_name: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取应用配置，可以获取单个应用配置或所有应用配置"""
     try:
-        memory_manager = MemoryManager(db)
+        memory_manager = AsyncMemoryManager(db)
         
         if app_name:
             # 获取单个应用配置
-            app_config = memory_manager.get_or_create_app_config(app_name)
+            app_config = await memory_manager.get_or_create_app_config(app_name)
             
             return APIResponse(
                 success=True,
@@ -35,14 +35,16 @@ async def get_app_config(
                     "max_summary_length": app_config.max_summary_length,
                     "enable_auto_summarize": app_config.enable_auto_summarize,
                     "enable_element_extraction": app_config.enable_element_extraction,
+                    "enable_combined_extraction": app_config.enable_combined_extraction,
+                    "enable_hybrid_search": app_config.enable_hybrid_search,
+                    "embedding_dimension": app_config.embedding_dimension,
                     "similarity_threshold": app_config.similarity_threshold,
                     "priority_weights": app_config.priority_weights
                 }
             )
         else:
             # 获取所有应用配置
-            from app.models import AppConfig
-            all_app_configs = db.query(AppConfig).all()
+            all_app_configs = await memory_manager.get_all_app_configs()
             
             # 构建结果
             app_configs_list = []
@@ -55,6 +57,9 @@ async def get_app_config(
                     "max_summary_length": config.max_summary_length,
                     "enable_auto_summarize": config.enable_auto_summarize,
                     "enable_element_extraction": config.enable_element_extraction,
+                    "enable_combined_extraction": config.enable_combined_extraction,
+                    "enable_hybrid_search": config.enable_hybrid_search,
+                    "embedding_dimension": config.embedding_dimension,
                     "similarity_threshold": config.similarity_threshold,
                     "priority_weights": config.priority_weights
                 })
@@ -75,14 +80,23 @@ async def get_app_config(
 async def update_app_config(
     app_name: str,
     config_data: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新应用配置"""
+    embedding_dimension = config_data.get("embedding_dimension")
+    if embedding_dimension is not None and not (
+        isinstance(embedding_dimension, int) and 0 < embedding_dimension <= settings.embedding.dimension
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"embedding_dimension must be between 1 and {settings.embedding.dimension}"
+        )
+    
     try:
-        memory_manager = MemoryManager(db)
+        memory_manager = AsyncMemoryManager(db)
         
         # 更新应用配置
-        app_config = memory_manager.update_app_config(app_name, **config_data)
+        app_config = await memory_manager.update_app_config(app_name, **config_data)
         
         return APIResponse(
             success=True,
@@ -95,6 +109,9 @@ async def update_app_config(
                 "max_summary_length": app_config.max_summary_length,
                 "enable_auto_summarize": app_config.enable_auto_summarize,
                 "enable_element_extraction": app_config.enable_element_extraction,
+                "enable_combined_extraction": app_config.enable_combined_extraction,
+                "enable_hybrid_search": app_config.enable_hybrid_search,
+                "embedding_dimension": app_config.embedding_dimension,
                 "similarity_threshold": app_config.similarity_threshold,
                 "priority_weights": app_config.priority_weights
             }
@@ -1,16 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app.core.logging import get_logger
 
-from app.db.session import get_db
+from app.core.config import settings
+from app.db.session import get_db, get_async_db
+from app.models import IngestionJob
 from app.schemas.memory import (
     ChatHistoryCreate,
+    ChatHistoryBatchCreate,
     MemoryQuery,
+    MemoryBatchQuery,
     MemoryQueryResult,
     APIResponse
 )
-from app.services.memory import MemoryManager
+from app.services.ingestion import IngestionQueue
+from app.services.memory import AsyncMemoryManager, MemoryEmbeddingBackfill
 
 router = APIRouter()
 
@@ -18,87 +24,133 @@ router = APIRouter()
 logger = get_logger(__name__)
 
 
-def process_chat_history_background(
+def serialize_job(job: IngestionJob) -> dict:
+    """将记忆生成任务转换为响应数据"""
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "memory_id": job.memory_id,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None
+    }
+
+
+@router.post("/submit", response_model=APIResponse)
+def submit_chat_history(
     chat_history: ChatHistoryCreate,
-    db: Session,
-    memory_id: str
+    db: Session = Depends(get_db)
 ):
-    """后台处理聊天历史，生成记忆"""
+    """异步提交聊天历史，生成记忆
+    
+    聊天历史写入持久化任务队列后立即返回，由后台工作线程生成记忆，
+    可通过 GET /submit/{job_id} 查询处理状态。任务队列基于同步会话，
+    因此该接口定义为普通函数，由FastAPI在线程池中执行，不阻塞事件循环。
+    """
     try:
-        logger.info(f"Processing chat history for memory_id: {memory_id}")
-        
-        memory_manager = MemoryManager(db)
+        job = IngestionQueue(db).enqueue(chat_history)
         
-        # 存储聊天历史
-        memory_manager.store_chat_history(
-            user_id=chat_history.user_id,
-            app_name=chat_history.app_name,
-            messages=chat_history.messages
+        return APIResponse(
+            success=True,
+            message="Chat history submitted successfully, memory is being generated in background",
+            data={"job_id": job.job_id, "status": job.status}
         )
-        
-        # 生成记忆内容
-        memory_content = memory_manager.generate_memory_content(chat_history.messages)
-        
-        # 创建记忆，设置is_summary为True，避免重复总结
-        memory = memory_manager.create_memory(
-            user_id=chat_history.user_id,
-            app_name=chat_history.app_name,
-            memory_content=memory_content,
-            is_summary=True
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to submit chat history: {str(e)}"
         )
+
+
+@router.post("/submit/batch", response_model=APIResponse)
+def submit_chat_history_batch(
+    batch: ChatHistoryBatchCreate,
+    db: Session = Depends(get_db)
+):
+    """批量异步提交聊天历史，生成记忆"""
+    if len(batch.chat_histories) > settings.memory.max_batch_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch size {len(batch.chat_histories)} exceeds limit {settings.memory.max_batch_size}"
+        )
+    
+    try:
+        jobs = IngestionQueue(db).enqueue_many(batch.chat_histories)
         
-        logger.info(f"Memory generated successfully for memory_id: {memory_id}, actual memory_id: {memory.id}")
+        return APIResponse(
+            success=True,
+            message="Chat history batch submitted successfully, memories are being generated in background",
+            data={"job_ids": [job.job_id for job in jobs], "count": len(jobs)}
+        )
     except Exception as e:
-        logger.error(f"Failed to process chat history for memory_id: {memory_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to submit chat history batch: {str(e)}"
+        )
 
 
-@router.post("/submit", response_model=APIResponse)
-async def submit_chat_history(
-    chat_history: ChatHistoryCreate,
-    background_tasks: BackgroundTasks,
+@router.get("/submit/{job_id}", response_model=APIResponse)
+def get_submit_status(
+    job_id: str,
     db: Session = Depends(get_db)
 ):
-    """异步提交聊天历史，生成记忆"""
+    """查询记忆生成任务的处理状态"""
     try:
-        # 生成唯一的记忆ID，用于异步处理
-        import uuid
-        memory_id = str(uuid.uuid4())
+        job = IngestionQueue(db).get_job(job_id)
         
-        # 立即返回响应，不阻塞
-        background_tasks.add_task(
-            process_chat_history_background,
-            chat_history, 
-            db, 
-            memory_id
-        )
+        if not job:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Job with id {job_id} not found"
+            )
         
         return APIResponse(
             success=True,
-            message="Chat history submitted successfully, memory is being generated in background",
-            data={"memory_id": memory_id}
+            message="Job status retrieved successfully",
+            data=serialize_job(job)
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to submit chat history: {str(e)}"
+            detail=f"Failed to get job status: {str(e)}"
+        )
+
+
+@router.get("/embedding/backlog", response_model=APIResponse)
+def get_embedding_backlog(db: Session = Depends(get_db)):
+    """查询等待补写Embedding的记忆积压情况"""
+    try:
+        return APIResponse(
+            success=True,
+            message="Embedding backlog retrieved successfully",
+            data=MemoryEmbeddingBackfill.get_backlog(db)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get embedding backlog: {str(e)}"
         )
 
 
 @router.post("/query", response_model=APIResponse)
 async def query_memory(
     memory_query: MemoryQuery,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """根据查询内容获取相似记忆"""
     try:
-        memory_manager = MemoryManager(db)
+        memory_manager = AsyncMemoryManager(db)
         
         # 查询记忆
-        results = memory_manager.query_memories(
+        results = await memory_manager.query_memories(
             user_id=memory_query.user_id,
             app_name=memory_query.app_name,
             query=memory_query.query,
-            top_k=memory_query.top_k
+            top_k=memory_query.top_k,
+            filters=memory_query.build_filters()
         )
         
         # 转换为Schema格式
@@ -125,17 +177,71 @@ async def query_memory(
         )
 
 
+@router.post("/query/batch", response_model=APIResponse)
+async def query_memory_batch(
+    batch_query: MemoryBatchQuery,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """批量查询相似记忆
+    
+    所有查询内容的Embedding在一次请求中生成，向量检索合并执行，适用于一轮对话需要多次查询记忆的场景。
+    """
+    if len(batch_query.queries) > settings.memory.max_query_batch_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch size {len(batch_query.queries)} exceeds limit {settings.memory.max_query_batch_size}"
+        )
+    
+    try:
+        memory_manager = AsyncMemoryManager(db)
+        
+        # 批量查询记忆
+        batch_results = await memory_manager.query_memories_batch(
+            [
+                (memory_query.user_id, memory_query.app_name, memory_query.query, memory_query.top_k)
+                for memory_query in batch_query.queries
+            ],
+            [memory_query.build_filters() for memory_query in batch_query.queries]
+        )
+        
+        # 转换为Schema格式，与查询列表顺序一致
+        memory_results = [
+            [
+                MemoryQueryResult(
+                    memory_id=result["memory_id"],
+                    memory_content=result["memory_content"],
+                    extracted_elements=result["extracted_elements"],
+                    similarity=result["similarity"],
+                    created_at=result["created_at"]
+                )
+                for result in results
+            ]
+            for results in batch_results
+        ]
+        
+        return APIResponse(
+            success=True,
+            message="Memory batch queried successfully",
+            data={"results": memory_results}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to query memory batch: {str(e)}"
+        )
+
+
 @router.delete("/{memory_id}", response_model=APIResponse)
 async def delete_memory(
     memory_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """删除指定记忆"""
     try:
-        memory_manager = MemoryManager(db)
+        memory_manager = AsyncMemoryManager(db)
         
         # 删除记忆
-        success = memory_manager.delete_memory(memory_id)
+        success = await memory_manager.delete_memory(memory_id)
         
         if not success:
             raise HTTPException(
@@ -160,14 +266,14 @@ async def delete_memory(
 async def get_memories_list(
     user_id: str,
     app_name: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取用户在特定应用下的所有记忆列表"""
     try:
-        memory_manager = MemoryManager(db)
+        memory_manager = AsyncMemoryManager(db)
         
         # 获取记忆列表
-        memories = memory_manager.get_memories_by_user_app(user_id, app_name)
+        memories = await memory_manager.get_memories_by_user_app(user_id, app_name)
         
         # 构建结果
         memory_list = []
@@ -199,7 +305,7 @@ async def get_chat_history(
     user_id: str,
     app_name: str,
     session_id: str = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取聊天历史记录
     
@@ -209,10 +315,10 @@ async def get_chat_history(
         session_id: 会话ID（可选）
     """
     try:
-        memory_manager = MemoryManager(db)
+        memory_manager = AsyncMemoryManager(db)
         
         # 获取聊天历史
-        chat_history = memory_manager.get_chat_history(
+        chat_history = await memory_manager.get_chat_history(
             user_id=user_id,
             app_name=app_name,
             session_id=session_id
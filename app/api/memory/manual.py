@@ -1,18 +1,37 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from typing import List
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.models import UserMemory, AppConfig
 from app.schemas.memory import APIResponse
+from app.core.container import service_container
+from app.core.logging import get_logger
 
 router = APIRouter()
+logger = get_logger(__name__)
+
+
+async def sync_vector_metadata(memory: UserMemory) -> None:
+    """同步记忆在向量存储中用于过滤的元数据
+
+    同步失败只记录日志，查询结果加载时仍会按数据库字段再检查过滤条件。
+    """
+    vector_store = service_container.vector_store
+    try:
+        await asyncio.to_thread(
+            vector_store.update_metadata, [memory.id], [vector_store.memory_metadata(memory)], [memory.user_id], [memory.app_name]
+        )
+    except Exception as e:
+        logger.warning(f"Failed to sync vector metadata for memory {memory.id}: {e}")
 
 
 @router.put("/archive", response_model=APIResponse)
 async def archive_memory(
     memory_id: int = Query(..., description="记忆ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """归档记忆
     
@@ -20,7 +39,7 @@ async def archive_memory(
     """
     try:
         # 获取记忆
-        memory = db.query(UserMemory).filter(UserMemory.id == memory_id).first()
+        memory = (await db.execute(select(UserMemory).where(UserMemory.id == memory_id))).scalars().first()
         if not memory:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -30,8 +49,9 @@ async def archive_memory(
         # 更新记忆状态为归档
         memory.is_archived = True
         memory.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(memory)
+        await db.commit()
+        await db.refresh(memory)
+        await sync_vector_metadata(memory)
         
         return APIResponse(
             success=True,
@@ -53,7 +73,7 @@ async def archive_memory(
 @router.put("/unarchive", response_model=APIResponse)
 async def unarchive_memory(
     memory_id: int = Query(..., description="记忆ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """取消归档记忆
     
@@ -61,7 +81,7 @@ async def unarchive_memory(
     """
     try:
         # 获取记忆
-        memory = db.query(UserMemory).filter(UserMemory.id == memory_id).first()
+        memory = (await db.execute(select(UserMemory).where(UserMemory.id == memory_id))).scalars().first()
         if not memory:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -71,8 +91,9 @@ async def unarchive_memory(
         # 更新记忆状态为未归档
         memory.is_archived = False
         memory.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(memory)
+        await db.commit()
+        await db.refresh(memory)
+        await sync_vector_metadata(memory)
         
         return APIResponse(
             success=True,
@@ -95,7 +116,7 @@ async def unarchive_memory(
 async def update_memory_priority(
     memory_id: int = Query(..., description="记忆ID"),
     priority_level: int = Query(..., description="新的优先级级别", ge=1, le=5),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新记忆优先级
     
@@ -112,7 +133,7 @@ async def update_memory_priority(
             )
         
         # 获取记忆
-        memory = db.query(UserMemory).filter(UserMemory.id == memory_id).first()
+        memory = (await db.execute(select(UserMemory).where(UserMemory.id == memory_id))).scalars().first()
         if not memory:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -122,8 +143,9 @@ async def update_memory_priority(
         # 更新优先级
         memory.memory_priority = priority_level
         memory.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(memory)
+        await db.commit()
+        await db.refresh(memory)
+        await sync_vector_metadata(memory)
         
         return APIResponse(
             success=True,
@@ -146,7 +168,7 @@ async def update_memory_priority(
 async def update_memory_tags(
     memory_id: int = Query(..., description="记忆ID"),
     tags: List[str] = Query(..., description="标签列表"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新记忆标签
     
@@ -156,7 +178,7 @@ async def update_memory_tags(
     """
     try:
         # 获取记忆
-        memory = db.query(UserMemory).filter(UserMemory.id == memory_id).first()
+        memory = (await db.execute(select(UserMemory).where(UserMemory.id == memory_id))).scalars().first()
         if not memory:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -166,8 +188,9 @@ async def update_memory_tags(
         # 更新标签
         memory.memory_tags = tags
         memory.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(memory)
+        await db.commit()
+        await db.refresh(memory)
+        await sync_vector_metadata(memory)
         
         return APIResponse(
             success=True,
@@ -189,7 +212,7 @@ async def update_memory_tags(
 @router.get("/score/{memory_id}", response_model=APIResponse)
 async def get_memory_score(
     memory_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取记忆的评分信息
     
@@ -198,7 +221,7 @@ async def get_memory_score(
     """
     try:
         # 获取记忆
-        memory = db.query(UserMemory).filter(UserMemory.id == memory_id).first()
+        memory = (await db.execute(select(UserMemory).where(UserMemory.id == memory_id))).scalars().first()
         if not memory:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -206,7 +229,7 @@ async def get_memory_score(
             )
         
         # 获取应用配置
-        app_config = db.query(AppConfig).filter(AppConfig.app_name == memory.app_name).first()
+        app_config = (await db.execute(select(AppConfig).where(AppConfig.app_name == memory.app_name))).scalars().first()
         
         if not app_config:
             raise HTTPException(
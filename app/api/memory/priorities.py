@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.models import MemoryPriority
 from app.schemas.memory import (
     MemoryPriorityCreate,
@@ -16,16 +17,17 @@ router = APIRouter()
 @router.post("/priorities", response_model=APIResponse)
 async def create_memory_priority(
     priority: MemoryPriorityCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """创建记忆优先级"""
     try:
         # 检查是否已存在相同的内容类型优先级
-        existing_priority = db.query(MemoryPriority).filter(
+        result = await db.execute(select(MemoryPriority).where(
             MemoryPriority.user_id == priority.user_id,
             MemoryPriority.app_name == priority.app_name,
             MemoryPriority.content_type == priority.content_type
-        ).first()
+        ))
+        existing_priority = result.scalars().first()
         
         if existing_priority:
             raise HTTPException(
@@ -43,8 +45,8 @@ async def create_memory_priority(
         )
         
         db.add(new_priority)
-        db.commit()
-        db.refresh(new_priority)
+        await db.commit()
+        await db.refresh(new_priority)
         
         # 转换为Schema格式
         priority_response = MemoryPriorityResponse.model_validate(new_priority)
@@ -67,19 +69,19 @@ async def create_memory_priority(
 async def get_memory_priorities(
     user_id: Optional[str] = None,
     app_name: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取记忆优先级列表"""
     try:
         # 构建查询
-        query = db.query(MemoryPriority)
+        query = select(MemoryPriority)
         
         if user_id:
-            query = query.filter(MemoryPriority.user_id == user_id)
+            query = query.where(MemoryPriority.user_id == user_id)
         if app_name:
-            query = query.filter(MemoryPriority.app_name == app_name)
+            query = query.where(MemoryPriority.app_name == app_name)
         
-        priorities = query.all()
+        priorities = (await db.execute(query)).scalars().all()
         
         # 转换为Schema格式
         priority_responses = [MemoryPriorityResponse.model_validate(priority) for priority in priorities]
@@ -99,13 +101,14 @@ async def get_memory_priorities(
 @router.get("/priorities/{priority_id}", response_model=APIResponse)
 async def get_memory_priority(
     priority_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取单个记忆优先级"""
     try:
-        priority = db.query(MemoryPriority).filter(
+        result = await db.execute(select(MemoryPriority).where(
             MemoryPriority.id == priority_id
-        ).first()
+        ))
+        priority = result.scalars().first()
         
         if not priority:
             raise HTTPException(
@@ -134,13 +137,14 @@ async def get_memory_priority(
 async def update_memory_priority(
     priority_id: int,
     priority_update: MemoryPriorityUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新记忆优先级"""
     try:
-        priority = db.query(MemoryPriority).filter(
+        result = await db.execute(select(MemoryPriority).where(
             MemoryPriority.id == priority_id
-        ).first()
+        ))
+        priority = result.scalars().first()
         
         if not priority:
             raise HTTPException(
@@ -154,8 +158,8 @@ async def update_memory_priority(
         if priority_update.description is not None:
             priority.description = priority_update.description
         
-        db.commit()
-        db.refresh(priority)
+        await db.commit()
+        await db.refresh(priority)
         
         # 转换为Schema格式
         priority_response = MemoryPriorityResponse.model_validate(priority)
@@ -177,13 +181,14 @@ async def update_memory_priority(
 @router.delete("/priorities/{priority_id}", response_model=APIResponse)
 async def delete_memory_priority(
     priority_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """删除记忆优先级"""
     try:
-        priority = db.query(MemoryPriority).filter(
+        result = await db.execute(select(MemoryPriority).where(
             MemoryPriority.id == priority_id
-        ).first()
+        ))
+        priority = result.scalars().first()
         
         if not priority:
             raise HTTPException(
@@ -191,8 +196,8 @@ async def delete_memory_priority(
                 detail=f"Priority with id {priority_id} not found"
             )
         
-        db.delete(priority)
-        db.commit()
+        await db.delete(priority)
+        await db.commit()
         
         return APIResponse(
             success=True,
@@ -30,6 +30,7 @@ class LLMConfig(BaseSettings):
 
 class EmbeddingConfig(BaseSettings):
     """嵌入服务配置"""
+    provider: str = Field(default="openai", env="EMBEDDING_PROVIDER")  # Embedding服务：openai（OpenAI兼容接口）, local（本地离线哈希n-gram向量）
     model: str = Field(default="embedding-3", env="EMBEDDING_MODEL")
     api_key: str = Field(default="", env="EMBEDDING_API_KEY")
     base_url: Optional[str] = Field(default="https://open.bigmodel.cn/api/paas/v4/", env="EMBEDDING_BASE_URL")
@@ -37,6 +38,13 @@ class EmbeddingConfig(BaseSettings):
     max_retries: int = Field(default=3, env="EMBEDDING_MAX_RETRIES")
     dimension: int = Field(default=1536, env="EMBEDDING_DIMENSION")
     normalize: bool = Field(default=True, env="EMBEDDING_NORMALIZE")
+    storage_dtype: str = Field(default="float16", env="EMBEDDING_STORAGE_DTYPE")  # 记忆表中保存向量的精度：float16, float32
+    batch_wait_ms: float = Field(default=5, env="EMBEDDING_BATCH_WAIT_MS")  # 并发的单条和小批量Embedding请求合并发送前最多等待的毫秒数，0表示不合并
+    max_batch_size: int = Field(default=64, env="EMBEDDING_MAX_BATCH_SIZE")  # 每次合并请求包含的最大文本数
+    request_batch_size: int = Field(default=64, env="EMBEDDING_REQUEST_BATCH_SIZE")  # 批量生成时每个接口请求的最大文本数
+    request_max_tokens: int = Field(default=8000, env="EMBEDDING_REQUEST_MAX_TOKENS")  # 批量生成时每个接口请求的最大估算token数
+    request_concurrency: int = Field(default=4, env="EMBEDDING_REQUEST_CONCURRENCY")  # 批量生成时同时进行的接口请求数
+    local_model_path: str = Field(default="./data/local_embedding.npz", env="EMBEDDING_LOCAL_MODEL_PATH")  # local服务的SVD投影模型文件，不存在时直接使用哈希向量
 
 
 class ChromaConfig(BaseSettings):
@@ -47,12 +55,37 @@ class ChromaConfig(BaseSettings):
     timeout: int = Field(default=30, env="CHROMA_TIMEOUT")
     persist_directory: Optional[str] = Field(default="./data/chroma_data", env="CHROMA_PERSIST_DIRECTORY")
     use_persistent_client: bool = Field(default=False, env="CHROMA_USE_PERSISTENT_CLIENT")
+    partition_strategy: str = Field(default="none", env="CHROMA_PARTITION_STRATEGY")  # 集合分区策略：none（单一集合）, app（按应用）, user_bucket（按用户哈希分桶）
+    partition_buckets: int = Field(default=16, env="CHROMA_PARTITION_BUCKETS")  # user_bucket策略的分桶数
+
+
+class VectorStoreConfig(BaseSettings):
+    """向量存储配置"""
+    backend: str = Field(default="chroma", env="VECTOR_STORE_BACKEND")  # 向量存储后端：chroma, numpy
+    numpy_directory: str = Field(default="./data/vector_index", env="VECTOR_STORE_NUMPY_DIRECTORY")  # numpy后端的数据目录
+    quantization: str = Field(default="none", env="VECTOR_STORE_QUANTIZATION")  # numpy后端的向量量化方式：none, int8
+    rescore_factor: int = Field(default=4, env="VECTOR_STORE_RESCORE_FACTOR")  # 量化粗排的候选数为top_k的倍数，候选再用float32向量精确重排
+    store_float32: bool = Field(default=True, env="VECTOR_STORE_STORE_FLOAT32")  # int8量化时是否保留float32向量用于精确重排，关闭后只保存int8编码，磁盘约为1/4
+    shared_embeddings: bool = Field(default=False, env="VECTOR_STORE_SHARED_EMBEDDINGS")  # 同一用户和应用下内容相同或近似的记忆是否共用一条向量
+    shared_similarity_threshold: float = Field(default=0.95, env="VECTOR_STORE_SHARED_SIMILARITY_THRESHOLD")  # 批量写入时与已有向量的余弦相似度不低于该值则共用
 
 
 class SchedulerConfig(BaseSettings):
     """定时任务配置"""
     merge_interval_minutes: int = Field(default=60, env="MERGE_INTERVAL_MINUTES")
     cleanup_interval_minutes: int = Field(default=1440, env="CLEANUP_INTERVAL_MINUTES")
+    access_flush_interval_seconds: int = Field(default=30, env="ACCESS_FLUSH_INTERVAL_SECONDS")  # 记忆访问时间批量写回间隔（秒）
+    embedding_backfill_interval_seconds: int = Field(default=60, env="EMBEDDING_BACKFILL_INTERVAL_SECONDS")  # 补写Embedding生成失败的记忆的间隔（秒）
+
+
+class IngestionConfig(BaseSettings):
+    """记忆生成任务队列配置"""
+    worker_count: int = Field(default=2, env="INGESTION_WORKER_COUNT")  # 每个进程的工作线程数
+    batch_size: int = Field(default=20, env="INGESTION_BATCH_SIZE")  # 每次领取的任务数
+    poll_interval_seconds: float = Field(default=1.0, env="INGESTION_POLL_INTERVAL_SECONDS")  # 队列为空时的轮询间隔
+    max_attempts: int = Field(default=3, env="INGESTION_MAX_ATTEMPTS")  # 单个任务最大尝试次数
+    stale_timeout_seconds: int = Field(default=600, env="INGESTION_STALE_TIMEOUT_SECONDS")  # 处理中任务超过该时间未刷新领取时间视为失联，重新入队
+    heartbeat_interval_seconds: float = Field(default=60, env="INGESTION_HEARTBEAT_INTERVAL_SECONDS")  # 处理中的批次刷新领取时间的间隔，需小于stale_timeout_seconds
 
 
 class MemoryConfig(BaseSettings):
@@ -68,7 +101,17 @@ class MemoryConfig(BaseSettings):
     max_memories_per_app: int = Field(default=500, env="MAX_MEMORIES_PER_APP")
     embedding_cache_ttl: int = Field(default=604800, env="EMBEDDING_CACHE_TTL")  # 7天
     llm_cache_ttl: int = Field(default=604800, env="LLM_CACHE_TTL")  # 7天
-    
+    bulk_llm_chunk_size: int = Field(default=10, env="BULK_LLM_CHUNK_SIZE")  # 批量处理时每次LLM调用包含的对话/记忆数
+    max_batch_size: int = Field(default=500, env="MAX_BATCH_SIZE")  # 批量提交接口单次最多包含的聊天历史数
+    max_query_batch_size: int = Field(default=20, env="MAX_QUERY_BATCH_SIZE")  # 批量查询接口单次最多包含的查询数
+    hybrid_rrf_k: int = Field(default=60, env="HYBRID_RRF_K")  # 混合检索倒数排名融合（RRF）的平滑常数
+    hybrid_candidate_factor: int = Field(default=2, env="HYBRID_CANDIDATE_FACTOR")  # 混合检索时每一路召回top_k的倍数
+    consolidation_mode: str = Field(default="rolling", env="CONSOLIDATION_MODE")  # 相似记忆合并方式：rolling（滚动总结+Embedding质心）, append（直接拼接）
+    consolidation_max_length: int = Field(default=1000, env="CONSOLIDATION_MAX_LENGTH")  # rolling模式下记忆内容的最大长度
+    embedding_backfill_batch_size: int = Field(default=64, env="EMBEDDING_BACKFILL_BATCH_SIZE")  # 补写Embedding时每批的记忆数
+    embedding_retry_base_seconds: int = Field(default=60, env="EMBEDDING_RETRY_BASE_SECONDS")  # 补写失败后的首次重试间隔（秒），之后每次失败翻倍
+    embedding_retry_max_seconds: int = Field(default=3600, env="EMBEDDING_RETRY_MAX_SECONDS")  # 补写重试间隔的上限（秒）
+
     class PriorityWeights(BaseSettings):
         """优先级权重配置"""
         content_length: float = Field(default=0.3, env="PRIORITY_WEIGHT_CONTENT_LENGTH")
@@ -78,6 +121,14 @@ class MemoryConfig(BaseSettings):
     priority_weights: PriorityWeights = PriorityWeights()
 
 
+class CacheConfig(BaseSettings):
+    """缓存配置"""
+    max_size: int = Field(default=2000, env="CACHE_MAX_SIZE")  # 每个进程内缓存（L1）的最大条目数
+    l2_backend: str = Field(default="sqlite", env="CACHE_L2_BACKEND")  # 二级缓存：sqlite（本地文件，多个工作进程共享）, none（只使用进程内缓存）
+    l2_path: str = Field(default="./data/cache.db", env="CACHE_L2_PATH")  # sqlite二级缓存的数据库文件路径
+    l2_max_entries: int = Field(default=100000, env="CACHE_L2_MAX_ENTRIES")  # sqlite二级缓存的最大条目数，超过时按最近访问时间淘汰，0表示不限制
+
+
 class LoggingConfig(BaseSettings):
     """日志配置"""
     level: str = Field(default="INFO", env="LOG_LEVEL")
@@ -95,8 +146,11 @@ class Settings(BaseSettings):
     llm: LLMConfig = LLMConfig()
     embedding: EmbeddingConfig = EmbeddingConfig()
     chroma: ChromaConfig = ChromaConfig()
+    vector_store: VectorStoreConfig = VectorStoreConfig()
     scheduler: SchedulerConfig = SchedulerConfig()
+    ingestion: IngestionConfig = IngestionConfig()
     memory: MemoryConfig = MemoryConfig()
+    cache: CacheConfig = CacheConfig()
     logging: LoggingConfig = LoggingConfig()
     timezone: str = Field(default="Asia/Shanghai", env="TIMEZONE")
     
@@ -0,0 +1,86 @@
+import threading
+from typing import Optional
+
+from app.services.embedding import EmbeddingService, EmbeddingServiceFactory, BatchingEmbeddingService
+from app.services.llm import LLMService, LLMServiceFactory
+from app.services.vector_store import VectorStore, VectorStoreFactory, SharedEmbeddingStore
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class ServiceContainer:
+    """进程级服务容器
+
+    持有长期存活的大模型、Embedding服务和向量存储，所有请求和后台任务共享同一组实例，
+    复用其HTTP连接池和向量存储句柄，而不是在每次创建MemoryManager时重新构建。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._embedding_service: Optional[EmbeddingService] = None
+        self._llm_service: Optional[LLMService] = None
+        self._vector_store: Optional[VectorStore] = None
+
+    @property
+    def embedding_service(self) -> EmbeddingService:
+        """获取共享的Embedding服务，服务类型由embedding.provider配置，embedding.batch_wait_ms大于0时包装为合并并发请求的服务"""
+        if self._embedding_service is None:
+            with self._lock:
+                if self._embedding_service is None:
+                    embedding_service = EmbeddingServiceFactory.get_embedding_service(settings.embedding.provider)
+                    # 本地服务计算很快，合并请求只会增加等待时间
+                    if settings.embedding.batch_wait_ms > 0 and settings.embedding.provider != "local":
+                        embedding_service = BatchingEmbeddingService(embedding_service)
+                    self._embedding_service = embedding_service
+        return self._embedding_service
+
+    @property
+    def llm_service(self) -> LLMService:
+        """获取共享的大模型服务"""
+        if self._llm_service is None:
+            with self._lock:
+                if self._llm_service is None:
+                    self._llm_service = LLMServiceFactory.get_llm_service()
+        return self._llm_service
+
+    @property
+    def vector_store(self) -> VectorStore:
+        """获取共享的向量存储，后端由vector_store.backend配置，开启vector_store.shared_embeddings时包装为共享向量存储"""
+        if self._vector_store is None:
+            with self._lock:
+                if self._vector_store is None:
+                    vector_store = VectorStoreFactory.get_vector_store(settings.vector_store.backend)
+                    if settings.vector_store.shared_embeddings:
+                        vector_store = SharedEmbeddingStore(vector_store)
+                    self._vector_store = vector_store
+        return self._vector_store
+
+    def startup(self) -> None:
+        """预先初始化所有服务，避免首个请求承担初始化开销"""
+        logger.info("Initializing service container...")
+        self.embedding_service
+        self.llm_service
+        self.vector_store
+        logger.info("Service container initialized successfully.")
+
+    async def shutdown(self) -> None:
+        """关闭所有服务持有的连接"""
+        with self._lock:
+            embedding_service, self._embedding_service = self._embedding_service, None
+            llm_service, self._llm_service = self._llm_service, None
+            self._vector_store = None
+
+        for service in (embedding_service, llm_service):
+            if service is None:
+                continue
+            try:
+                await service.aclose()
+            except Exception as e:
+                logger.warning(f"Failed to close {type(service).__name__}: {e}")
+        logger.info("Service container shut down.")
+
+
+# 初始化服务容器实例
+service_container = ServiceContainer()
@@ -0,0 +1,159 @@
+import threading
+from typing import List, Optional
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models import IngestionJob
+from app.services.ingestion import IngestionQueue, ClaimExpiredError
+from app.services.memory import MemoryManager
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class IngestionWorkerPool:
+    """记忆生成工作线程池，从持久化任务队列中批量领取任务并生成记忆"""
+
+    def __init__(self):
+        self.config = settings.ingestion
+        self.is_running = False
+        self.threads: List[threading.Thread] = []
+        self._stop_event = threading.Event()
+
+    def process_jobs(self, db: Session, jobs: List[IngestionJob], claim_token: Optional[str] = None) -> None:
+        """处理一批已领取的任务
+
+        整批任务合并为一次批量记忆生成，新记忆与任务的完成状态在同一事务中提交，
+        重试或重新入队的任务不会重复创建记忆；整批失败时逐个重试，避免单个异常任务拖垮同批的其他任务。
+        领取已过期时任务已归其他工作线程，直接放弃整批，不再逐个重试。
+
+        Args:
+            db: 数据库会话
+            jobs: 已领取的任务列表
+            claim_token: 领取批次标识，为空时使用任务上的标识
+        """
+        queue = IngestionQueue(db)
+        claim_token = claim_token or jobs[0].claim_token
+        try:
+            # 提交会使任务对象过期，先读取后续需要的字段
+            finished = [(job.id, job.memory_id) for job in jobs if job.memory_id is not None]
+            pending = [job for job in jobs if job.memory_id is None]
+            job_ids = [job.id for job in pending]
+            session_ids = [job.job_id for job in pending]
+            chat_histories = [queue.to_chat_history(job) for job in pending]
+
+            # 之前的尝试已写入记忆的任务直接标记完成
+            if finished:
+                queue.mark_completed([job_id for job_id, _ in finished], [memory_id for _, memory_id in finished], claim_token)
+                db.commit()
+
+            if pending:
+                memory_manager = MemoryManager(db)
+                # 使用任务ID作为会话ID，任务重试时替换而不是重复写入聊天记录
+                memory_manager.create_memories_bulk(
+                    chat_histories,
+                    session_ids=session_ids,
+                    before_commit=lambda memories: queue.mark_completed(
+                        job_ids, [memory.id if memory is not None else None for memory in memories], claim_token
+                    )
+                )
+            logger.info(f"Processed {len(jobs)} ingestion jobs")
+        except Exception as e:
+            db.rollback()
+            if isinstance(e, ClaimExpiredError):
+                logger.warning(f"Abandoning batch of {len(jobs)} ingestion jobs: {e}")
+                return
+            if len(jobs) > 1:
+                logger.warning(f"Failed to process batch of {len(jobs)} ingestion jobs, retrying individually: {e}")
+                for job in jobs:
+                    self.process_jobs(db, [job], claim_token)
+                return
+            logger.error(f"Failed to process ingestion job {jobs[0].job_id}: {e}")
+            queue.mark_failed([jobs[0].id], str(e), claim_token)
+
+    def heartbeat(self, claim_token: str, stop_event: threading.Event) -> None:
+        """批次处理期间定期刷新领取时间，直到stop_event被设置
+
+        Args:
+            claim_token: 领取批次标识
+            stop_event: 批次处理结束的事件
+        """
+        while not stop_event.wait(self.config.heartbeat_interval_seconds):
+            db = SessionLocal()
+            try:
+                IngestionQueue(db).heartbeat(claim_token)
+            except Exception as e:
+                logger.warning(f"Failed to refresh claim of ingestion batch {claim_token}: {e}")
+            finally:
+                db.close()
+
+    def run_once(self) -> int:
+        """领取并处理一批任务
+
+        Returns:
+            处理的任务数量
+        """
+        db = SessionLocal()
+        try:
+            queue = IngestionQueue(db)
+            # 每次领取前回收失联的任务，积压时失联任务也能重新入队，不必等队列清空
+            queue.requeue_stale()
+            jobs = queue.claim_batch()
+            if not jobs:
+                return 0
+
+            # 批次中的LLM调用可能耗时较长，处理期间持续刷新领取时间
+            claim_token = jobs[0].claim_token
+            stop_event = threading.Event()
+            heartbeat = threading.Thread(target=self.heartbeat, args=(claim_token, stop_event), daemon=True)
+            heartbeat.start()
+            try:
+                self.process_jobs(db, jobs, claim_token)
+            finally:
+                stop_event.set()
+                heartbeat.join()
+            return len(jobs)
+        except Exception as e:
+            logger.error(f"Error running ingestion worker: {str(e)}")
+            return 0
+        finally:
+            db.close()
+
+    def start(self) -> None:
+        """启动工作线程"""
+        if self.is_running:
+            logger.info("Ingestion worker pool is already running.")
+            return
+
+        self.is_running = True
+        self._stop_event.clear()
+        self.threads = []
+        for index in range(self.config.worker_count):
+            thread = threading.Thread(target=self._run_worker, name=f"ingestion-worker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Ingestion worker pool started with {self.config.worker_count} workers.")
+
+    def stop(self) -> None:
+        """停止工作线程，未完成的任务会在重启后重新入队"""
+        if not self.is_running:
+            logger.info("Ingestion worker pool is not running.")
+            return
+
+        self.is_running = False
+        self._stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        logger.info("Ingestion worker pool stopped.")
+
+    def _run_worker(self) -> None:
+        """工作线程主循环"""
+        while not self._stop_event.is_set():
+            processed = self.run_once()
+            if not processed:
+                self._stop_event.wait(self.config.poll_interval_seconds)
+
+
+# 初始化工作线程池实例
+ingestion_worker_pool = IngestionWorkerPool()
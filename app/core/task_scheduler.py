@@ -5,7 +5,7 @@ from typing import Callable
 from sqlalchemy.orm import Session
 
 from app.db.session import SessionLocal
-from app.services.memory import MemoryMerger, MemoryCleanupService
+from app.services.memory import MemoryMerger, MemoryCleanupService, MemoryEmbeddingBackfill, memory_access_tracker
 from app.core.config import settings
 from app.core.logging import get_logger
 from app.utils.timezone import get_local_now
@@ -54,6 +54,28 @@ class TaskScheduler:
         finally:
             db.close()
     
+    def run_access_flush_task(self) -> None:
+        """将查询记录的记忆访问时间批量写回数据库"""
+        db = next(self.get_db())
+        try:
+            flushed = memory_access_tracker.flush(db)
+            if flushed:
+                logger.info(f"Flushed access time for {flushed} memories.")
+        except Exception as e:
+            logger.error(f"Error running access flush task: {str(e)}")
+        finally:
+            db.close()
+    
+    def run_embedding_backfill_task(self) -> None:
+        """为Embedding生成失败的记忆补写向量"""
+        db = next(self.get_db())
+        try:
+            MemoryEmbeddingBackfill(db).run()
+        except Exception as e:
+            logger.error(f"Error running embedding backfill task: {str(e)}")
+        finally:
+            db.close()
+    
     def start(self) -> None:
         """启动定时任务"""
         if self.is_running:
@@ -70,6 +92,16 @@ class TaskScheduler:
         schedule.every(cleanup_interval).minutes.do(self.run_cleanup_task)
         logger.info(f"Scheduled memory cleanup task every {cleanup_interval} minutes.")
         
+        # 设置访问时间写回任务
+        access_flush_interval = settings.scheduler.access_flush_interval_seconds
+        schedule.every(access_flush_interval).seconds.do(self.run_access_flush_task)
+        logger.info(f"Scheduled memory access flush task every {access_flush_interval} seconds.")
+        
+        # 设置Embedding补写任务
+        backfill_interval = settings.scheduler.embedding_backfill_interval_seconds
+        schedule.every(backfill_interval).seconds.do(self.run_embedding_backfill_task)
+        logger.info(f"Scheduled embedding backfill task every {backfill_interval} seconds.")
+        
         # 立即执行一次任务
         self.run_merge_task()
         self.run_cleanup_task()
@@ -89,6 +121,8 @@ class TaskScheduler:
         self.is_running = False
         if self.thread:
             self.thread.join(timeout=5)
+        # 停止前写回尚未持久化的访问时间
+        self.run_access_flush_task()
         logger.info("Task scheduler stopped.")
     
     def _run_scheduler(self) -> None:
@@ -0,0 +1,67 @@
+from typing import List
+from sqlalchemy import inspect, literal, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import Column
+
+from app.db.base import Base
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def column_default_sql(column: Column, engine: Engine) -> str:
+    """生成新增列的默认值子句，已有行按模型的默认值填充
+
+    Args:
+        column: 模型中的列
+        engine: 数据库引擎
+
+    Returns:
+        DEFAULT子句，没有标量默认值时为空字符串
+    """
+    if column.default is not None and column.default.is_scalar:
+        value = literal(column.default.arg, column.type).compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+        return f" DEFAULT {value}"
+    return ""
+
+
+def add_missing_columns(engine: Engine) -> List[str]:
+    """为已有的表补充模型中新增的列和这些列上的索引
+
+    create_all只创建不存在的表，升级后旧数据库缺少新列时所有ORM查询都会失败。
+    新增的非空列必须有标量默认值，已有行按默认值填充。
+
+    Args:
+        engine: 数据库引擎
+
+    Returns:
+        新增的列，格式为"表名.列名"
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            new_columns = [column for column in table.columns if column.name not in existing_columns]
+            for column in new_columns:
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = column_default_sql(column, engine)
+                if not column.nullable and not default:
+                    raise RuntimeError(f"无法为已有表{table.name}新增没有默认值的非空列{column.name}")
+                not_null = " NOT NULL" if not column.nullable else ""
+                connection.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}{not_null}"
+                ))
+                added.append(f"{table.name}.{column.name}")
+
+            new_names = {column.name for column in new_columns}
+            for index in table.indexes:
+                if new_names & {column.name for column in index.columns}:
+                    index.create(bind=connection, checkfirst=True)
+
+    if added:
+        logger.info(f"Added missing database columns: {', '.join(added)}")
+    return added
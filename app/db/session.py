@@ -1,7 +1,30 @@
+from typing import AsyncGenerator
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
 from app.core.config import settings
 
+# 同步驱动到异步驱动的映射
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def get_async_database_url(url: str) -> str:
+    """将同步数据库URL转换为异步驱动URL
+    
+    Args:
+        url: 同步数据库URL
+        
+    Returns:
+        异步数据库URL，已指定驱动的URL保持不变
+    """
+    scheme, separator, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{separator}{rest}"
+
+
 # 创建数据库引擎
 engine = create_engine(
     settings.database.url,
@@ -11,6 +34,12 @@ engine = create_engine(
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 创建异步数据库引擎，供API请求路径使用，避免阻塞事件循环
+async_engine = create_async_engine(get_async_database_url(settings.database.url))
+
+# 创建异步会话工厂
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_db() -> Session:
     """获取数据库会话依赖"""
@@ -19,3 +48,9 @@ def get_db() -> Session:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """获取异步数据库会话依赖"""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -5,9 +6,13 @@ from fastapi.responses import FileResponse
 
 from app.api import api_router
 from app.db.base import Base
-from app.db.session import engine
+from app.db.session import engine, async_engine
+from app.db.migrate import add_missing_columns
 from app.core.config import settings
+from app.core.container import service_container
 from app.core.task_scheduler import task_scheduler
+from app.core.ingestion_worker import ingestion_worker_pool
+from app.services.memory.search import memory_fulltext_index
 from app.core.logging import setup_logging, get_logger
 
 # 初始化日志系统
@@ -17,11 +22,53 @@ logger = get_logger(__name__)
 # 创建数据库表
 logger.info("Creating database tables...")
 Base.metadata.create_all(bind=engine)
+# 升级前创建的表补充新增的列
+add_missing_columns(engine)
 logger.info("Database tables created successfully.")
 
+# 创建记忆内容全文索引，用于向量查询不可用时的降级检索
+memory_fulltext_index.setup(engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时初始化共享服务和后台任务，关闭时依次停止并释放连接"""
+    # 初始化进程级共享服务
+    service_container.startup()
+    
+    # 启动定时任务
+    logger.info("Starting task scheduler...")
+    task_scheduler.start()
+    logger.info("Task scheduler started successfully.")
+    
+    # 启动记忆生成工作线程
+    logger.info("Starting ingestion worker pool...")
+    ingestion_worker_pool.start()
+    logger.info("Ingestion worker pool started successfully.")
+    
+    logger.info(f"Application {settings.app.name} v{settings.app.version} started successfully!")
+    logger.info(f"Using timezone: {settings.timezone}")
+    logger.info(f"LLM Model: {settings.llm.model}")
+    logger.info(f"Embedding Model: {settings.embedding.model}")
+    logger.info(f"Vector Store: {settings.vector_store.backend}")
+    logger.info(f"Chroma Collection: {settings.chroma.collection_name}")
+    
+    yield
+    
+    logger.info("Shutting down application...")
+    task_scheduler.stop()
+    logger.info("Task scheduler stopped.")
+    ingestion_worker_pool.stop()
+    logger.info("Ingestion worker pool stopped.")
+    await service_container.shutdown()
+    await async_engine.dispose()
+    logger.info(f"Application {settings.app.name} v{settings.app.version} shutdown completed!")
+
+
 # 初始化FastAPI应用
 logger.info(f"Initializing FastAPI application: {settings.app.name} v{settings.app.version}")
 app = FastAPI(
+    lifespan=lifespan,
     title=settings.app.name,
     version=settings.app.version,
     description="基于大模型的轻量化记忆系统",
@@ -45,32 +92,8 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 # 包含API路由，添加/api前缀
 app.include_router(api_router, prefix="/api")
 
-# 启动定时任务
-logger.info("Starting task scheduler...")
-task_scheduler.start()
-logger.info("Task scheduler started successfully.")
-
 
 @app.get("/")
 async def root():
     """根路径，返回前端页面"""
     return FileResponse("app/static/index.html")
-
-
-@app.on_event("startup")
-async def startup_event():
-    """应用启动事件"""
-    logger.info(f"Application {settings.app.name} v{settings.app.version} started successfully!")
-    logger.info(f"Using timezone: {settings.timezone}")
-    logger.info(f"LLM Model: {settings.llm.model}")
-    logger.info(f"Embedding Model: {settings.embedding.model}")
-    logger.info(f"Chroma Collection: {settings.chroma.collection_name}")
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """应用关闭事件，停止定时任务"""
-    logger.info("Shutting down application...")
-    task_scheduler.stop()
-    logger.info("Task scheduler stopped.")
-    logger.info(f"Application {settings.app.name} v{settings.app.version} shutdown completed!")
@@ -4,10 +4,15 @@ from app.models.memory import (
     MemoryPriority,
     AppConfig
 )
+from app.models.ingestion import IngestionJob
+from app.models.embedding import SharedEmbedding, MemoryEmbeddingRef
 
 __all__ = [
     "UserMemory",
     "ChatHistory",
     "MemoryPriority",
-    "AppConfig"
+    "AppConfig",
+    "IngestionJob",
+    "SharedEmbedding",
+    "MemoryEmbeddingRef"
 ]
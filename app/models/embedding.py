@@ -0,0 +1,28 @@
+from sqlalchemy import String, ForeignKey, Integer, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+
+
+class SharedEmbedding(Base):
+    """共享向量表，同一用户和应用下内容相同或近似的记忆共用一条向量
+
+    向量存储中以本表的id作为记录ID，记忆通过MemoryEmbeddingRef引用共享向量。
+    """
+    __tablename__ = "shared_embeddings"
+    __table_args__ = (
+        UniqueConstraint("user_id", "app_name", "content_hash", name="uq_shared_embedding_content"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
+    app_name: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)  # 首个写入该向量的内容与向量维度的哈希
+
+
+class MemoryEmbeddingRef(Base):
+    """记忆到共享向量的引用"""
+    __tablename__ = "memory_embedding_refs"
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    memory_id: Mapped[int] = mapped_column(Integer, unique=True, index=True, nullable=False)
+    embedding_id: Mapped[int] = mapped_column(Integer, ForeignKey("shared_embeddings.id"), index=True, nullable=False)
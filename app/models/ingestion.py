@@ -0,0 +1,25 @@
+from sqlalchemy import String, Text, DateTime, JSON, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+from app.db.base import Base
+from typing import Optional
+
+
+class IngestionJob(Base):
+    """记忆生成任务表，持久化/submit提交的聊天历史，由后台工作线程批量领取处理"""
+    __tablename__ = "ingestion_jobs"
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    job_id: Mapped[str] = mapped_column(String(36), unique=True, index=True, nullable=False)
+    user_id: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
+    app_name: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)  # ChatHistoryCreate的JSON表示
+    status: Mapped[str] = mapped_column(String(20), index=True, default="pending", nullable=False)  # 状态：pending, processing, completed, failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # 已尝试次数
+    claim_token: Mapped[Optional[str]] = mapped_column(String(36), index=True, nullable=True)  # 领取批次标识
+    claimed_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    completed_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    memory_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # 生成或更新的记忆ID
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
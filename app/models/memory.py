@@ -42,6 +42,12 @@ class UserMemory(Base):
     expiry_time: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     is_archived: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)  # 是否归档
+    reinforcement_count: Mapped[int] = mapped_column(Integer, default=1, nullable=False)  # 合并到该记忆的内容数，用于计算Embedding加权质心
+    embedding: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)  # 写入向量存储的向量，重建索引时无需重新生成
+    embedding_dtype: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)  # embedding列的数据类型：float16, float32
+    embedding_pending: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False, index=True)  # Embedding生成失败，等待后台补写，补写前不在向量存储中
+    embedding_attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # 补写Embedding失败的次数，用于计算退避时间
+    embedding_retry_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)  # 下次补写Embedding的时间
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
@@ -66,6 +72,9 @@ class AppConfig(Base):
     max_summary_length: Mapped[int] = mapped_column(Integer, default=500, nullable=False)
     enable_auto_summarize: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     enable_element_extraction: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    enable_combined_extraction: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)  # 是否在一次LLM调用中同时完成总结和要素抽取
+    enable_hybrid_search: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)  # 查询时是否同时执行关键词检索和向量检索并融合排序
+    embedding_dimension: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # 应用的Embedding维度，为空时使用embedding.dimension，较小时截断并重新归一化
     similarity_threshold: Mapped[float] = mapped_column(Float, default=0.8, nullable=False)
     priority_weights: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True, default={
         "content_length": 0.3,
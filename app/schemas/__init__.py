@@ -1,10 +1,12 @@
 from app.schemas.memory import (
     ChatMessage,
     ChatHistoryCreate,
+    ChatHistoryBatchCreate,
     ChatHistoryResponse,
     MemoryCreate,
     MemoryResponse,
     MemoryQuery,
+    MemoryBatchQuery,
     MemoryQueryResult,
     APIResponse
 )
@@ -12,10 +14,12 @@ from app.schemas.memory import (
 __all__ = [
     "ChatMessage",
     "ChatHistoryCreate",
+    "ChatHistoryBatchCreate",
     "ChatHistoryResponse",
     "MemoryCreate",
     "MemoryResponse",
     "MemoryQuery",
+    "MemoryBatchQuery",
     "MemoryQueryResult",
     "APIResponse"
 ]
@@ -23,6 +23,11 @@ class ChatHistoryCreate(BaseModel):
     messages: List[ChatMessage] = Field(..., description="聊天消息列表", min_items=1)
 
 
+class ChatHistoryBatchCreate(BaseModel):
+    """聊天历史批量创建Schema"""
+    chat_histories: List[ChatHistoryCreate] = Field(..., description="聊天历史列表", min_items=1)
+
+
 class ChatHistoryResponse(BaseModel):
     """聊天历史响应Schema"""
     id: int
@@ -68,6 +73,26 @@ class MemoryQuery(BaseModel):
     app_name: str = Field(..., description="应用名称", min_length=1)
     query: str = Field(..., description="查询内容", min_length=1)
     top_k: Optional[int] = Field(5, description="返回结果数量", ge=1, le=20)
+    tags: Optional[List[str]] = Field(None, description="只返回包含任一标签的记忆")
+    min_priority: Optional[int] = Field(None, description="最低优先级", ge=1, le=5)
+    max_priority: Optional[int] = Field(None, description="最高优先级", ge=1, le=5)
+    created_after: Optional[datetime] = Field(None, description="只返回此时间之后创建的记忆")
+    created_before: Optional[datetime] = Field(None, description="只返回此时间之前创建的记忆")
+    is_archived: Optional[bool] = Field(None, description="按归档状态过滤，不传时不过滤")
+    
+    def build_filters(self) -> Optional[Dict[str, Any]]:
+        """汇总已设置的过滤条件，没有过滤条件时返回None"""
+        filters = {
+            key: getattr(self, key)
+            for key in ("tags", "min_priority", "max_priority", "created_after", "created_before", "is_archived")
+            if getattr(self, key) is not None
+        }
+        return filters or None
+
+
+class MemoryBatchQuery(BaseModel):
+    """记忆批量查询Schema"""
+    queries: List[MemoryQuery] = Field(..., description="查询列表", min_items=1)
 
 
 class MemoryQueryResult(BaseModel):
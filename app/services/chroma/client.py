@@ -1,15 +1,27 @@
 from typing import List, Dict, Any, Optional
+import hashlib
+import json
+import re
+import threading
+import zlib
 import chromadb
 from chromadb.config import Settings
 from app.core.config import settings
 from app.core.logging import get_logger
+from app.services.vector_store.base import VectorStore
 import os
 
 logger = get_logger(__name__)
 
 
-class ChromaClient:
-    """Chroma客户端服务"""
+class ChromaClient(VectorStore):
+    """Chroma客户端服务
+
+    chroma.partition_strategy不为none时，记忆按应用或按用户哈希分桶写入多个较小的集合，
+    查询只在对应分区内检索，避免在包含所有用户的单一HNSW索引上做元数据后过滤。
+    Chroma集合的向量维度固定，维度不同于embedding.dimension的向量写入带 _d{维度} 后缀的集合。
+    按记忆ID读写时，调用方提供用户和应用即可直接定位分区，只有未提供时才逐个分区查找。
+    """
     
     def __init__(self, 
                  collection_name: Optional[str] = None):
@@ -60,19 +72,165 @@ class ChromaClient:
         
         # 获取或创建集合
         logger.info(f"Getting or creating collection: {self.collection_name}")
-        self.collection = self.client.get_or_create_collection(
-            name=self.collection_name,
-            metadata={"hnsw:space": "cosine"}  # 使用余弦相似度
-        )
+        logger.info(f"Partition strategy: {self.config.partition_strategy}")
+        self._collections_lock = threading.Lock()
+        self._collections: Dict[str, Any] = {}
+        # 已知的集合名称，按需从Chroma加载
+        self._collection_names: Optional[set] = None
+        self.collection = self.get_collection(self.collection_name)
         logger.info(f"ChromaClient initialized successfully")
     
+    def get_collection(self, name: str, create: bool = True):
+        """获取集合，集合句柄在客户端内缓存
+        
+        Args:
+            name: 集合名称
+            create: 集合不存在时是否创建，读取路径应传入False
+            
+        Returns:
+            Chroma集合，create为False且集合不存在时返回None
+        """
+        collection = self._collections.get(name)
+        if collection is None:
+            with self._collections_lock:
+                collection = self._collections.get(name)
+                if collection is None:
+                    if create:
+                        collection = self.client.get_or_create_collection(
+                            name=name,
+                            metadata={"hnsw:space": "cosine"}  # 使用余弦相似度
+                        )
+                    else:
+                        try:
+                            collection = self.client.get_collection(name=name)
+                        except Exception as e:
+                            # 本地客户端抛出ValueError，远程客户端抛出带服务端错误信息的Exception
+                            if "does not exist" not in str(e):
+                                raise
+                            return None
+                    self._collections[name] = collection
+                    if self._collection_names is not None:
+                        self._collection_names.add(name)
+        return collection
+    
+    def collection_names(self, refresh: bool = False) -> set:
+        """获取已存在的集合名称
+        
+        Args:
+            refresh: 是否重新从Chroma加载，其他进程可能创建了新的集合
+            
+        Returns:
+            集合名称集合
+        """
+        if refresh or self._collection_names is None:
+            self._collection_names = {collection.name for collection in self.client.list_collections()}
+        return self._collection_names
+    
+    def partition_name(self, user_id: str, app_name: str, dimension: Optional[int] = None) -> str:
+        """根据分区策略和向量维度计算记忆所在的集合名称
+        
+        Args:
+            user_id: 用户ID
+            app_name: 应用名称
+            dimension: 向量维度，为空或等于embedding.dimension时使用默认集合
+            
+        Returns:
+            集合名称
+        """
+        strategy = self.config.partition_strategy
+        if strategy == "none":
+            name = self.collection_name
+        elif strategy == "app":
+            # 应用名可能包含集合名称不允许的字符，使用哈希
+            name = f"{self.collection_name}_app_{hashlib.sha1(app_name.encode('utf-8')).hexdigest()[:16]}"
+        elif strategy == "user_bucket":
+            bucket = zlib.crc32(user_id.encode("utf-8")) % self.config.partition_buckets
+            name = f"{self.collection_name}_bucket_{bucket}"
+        else:
+            raise ValueError(f"不支持的Chroma分区策略: {strategy}")
+        
+        if dimension and dimension != settings.embedding.dimension:
+            name = f"{name}_d{dimension}"
+        return name
+    
+    def partition_collections(self) -> List[Any]:
+        """获取主集合及所有已存在的分区集合，名称不符合分区命名规则的集合不包含在内"""
+        pattern = re.compile(rf"{re.escape(self.collection_name)}(_app_[0-9a-f]{{16}}|_bucket_\d+)?(_d\d+)?")
+        names = sorted(name for name in self.collection_names(refresh=True) if pattern.fullmatch(name))
+        return [self.get_collection(name) for name in names]
+    
+    def owner_partitions(self, user_id: Optional[str], app_name: Optional[str], refresh: bool = False) -> Optional[List[str]]:
+        """计算用户和应用的记忆可能所在的集合：默认维度的分区及其已存在的其他维度集合
+        
+        Args:
+            user_id: 用户ID
+            app_name: 应用名称
+            refresh: 是否重新加载集合名称
+            
+        Returns:
+            集合名称列表，分区策略需要的字段缺失、无法确定分区时返回None
+        """
+        strategy = self.config.partition_strategy
+        if (strategy == "app" and not app_name) or (strategy == "user_bucket" and not user_id):
+            return None
+        base = self.partition_name(user_id or "", app_name or "")
+        pattern = re.compile(rf"{re.escape(base)}_d\d+")
+        return [base] + sorted(name for name in self.collection_names(refresh) if pattern.fullmatch(name))
+    
+    def locate(self,
+               memory_ids: List[int],
+               user_ids: Optional[List[str]] = None,
+               app_names: Optional[List[str]] = None) -> Dict[str, List[int]]:
+        """查找记忆所在的集合
+        
+        提供用户和应用时只在对应分区内查找，否则逐个查找所有分区集合。
+        
+        Args:
+            memory_ids: 记忆ID列表
+            user_ids: 与记忆ID顺序一致的用户ID列表（可选）
+            app_names: 与记忆ID顺序一致的应用名称列表（可选）
+            
+        Returns:
+            集合名称到记忆ID列表的映射，不存在的记忆不包含在结果中
+        """
+        located: Dict[str, List[int]] = {}
+        
+        def search(names: List[str], remaining: Dict[str, int]) -> None:
+            for name in names:
+                if not remaining:
+                    return
+                collection = self.get_collection(name, create=False)
+                if collection is None:
+                    continue
+                found = collection.get(ids=list(remaining.keys()), include=[])["ids"]
+                if found:
+                    located.setdefault(name, []).extend(remaining.pop(chroma_id) for chroma_id in found)
+        
+        if user_ids is None or app_names is None:
+            search([collection.name for collection in self.partition_collections()],
+                   {f"memory_{memory_id}": memory_id for memory_id in memory_ids})
+            return located
+        
+        grouped: Dict[tuple, Dict[str, int]] = {}
+        for memory_id, user_id, app_name in zip(memory_ids, user_ids, app_names):
+            grouped.setdefault((user_id, app_name), {})[f"memory_{memory_id}"] = memory_id
+        for (user_id, app_name), remaining in grouped.items():
+            names = self.owner_partitions(user_id, app_name)
+            search(names, remaining)
+            if remaining:
+                # 其他进程可能创建了新维度的集合，重新加载集合名称后查找新出现的集合
+                search([name for name in self.owner_partitions(user_id, app_name, refresh=True) if name not in names], remaining)
+        return located
+    
     def add_embedding(self, 
                       embedding: List[float], 
                       document: str, 
                       memory_id: int,
                       user_id: str,
                       app_name: str, 
-                      similarity_threshold: float = 0.95) -> None:
+                      similarity_threshold: float = 0.95,
+                      nearest_results: Optional[List[Dict[str, Any]]] = None,
+                      metadata: Optional[Dict[str, Any]] = None) -> None:
         """添加单个Embedding向量，支持相似Embedding共享
         
         Args:
@@ -82,60 +240,52 @@ class ChromaClient:
             user_id: 用户ID
             app_name: 应用名称
             similarity_threshold: 相似Embedding的阈值，超过此阈值则共享
+            nearest_results: 调用方已用同一向量执行过的query_embeddings结果，提供时不再重复查询
+            metadata: 用于过滤的元数据
         """
-        # 先尝试查找相似的Embedding
-        similar_results = self.collection.query(
-            query_embeddings=[embedding],
-            n_results=1,
-            where={
-                "$and": [
-                    {"user_id": user_id},
-                    {"app_name": app_name}
-                ]
-            }
+        # 复用调用方的最近邻查询结果，没有时再查询相似的Embedding
+        if nearest_results is None:
+            try:
+                nearest_results = self.query_embeddings(
+                    query_embedding=embedding,
+                    user_id=user_id,
+                    app_name=app_name,
+                    top_k=1
+                )
+            except (IndexError, KeyError) as e:
+                # 如果查询结果处理失败，跳过相似检查，直接添加新的Embedding
+                logger.warning(f"Failed to check similar embeddings: {e}")
+                nearest_results = []
+        
+        metadata = dict(
+            metadata or {},
+            memory_id=memory_id,
+            user_id=user_id,
+            app_name=app_name,
+            shared_embedding=False
         )
         
         # 检查是否有相似度超过阈值的Embedding
-        try:
-            if similar_results and similar_results["ids"] and len(similar_results["ids"]) > 0 and len(similar_results["ids"][0]) > 0:
-                similar_id = similar_results["ids"][0][0]
-                similarity = 1 - similar_results["distances"][0][0]  # 转换为相似度
-                
-                if similarity >= similarity_threshold:
-                    # 找到了相似的Embedding，复用它
-                    # 记录Embedding共享关系
-                    logger.info(f"Sharing embedding {similar_id} for memory {memory_id} with similarity {similarity}")
-                    # 这里可以添加一个共享关系的记录，例如存储到数据库
-                    # 目前我们直接添加新的文档引用，共享相同的Embedding
-                    self.collection.add(
-                        embeddings=[embedding],  # 虽然共享，但为了简单，还是添加新的Embedding
-                        documents=[document],
-                        ids=[f"memory_{memory_id}"],
-                        metadatas=[{
-                            "memory_id": memory_id,
-                            "user_id": user_id,
-                            "app_name": app_name,
-                            "shared_embedding": True,
-                            "similarity": similarity,
-                            "original_embedding_id": similar_id
-                        }]
-                    )
-                    return
-        except (IndexError, KeyError) as e:
-            # 如果查询结果处理失败，跳过相似检查，直接添加新的Embedding
-            logger.warning(f"Failed to check similar embeddings: {e}")
+        if nearest_results:
+            similar_id = f"memory_{nearest_results[0]['memory_id']}"
+            similarity = 1 - nearest_results[0]["similarity"]  # 距离转换为相似度
+            
+            if similarity >= similarity_threshold:
+                # 找到了相似的Embedding，记录Embedding共享关系
+                logger.info(f"Sharing embedding {similar_id} for memory {memory_id} with similarity {similarity}")
+                # 此处只记录共享关系，仍写入完整向量；开启vector_store.shared_embeddings时由SharedEmbeddingStore真正共用向量
+                metadata.update({
+                    "shared_embedding": True,
+                    "similarity": similarity,
+                    "original_embedding_id": similar_id
+                })
         
-        # 如果没有找到相似的Embedding，添加新的
-        self.collection.add(
+        # 使用upsert写入，任务重试时不会因ID已存在而失败
+        self.get_collection(self.partition_name(user_id, app_name, len(embedding))).upsert(
             embeddings=[embedding],
             documents=[document],
             ids=[f"memory_{memory_id}"],
-            metadatas=[{
-                "memory_id": memory_id,
-                "user_id": user_id,
-                "app_name": app_name,
-                "shared_embedding": False
-            }]
+            metadatas=[metadata]
         )
     
     def add_embeddings(self, 
@@ -143,8 +293,9 @@ class ChromaClient:
                       documents: List[str], 
                       memory_ids: List[int],
                       user_ids: List[str],
-                      app_names: List[str]) -> None:
-        """添加多个Embedding向量
+                      app_names: List[str],
+                      metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
+        """添加或覆盖多个Embedding向量
         
         Args:
             embeddings: Embedding向量列表
@@ -152,23 +303,32 @@ class ChromaClient:
             memory_ids: 记忆ID列表
             user_ids: 用户ID列表
             app_names: 应用名称列表
+            metadatas: 用于过滤的元数据列表
         """
-        self.collection.add(
-            embeddings=embeddings,
-            documents=documents,
-            ids=[f"memory_{memory_id}" for memory_id in memory_ids],
-            metadatas=[{
-                "memory_id": memory_id,
-                "user_id": user_id,
-                "app_name": app_name
-            } for memory_id, user_id, app_name in zip(memory_ids, user_ids, app_names)]
-        )
+        # 按分区分组，使用upsert写入，重建向量时可覆盖已有记录
+        grouped: Dict[str, List[int]] = {}
+        for position, (user_id, app_name) in enumerate(zip(user_ids, app_names)):
+            grouped.setdefault(self.partition_name(user_id, app_name, len(embeddings[position])), []).append(position)
+        
+        for name, positions in grouped.items():
+            self.get_collection(name).upsert(
+                embeddings=[embeddings[position] for position in positions],
+                documents=[documents[position] for position in positions],
+                ids=[f"memory_{memory_ids[position]}" for position in positions],
+                metadatas=[dict(
+                    metadatas[position] if metadatas else {},
+                    memory_id=memory_ids[position],
+                    user_id=user_ids[position],
+                    app_name=app_names[position]
+                ) for position in positions]
+            )
     
     def query_embeddings(self, 
                         query_embedding: List[float], 
                         user_id: str,
                         app_name: str,
-                        top_k: int = 5) -> List[Dict[str, Any]]:
+                        top_k: int = 5,
+                        filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """查询相似Embedding向量
         
         Args:
@@ -176,29 +336,104 @@ class ChromaClient:
             user_id: 用户ID
             app_name: 应用名称
             top_k: 返回结果数量
+            filters: 元数据过滤条件，转换为where条件在检索时过滤
             
         Returns:
             查询结果列表，每个结果包含memory_id、similarity和document
         """
-        # 使用$and操作符组合多个条件
-        results = self.collection.query(
+        # 只在记忆所在的分区内检索，过滤条件下推到where中；分区尚未创建说明没有记忆
+        collection = self.get_collection(self.partition_name(user_id, app_name, len(query_embedding)), create=False)
+        if collection is None:
+            return []
+        results = collection.query(
             query_embeddings=[query_embedding],
             n_results=top_k,
-            where={
-                "$and": [
-                    {"user_id": user_id},
-                    {"app_name": app_name}
-                ]
-            }
+            where=self.build_where(user_id, app_name, filters)
         )
         
-        # 处理查询结果
+        return self._process_query_results(results, 0, top_k)
+    
+    def build_where(self, user_id: str, app_name: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """构建查询的where条件
+        
+        Args:
+            user_id: 用户ID
+            app_name: 应用名称
+            filters: 元数据过滤条件
+            
+        Returns:
+            使用$and操作符组合的where条件
+        """
+        conditions = [{"user_id": user_id}, {"app_name": app_name}]
+        filters = filters or {}
+        
+        tags = filters.get("tags")
+        if tags:
+            # 包含任一标签即匹配，$or至少需要两个条件
+            tag_conditions = [{f"{self.tag_prefix}{tag}": True} for tag in tags]
+            conditions.append(tag_conditions[0] if len(tag_conditions) == 1 else {"$or": tag_conditions})
+        if filters.get("min_priority") is not None:
+            conditions.append({"memory_priority": {"$gte": filters["min_priority"]}})
+        if filters.get("max_priority") is not None:
+            conditions.append({"memory_priority": {"$lte": filters["max_priority"]}})
+        if filters.get("created_after") is not None:
+            conditions.append({"created_at": {"$gte": self.to_timestamp(filters["created_after"])}})
+        if filters.get("created_before") is not None:
+            conditions.append({"created_at": {"$lte": self.to_timestamp(filters["created_before"])}})
+        if filters.get("is_archived") is not None:
+            conditions.append({"is_archived": filters["is_archived"]})
+        
+        return {"$and": conditions}
+    
+    def query_embeddings_batch(self,
+                               query_embeddings: List[List[float]],
+                               user_ids: List[str],
+                               app_names: List[str],
+                               top_ks: List[int],
+                               filters: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[List[Dict[str, Any]]]:
+        """批量查询相似Embedding向量，同一用户、应用和过滤条件的查询合并为一次Chroma查询
+        
+        Args:
+            query_embeddings: 查询Embedding向量列表
+            user_ids: 用户ID列表
+            app_names: 应用名称列表
+            top_ks: 每个查询的返回结果数量
+            filters: 每个查询的元数据过滤条件
+            
+        Returns:
+            与输入顺序一致的查询结果列表，格式同query_embeddings
+        """
+        filters = filters or [None] * len(query_embeddings)
+        grouped: Dict[tuple, List[int]] = {}
+        for position, (user_id, app_name) in enumerate(zip(user_ids, app_names)):
+            filter_key = json.dumps(filters[position] or {}, sort_keys=True, default=str)
+            grouped.setdefault((user_id, app_name, len(query_embeddings[position]), filter_key), []).append(position)
+        
+        batch_results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+        for (user_id, app_name, dimension, _), positions in grouped.items():
+            collection = self.get_collection(self.partition_name(user_id, app_name, dimension), create=False)
+            if collection is None:
+                continue
+            # Chroma的一次查询只能使用同一个过滤条件，按组内最大的top_k查询后再截断
+            results = collection.query(
+                query_embeddings=[query_embeddings[position] for position in positions],
+                n_results=max(top_ks[position] for position in positions),
+                where=self.build_where(user_id, app_name, filters[positions[0]])
+            )
+            for index, position in enumerate(positions):
+                batch_results[position] = self._process_query_results(results, index, top_ks[position])
+        
+        return batch_results
+    
+    @staticmethod
+    def _process_query_results(results: Dict[str, Any], index: int, top_k: int) -> List[Dict[str, Any]]:
+        """处理Chroma查询结果中第index个查询的结果"""
         processed_results = []
-        for i in range(len(results["ids"][0])):
+        for i in range(min(len(results["ids"][index]), top_k)):
             result = {
-                "memory_id": results["metadatas"][0][i]["memory_id"],
-                "similarity": results["distances"][0][i],
-                "document": results["documents"][0][i]
+                "memory_id": results["metadatas"][index][i]["memory_id"],
+                "similarity": results["distances"][index][i],
+                "document": results["documents"][index][i]
             }
             processed_results.append(result)
         
@@ -219,6 +454,23 @@ class ChromaClient:
             user_id: 新的用户ID
             app_name: 新的应用名称
         """
+        # 用户和应用通常未变化，先在新用户和应用的分区中查找
+        located = self.locate([memory_id], [user_id], [app_name]) if user_id and app_name else {}
+        if not located:
+            located = self.locate([memory_id])
+        if not located:
+            logger.warning(f"Embedding for memory {memory_id} not found, skip update")
+            return
+        self._update_in(self.get_collection(next(iter(located))), memory_id, embedding, document, user_id, app_name)
+    
+    def _update_in(self,
+                   source: Any,
+                   memory_id: int,
+                   embedding: Optional[List[float]] = None,
+                   document: Optional[str] = None,
+                   user_id: Optional[str] = None,
+                   app_name: Optional[str] = None) -> None:
+        """更新source集合中的记忆，分区变化时移动到新的分区"""
         metadata = None
         if user_id or app_name:
             metadata = {}
@@ -227,22 +479,135 @@ class ChromaClient:
             if app_name:
                 metadata["app_name"] = app_name
         
-        self.collection.update(
-            ids=[f"memory_{memory_id}"],
+        chroma_id = f"memory_{memory_id}"
+        if metadata or embedding:
+            existing = source.get(ids=[chroma_id], include=["embeddings", "documents", "metadatas"])
+            merged_metadata = dict(existing["metadatas"][0], **(metadata or {}))
+            dimension = len(embedding or existing["embeddings"][0])
+            target_name = self.partition_name(merged_metadata["user_id"], merged_metadata["app_name"], dimension)
+            if target_name != source.name:
+                # 用户、应用或向量维度变化导致分区变化时，移动到新的分区
+                self.get_collection(target_name).upsert(
+                    ids=[chroma_id],
+                    embeddings=[embedding or existing["embeddings"][0]],
+                    documents=[document or existing["documents"][0]],
+                    metadatas=[merged_metadata]
+                )
+                source.delete(ids=[chroma_id])
+                return
+        
+        source.update(
+            ids=[chroma_id],
             embeddings=[embedding] if embedding else None,
             documents=[document] if document else None,
             metadatas=[metadata] if metadata else None
         )
     
-    def delete_embedding(self, memory_id: int) -> None:
+    def update_embeddings(self,
+                          memory_ids: List[int],
+                          embeddings: List[List[float]],
+                          documents: List[str],
+                          user_ids: Optional[List[str]] = None,
+                          app_names: Optional[List[str]] = None) -> None:
+        """批量更新Embedding向量
+
+        Args:
+            memory_ids: 记忆ID列表
+            embeddings: 新的Embedding向量列表
+            documents: 新的文档内容列表
+            user_ids: 记忆所属的用户ID列表，提供时直接定位分区
+            app_names: 记忆所属的应用名称列表，提供时直接定位分区
+        """
+        positions = {memory_id: position for position, memory_id in enumerate(memory_ids)}
+        for name, located_ids in self.locate(memory_ids, user_ids, app_names).items():
+            results = self.get_collection(name).get(ids=[f"memory_{memory_id}" for memory_id in located_ids], include=["metadatas"])
+            in_place = []
+            for chroma_id, metadata in zip(results["ids"], results["metadatas"]):
+                memory_id = int(chroma_id[len("memory_"):])
+                dimension = len(embeddings[positions[memory_id]])
+                if self.partition_name(metadata["user_id"], metadata["app_name"], dimension) == name:
+                    in_place.append(memory_id)
+                else:
+                    # 应用的向量维度已变化，移动到对应维度的集合
+                    self._update_in(self.get_collection(name), memory_id, embedding=embeddings[positions[memory_id]], document=documents[positions[memory_id]])
+            if in_place:
+                self.get_collection(name).update(
+                    ids=[f"memory_{memory_id}" for memory_id in in_place],
+                    embeddings=[embeddings[positions[memory_id]] for memory_id in in_place],
+                    documents=[documents[positions[memory_id]] for memory_id in in_place]
+                )
+
+    def update_metadata(self,
+                        memory_ids: List[int],
+                        metadatas: List[Dict[str, Any]],
+                        user_ids: Optional[List[str]] = None,
+                        app_names: Optional[List[str]] = None) -> None:
+        """更新记忆用于过滤的元数据
+
+        Args:
+            memory_ids: 记忆ID列表
+            metadatas: memory_metadata生成的完整元数据列表
+            user_ids: 记忆所属的用户ID列表，提供时直接定位分区
+            app_names: 记忆所属的应用名称列表，提供时直接定位分区
+        """
+        positions = {memory_id: position for position, memory_id in enumerate(memory_ids)}
+        for name, located_ids in self.locate(memory_ids, user_ids, app_names).items():
+            collection = self.get_collection(name)
+            chroma_ids = [f"memory_{memory_id}" for memory_id in located_ids]
+            existing = collection.get(ids=chroma_ids, include=["metadatas"])
+            existing_metadatas = dict(zip(existing["ids"], existing["metadatas"]))
+            updated_metadatas = []
+            for chroma_id, memory_id in zip(chroma_ids, located_ids):
+                metadata = dict(metadatas[positions[memory_id]])
+                # Chroma的update只合并字段，已移除的标签置为False
+                for key, value in existing_metadatas.get(chroma_id, {}).items():
+                    if key.startswith(self.tag_prefix) and value and key not in metadata:
+                        metadata[key] = False
+                updated_metadatas.append(metadata)
+            collection.update(ids=chroma_ids, metadatas=updated_metadatas)
+
+    def get_embeddings(self,
+                       memory_ids: List[int],
+                       user_ids: Optional[List[str]] = None,
+                       app_names: Optional[List[str]] = None) -> Dict[int, List[float]]:
+        """批量获取已存储的Embedding向量
+
+        Args:
+            memory_ids: 记忆ID列表
+            user_ids: 记忆所属的用户ID列表，提供时直接定位分区
+            app_names: 记忆所属的应用名称列表，提供时直接定位分区
+
+        Returns:
+            记忆ID到Embedding向量的映射，不存在的记忆不包含在结果中
+        """
+        if not memory_ids:
+            return {}
+
+        embeddings = {}
+        for name, located_ids in self.locate(memory_ids, user_ids, app_names).items():
+            results = self.get_collection(name).get(
+                ids=[f"memory_{memory_id}" for memory_id in located_ids],
+                include=["embeddings"]
+            )
+            embeddings.update({
+                int(chroma_id[len("memory_"):]): list(embedding)
+                for chroma_id, embedding in zip(results["ids"], results["embeddings"] or [])
+            })
+        return embeddings
+
+    def delete_embedding(self, memory_id: int, user_id: Optional[str] = None, app_name: Optional[str] = None) -> None:
         """删除Embedding向量
         
         Args:
             memory_id: 记忆ID
+            user_id: 记忆所属的用户ID，与app_name同时提供时直接定位分区
+            app_name: 记忆所属的应用名称
         """
-        self.collection.delete(
-            ids=[f"memory_{memory_id}"]
-        )
+        owners = ([user_id], [app_name]) if user_id and app_name else (None, None)
+        for name in self.locate([memory_id], *owners):
+            self.get_collection(name).delete(
+                ids=[f"memory_{memory_id}"]
+            )
     
     def delete_embeddings_by_filter(self, user_id: Optional[str] = None, app_name: Optional[str] = None) -> None:
         """根据条件删除Embedding向量
@@ -257,16 +622,72 @@ class ChromaClient:
         if app_name:
             where["app_name"] = app_name
         
+        if len(where) > 1:
+            where = {"$and": [{key: value} for key, value in where.items()]}
+        
         if where:
-            self.collection.delete(
-                where=where
-            )
+            # 能确定分区时只在对应分区中删除
+            names = self.owner_partitions(user_id, app_name, refresh=True)
+            collections = [self.get_collection(name, create=False) for name in names] if names else self.partition_collections()
+            for collection in collections:
+                if collection is not None:
+                    collection.delete(
+                        where=where
+                    )
     
     def reset(self) -> None:
         """重置Chroma客户端，删除所有数据"""
         self.client.reset()
         # 重新创建集合
-        self.collection = self.client.get_or_create_collection(
-            name=self.collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
+        with self._collections_lock:
+            self._collections.clear()
+            self._collection_names = None
+        self.collection = self.get_collection(self.collection_name)
+    
+    def migrate_partitions(self, batch_size: int = 500) -> int:
+        """按当前分区策略迁移已有向量，将不在目标分区中的记录移动到目标集合
+        
+        Args:
+            batch_size: 每批读取的记录数
+            
+        Returns:
+            迁移的记录数
+        """
+        migrated = 0
+        for collection in self.partition_collections():
+            offset = 0
+            while True:
+                batch = collection.get(
+                    limit=batch_size,
+                    offset=offset,
+                    include=["embeddings", "documents", "metadatas"]
+                )
+                if not batch["ids"]:
+                    break
+                
+                # 按目标分区分组，已在目标分区中的记录保持不动
+                grouped: Dict[str, List[int]] = {}
+                for index, metadata in enumerate(batch["metadatas"]):
+                    target_name = self.partition_name(metadata["user_id"], metadata["app_name"], len(batch["embeddings"][index]))
+                    if target_name != collection.name:
+                        grouped.setdefault(target_name, []).append(index)
+                
+                moved_ids = []
+                for target_name, indices in grouped.items():
+                    self.get_collection(target_name).upsert(
+                        ids=[batch["ids"][index] for index in indices],
+                        embeddings=[batch["embeddings"][index] for index in indices],
+                        documents=[batch["documents"][index] for index in indices],
+                        metadatas=[batch["metadatas"][index] for index in indices]
+                    )
+                    moved_ids.extend(batch["ids"][index] for index in indices)
+                if moved_ids:
+                    collection.delete(ids=moved_ids)
+                
+                migrated += len(moved_ids)
+                # 已移出的记录不再占用偏移量
+                offset += len(batch["ids"]) - len(moved_ids)
+            
+            logger.info(f"Collection {collection.name} scanned, {migrated} embeddings migrated so far")
+        
+        return migrated
@@ -1,11 +1,17 @@
 from app.services.embedding.base import (
     EmbeddingService,
-    EmbeddingServiceFactory
+    EmbeddingServiceFactory,
+    EmbeddingError
 )
 from app.services.embedding.openai import OpenAIEmbeddingService
+from app.services.embedding.local import LocalEmbeddingService
+from app.services.embedding.batching import BatchingEmbeddingService
 
 __all__ = [
     "EmbeddingService",
     "EmbeddingServiceFactory",
-    "OpenAIEmbeddingService"
+    "EmbeddingError",
+    "OpenAIEmbeddingService",
+    "LocalEmbeddingService",
+    "BatchingEmbeddingService"
 ]
@@ -1,9 +1,17 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import asyncio
+import numpy as np
+from app.core.config import settings
 from app.utils.cache import cache, ONE_WEEK
 from functools import wraps
 
 
+class EmbeddingError(Exception):
+    """Embedding生成失败，调用方不应使用随机向量代替，而是稍后重试"""
+    pass
+
+
 def cached_embedding(func):
     """Embedding生成的缓存装饰器"""
     @wraps(func)
@@ -33,11 +41,109 @@ class EmbeddingService(ABC):
     def __init__(self):
         self.cache = cache
     
-    def get_cached_embedding(self, text: str) -> List[float]:
-        """获取缓存的Embedding，如果没有则生成并缓存
+    @staticmethod
+    def reduce_embedding(embedding: List[float], dimension: Optional[int] = None) -> List[float]:
+        """将Embedding截断到指定维度并重新归一化
+        
+        缓存中保存完整维度的向量，各应用按自己的维度截断，同一文本只需生成一次。
+        适用于以Matryoshka方式训练的模型（如text-embedding-3、embedding-3），前若干维即为低维表示。
+        
+        Args:
+            embedding: 完整维度的Embedding向量
+            dimension: 目标维度，为空或不小于向量维度时原样返回
+            
+        Returns:
+            降维后的Embedding向量
+        """
+        if not dimension or dimension >= len(embedding):
+            return embedding
+        
+        vec = np.asarray(embedding[:dimension], dtype=np.float64)
+        norm = np.linalg.norm(vec)
+        if norm == 0:
+            return vec.tolist()
+        return (vec / norm).tolist()
+    
+    @staticmethod
+    def pack_embedding(embedding: List[float], dtype: Optional[str] = None) -> Tuple[bytes, str]:
+        """将Embedding编码为写入记忆表的二进制数据
+        
+        Args:
+            embedding: Embedding向量
+            dtype: 数据类型：float16, float32，为空时使用embedding.storage_dtype
+            
+        Returns:
+            (二进制数据, 数据类型)
+        """
+        dtype = dtype or settings.embedding.storage_dtype
+        if dtype not in ("float16", "float32"):
+            raise ValueError(f"不支持的向量存储精度: {dtype}")
+        return np.asarray(embedding, dtype=dtype).tobytes(), dtype
+    
+    @staticmethod
+    def unpack_embedding(data: Optional[bytes], dtype: Optional[str]) -> Optional[np.ndarray]:
+        """解码记忆表中的二进制向量
+        
+        通过np.frombuffer直接引用原始数据，不复制，返回的数组只读。
+        
+        Args:
+            data: 二进制数据
+            dtype: 数据类型
+            
+        Returns:
+            向量数组，没有数据时返回None
+        """
+        if not data:
+            return None
+        return np.frombuffer(data, dtype=dtype or "float32")
+    
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """粗略估算文本的token数，中文等非ASCII字符按每字1个token，ASCII字符按每4个1个token
+        
+        Args:
+            text: 文本
+            
+        Returns:
+            估算的token数
+        """
+        non_ascii = sum(1 for char in text if ord(char) > 127)
+        return non_ascii + (len(text) - non_ascii + 3) // 4
+    
+    @classmethod
+    def split_batches(cls, texts: List[str], max_items: int, max_tokens: int) -> List[List[str]]:
+        """按条数和估算的token数把文本列表切分为多个请求
+        
+        单个文本超过max_tokens时单独作为一个请求。
+        
+        Args:
+            texts: 文本列表
+            max_items: 每个请求的最大文本数
+            max_tokens: 每个请求的最大估算token数
+            
+        Returns:
+            按原顺序切分的文本列表
+        """
+        batches: List[List[str]] = []
+        batch: List[str] = []
+        batch_tokens = 0
+        for text in texts:
+            tokens = cls.estimate_tokens(text)
+            if batch and (len(batch) >= max_items or batch_tokens + tokens > max_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def get_cached_embedding(self, text: str, dimension: Optional[int] = None) -> List[float]:
+        """获取缓存的Embedding，如果没有则生成并缓存，生成失败时抛出EmbeddingError
         
         Args:
             text: 要生成Embedding的文本
+            dimension: 应用的Embedding维度，为空时返回完整维度
             
         Returns:
             Embedding向量列表
@@ -49,7 +155,7 @@ class EmbeddingService(ABC):
         # 尝试从缓存获取
         cached_result = self.cache.get(cache_key)
         if cached_result is not None:
-            return cached_result
+            return self.reduce_embedding(cached_result, dimension)
         
         # 生成新的Embedding
         result = self.generate_embedding(text)
@@ -57,11 +163,131 @@ class EmbeddingService(ABC):
         # 缓存结果，有效期7天（更长时间，因为embedding生成成本高）
         self.cache.set(cache_key, result, expiry=ONE_WEEK)
         
-        return result
-    
+        return self.reduce_embedding(result, dimension)
+
+    def get_cached_embeddings(self, texts: List[str], dimension: Optional[int] = None) -> List[List[float]]:
+        """批量获取缓存的Embedding，未命中的文本合并为一次请求生成并缓存
+
+        Args:
+            texts: 要生成Embedding的文本列表
+            dimension: 应用的Embedding维度，为空时返回完整维度
+
+        Returns:
+            与输入顺序一致的Embedding向量列表，生成失败的文本对应None
+        """
+        import hashlib
+
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        missing: dict = {}
+        for index, text in enumerate(texts):
+            cache_key = f"embedding:{hashlib.md5(text.encode('utf-8')).hexdigest()}"
+            cached_result = self.cache.get(cache_key)
+            if cached_result is not None:
+                results[index] = cached_result
+            else:
+                # 相同文本只生成一次
+                missing.setdefault(text, []).append(index)
+
+        if missing:
+            missing_texts = list(missing.keys())
+            embeddings = self.generate_embeddings(missing_texts)
+            for text, embedding in zip(missing_texts, embeddings):
+                # 生成失败的文本不写入缓存，下次调用时重新请求
+                if embedding is not None:
+                    cache_key = f"embedding:{hashlib.md5(text.encode('utf-8')).hexdigest()}"
+                    self.cache.set(cache_key, embedding, expiry=ONE_WEEK)
+                for index in missing[text]:
+                    results[index] = embedding
+
+        return [None if embedding is None else self.reduce_embedding(embedding, dimension) for embedding in results]
+
+    async def get_cached_embedding_async(self, text: str, dimension: Optional[int] = None) -> List[float]:
+        """异步获取缓存的Embedding，如果没有则生成并缓存，生成失败时抛出EmbeddingError
+        
+        Args:
+            text: 要生成Embedding的文本
+            dimension: 应用的Embedding维度，为空时返回完整维度
+            
+        Returns:
+            Embedding向量列表
+        """
+        import hashlib
+        cache_key = f"embedding:{hashlib.md5(text.encode('utf-8')).hexdigest()}"
+        
+        # 尝试从缓存获取
+        cached_result = self.cache.get(cache_key)
+        if cached_result is not None:
+            return self.reduce_embedding(cached_result, dimension)
+        
+        # 生成新的Embedding
+        result = await self.generate_embedding_async(text)
+        
+        # 缓存结果，有效期7天
+        self.cache.set(cache_key, result, expiry=ONE_WEEK)
+        
+        return self.reduce_embedding(result, dimension)
+
+    async def get_cached_embeddings_async(self, texts: List[str], dimension: Optional[int] = None) -> List[List[float]]:
+        """异步批量获取缓存的Embedding，未命中的文本合并为一次请求生成并缓存
+
+        Args:
+            texts: 要生成Embedding的文本列表
+            dimension: 应用的Embedding维度，为空时返回完整维度
+
+        Returns:
+            与输入顺序一致的Embedding向量列表，生成失败的文本对应None
+        """
+        import hashlib
+
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        missing: dict = {}
+        for index, text in enumerate(texts):
+            cache_key = f"embedding:{hashlib.md5(text.encode('utf-8')).hexdigest()}"
+            cached_result = self.cache.get(cache_key)
+            if cached_result is not None:
+                results[index] = cached_result
+            else:
+                # 相同文本只生成一次
+                missing.setdefault(text, []).append(index)
+
+        if missing:
+            missing_texts = list(missing.keys())
+            embeddings = await self.generate_embeddings_async(missing_texts)
+            for text, embedding in zip(missing_texts, embeddings):
+                # 生成失败的文本不写入缓存，下次调用时重新请求
+                if embedding is not None:
+                    cache_key = f"embedding:{hashlib.md5(text.encode('utf-8')).hexdigest()}"
+                    self.cache.set(cache_key, embedding, expiry=ONE_WEEK)
+                for index in missing[text]:
+                    results[index] = embedding
+
+        return [None if embedding is None else self.reduce_embedding(embedding, dimension) for embedding in results]
+
+    async def generate_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        """异步生成多个文本的Embedding，默认在线程池中执行同步实现，子类可覆盖为原生异步实现
+        
+        Args:
+            texts: 要生成Embedding的文本列表
+            
+        Returns:
+            Embedding向量列表的列表
+        """
+        return await asyncio.to_thread(self.generate_embeddings, texts)
+
+    async def generate_embedding_async(self, text: str) -> List[float]:
+        """异步生成单个文本的Embedding，默认在线程池中执行同步实现，子类可覆盖为原生异步实现
+        
+        Args:
+            text: 要生成Embedding的文本
+            
+        Returns:
+            Embedding向量列表
+        """
+        return await asyncio.to_thread(self.generate_embedding, text)
+
     @abstractmethod
     def generate_embedding(self, text: str) -> List[float]:
-        """生成单个文本的Embedding
+        """生成单个文本的Embedding，生成失败时抛出EmbeddingError
         
         Args:
             text: 要生成Embedding的文本
@@ -72,16 +298,24 @@ class EmbeddingService(ABC):
         pass
     
     @abstractmethod
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def generate_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
         """生成多个文本的Embedding
         
         Args:
             texts: 要生成Embedding的文本列表
             
         Returns:
-            Embedding向量列表的列表
+            Embedding向量列表的列表，生成失败的文本对应None
         """
         pass
+    
+    def close(self) -> None:
+        """释放服务持有的连接等资源，默认无需处理"""
+        pass
+    
+    async def aclose(self) -> None:
+        """异步释放服务持有的连接等资源，默认调用close"""
+        self.close()
 
 
 class EmbeddingServiceFactory:
@@ -101,5 +335,8 @@ class EmbeddingServiceFactory:
         if service_type == "openai":
             from app.services.embedding.openai import OpenAIEmbeddingService
             return OpenAIEmbeddingService(**kwargs)
+        elif service_type == "local":
+            from app.services.embedding.local import LocalEmbeddingService
+            return LocalEmbeddingService(**kwargs)
         else:
             raise ValueError(f"不支持的Embedding服务类型: {service_type}")
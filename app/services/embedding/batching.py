@@ -0,0 +1,246 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.embedding.base import EmbeddingService, EmbeddingError
+
+
+class BatchingEmbeddingService(EmbeddingService):
+    """合并并发请求的Embedding服务
+
+    包装一个Embedding服务。单个文本和少量文本的Embedding请求（查询、记忆创建的缓存未命中等）先进入队列，
+    等待最多max_wait_ms毫秒或凑满max_batch_size条后，合并为一次generate_embeddings请求，
+    再把结果分发给各个等待的调用方，相同文本只请求一次。
+    同步调用（线程池中的请求和后台任务）与异步调用（事件循环中的请求）分别排队；
+    不少于max_batch_size条的批量请求本身已经足够大，直接转发给被包装的服务。
+    """
+
+    def __init__(self,
+                 service: EmbeddingService,
+                 max_wait_ms: Optional[float] = None,
+                 max_batch_size: Optional[int] = None):
+        """初始化合并请求的Embedding服务
+
+        Args:
+            service: 实际生成Embedding的服务
+            max_wait_ms: 第一条请求进入队列后最多等待的毫秒数
+            max_batch_size: 每次合并请求包含的最大文本数
+        """
+        super().__init__()
+        self.service = service
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else settings.embedding.batch_wait_ms) / 1000
+        self.max_batch_size = max(1, max_batch_size or settings.embedding.max_batch_size)
+        self.stats = {"requests": 0, "batches": 0}
+
+        # 同步调用的队列，元素为(文本, Future, 入队时间)，有请求在队列中的调用线程轮流负责发送
+        self._condition = threading.Condition()
+        self._pending: List[Tuple[str, Future, float]] = []
+
+        # 异步调用的队列，绑定创建它的事件循环
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_pending: List[Tuple[str, asyncio.Future]] = []
+        self._async_timer: Optional[asyncio.TimerHandle] = None
+        # 持有发送中的任务，避免任务在完成前被垃圾回收
+        self._async_tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _unique_texts(batch: List[Tuple]) -> List[str]:
+        """按首次出现顺序去重"""
+        return list(dict.fromkeys(item[0] for item in batch))
+
+    @staticmethod
+    def _collect_results(results: List[object]) -> List[Optional[List[float]]]:
+        """把各条请求的结果转换为批量接口的返回值，生成失败的文本对应None，其他异常继续抛出"""
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, EmbeddingError):
+                raise result
+        return [None if isinstance(result, EmbeddingError) else result for result in results]
+
+    def _take_batch(self) -> List[Tuple[str, Future, float]]:
+        """取出队列中的一批请求，调用方需持有self._condition"""
+        batch = self._pending[:self.max_batch_size]
+        del self._pending[:self.max_batch_size]
+        self.stats["batches"] += 1
+        self._condition.notify_all()
+        return batch
+
+    def _send_batch(self, batch: List[Tuple[str, Future, float]]) -> None:
+        """发送一批同步请求并把结果分发给等待的调用方"""
+        texts = self._unique_texts(batch)
+        try:
+            embeddings: Dict[str, List[float]] = dict(zip(texts, self.service.generate_embeddings(texts)))
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for text, future, _ in batch:
+            if embeddings[text] is None:
+                future.set_exception(EmbeddingError("Embedding request failed"))
+            else:
+                future.set_result(embeddings[text])
+
+    def _submit(self, texts: List[str]) -> List[Future]:
+        """把文本加入同步队列，直到这些请求全部发出后返回
+
+        队列凑满max_batch_size条时立即发送；否则等待到队首请求入队max_wait后发送。
+        有请求在队列中的调用线程都可能负责发送，不需要后台线程，在gunicorn的fork模型下同样可用。
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与输入顺序一致的Future列表
+        """
+        futures: List[Future] = [Future() for _ in texts]
+        own = set(futures)
+        now = time.monotonic()
+        with self._condition:
+            self.stats["requests"] += len(texts)
+            self._pending.extend((text, future, now) for text, future in zip(texts, futures))
+
+        while True:
+            batch: List[Tuple[str, Future, float]] = []
+            with self._condition:
+                while any(future in own for _, future, _ in self._pending):
+                    if len(self._pending) >= self.max_batch_size:
+                        batch = self._take_batch()
+                        break
+                    remaining = self._pending[0][2] + self.max_wait - time.monotonic()
+                    if remaining <= 0:
+                        batch = self._take_batch()
+                        break
+                    self._condition.wait(remaining)
+            if not batch:
+                return futures
+            self._send_batch(batch)
+
+    def generate_embedding(self, text: str) -> List[float]:
+        """生成单个文本的Embedding，与同时到达的其他请求合并发送
+
+        Args:
+            text: 要生成Embedding的文本
+
+        Returns:
+            Embedding向量列表
+        """
+        return self._submit([text])[0].result()
+
+    def generate_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """生成多个文本的Embedding，少于max_batch_size条时与同时到达的其他请求合并发送
+
+        Args:
+            texts: 要生成Embedding的文本列表
+
+        Returns:
+            Embedding向量列表的列表，生成失败的文本对应None
+        """
+        if not texts:
+            return []
+        if len(texts) >= self.max_batch_size:
+            return self.service.generate_embeddings(texts)
+
+        results = []
+        for future in self._submit(texts):
+            exception = future.exception()
+            results.append(exception if exception is not None else future.result())
+        return self._collect_results(results)
+
+    def _flush_async(self) -> None:
+        """取出异步队列中的一批请求并在后台发送"""
+        if self._async_timer is not None:
+            self._async_timer.cancel()
+            self._async_timer = None
+        batch = self._async_pending[:self.max_batch_size]
+        del self._async_pending[:self.max_batch_size]
+        if batch:
+            task = self._async_loop.create_task(self._send_batch_async(batch))
+            self._async_tasks.add(task)
+            task.add_done_callback(self._async_tasks.discard)
+        if self._async_pending:
+            self._async_timer = self._async_loop.call_later(self.max_wait, self._flush_async)
+
+    async def _send_batch_async(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """发送一批异步请求并把结果分发给等待的调用方"""
+        texts = self._unique_texts(batch)
+        self.stats["batches"] += 1
+        try:
+            embeddings = dict(zip(texts, await self.service.generate_embeddings_async(texts)))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future in batch:
+            if future.done():
+                continue
+            if embeddings[text] is None:
+                future.set_exception(EmbeddingError("Embedding request failed"))
+            else:
+                future.set_result(embeddings[text])
+
+    def _submit_async(self, texts: List[str]) -> List[asyncio.Future]:
+        """把文本加入当前事件循环的异步队列
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与输入顺序一致的Future列表
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            # 事件循环变化（如多次asyncio.run）时丢弃旧循环的队列状态
+            self._async_loop = loop
+            self._async_pending = []
+            self._async_timer = None
+            self._async_tasks = set()
+
+        self.stats["requests"] += len(texts)
+        futures = [loop.create_future() for _ in texts]
+        self._async_pending.extend(zip(texts, futures))
+        while len(self._async_pending) >= self.max_batch_size:
+            self._flush_async()
+        if self._async_pending and self._async_timer is None:
+            self._async_timer = loop.call_later(self.max_wait, self._flush_async)
+        return futures
+
+    async def generate_embedding_async(self, text: str) -> List[float]:
+        """异步生成单个文本的Embedding，与同时到达的其他请求合并发送
+
+        Args:
+            text: 要生成Embedding的文本
+
+        Returns:
+            Embedding向量列表
+        """
+        return await self._submit_async([text])[0]
+
+    async def generate_embeddings_async(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """异步生成多个文本的Embedding，少于max_batch_size条时与同时到达的其他请求合并发送
+
+        Args:
+            texts: 要生成Embedding的文本列表
+
+        Returns:
+            Embedding向量列表的列表，生成失败的文本对应None
+        """
+        if not texts:
+            return []
+        if len(texts) >= self.max_batch_size:
+            return await self.service.generate_embeddings_async(texts)
+        return self._collect_results(await asyncio.gather(*self._submit_async(texts), return_exceptions=True))
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取合并的文本请求数和实际发送的合并请求数"""
+        return self.stats.copy()
+
+    def close(self) -> None:
+        """释放被包装服务的资源"""
+        self.service.close()
+
+    async def aclose(self) -> None:
+        """异步释放被包装服务的资源"""
+        await self.service.aclose()
@@ -0,0 +1,232 @@
+import os
+import re
+import zlib
+from functools import lru_cache
+from typing import List, Optional
+import numpy as np
+from app.services.embedding.base import EmbeddingService
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 中日韩文字连续片段，按字切分n-gram；其他字母数字按词和词内字符n-gram切分
+CJK_PATTERN = r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]"
+TOKEN_PATTERN = re.compile(rf"{CJK_PATTERN}+|[^\W_]+", re.UNICODE)
+CJK_RUN = re.compile(rf"{CJK_PATTERN}+")
+
+
+@lru_cache(maxsize=200000)
+def feature_hash(feature: str) -> int:
+    """特征的稳定哈希值，不受PYTHONHASHSEED影响，多个进程结果一致"""
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+class LocalEmbeddingService(EmbeddingService):
+    """本地离线Embedding服务
+
+    不依赖网络和GPU，把文本切分为字符n-gram（中日韩文字按单字和相邻两字，其他文字按词和词内三字符），
+    用特征哈希映射到固定维度并按对数词频加权，结果归一化，同一文本在任何进程中得到相同的向量。
+    提供模型文件时，先哈希到更高维的特征空间并按IDF加权，再用在自有语料上拟合的SVD投影降到目标维度，
+    近义表达的相似度更高。模型文件通过 python -m app.tools.fit_local_embedding 生成。
+    计算开销很低，不使用Embedding缓存。
+    """
+
+    def __init__(self,
+                 dimension: Optional[int] = None,
+                 model_path: Optional[str] = None,
+                 normalize: Optional[bool] = None):
+        """初始化本地Embedding服务
+
+        Args:
+            dimension: 嵌入向量维度
+            model_path: SVD投影模型文件路径，文件不存在时直接使用哈希向量
+            normalize: 是否归一化向量
+        """
+        super().__init__()
+        self.dimension = dimension or settings.embedding.dimension
+        self.model_path = model_path if model_path is not None else settings.embedding.local_model_path
+        self.normalize = normalize if normalize is not None else settings.embedding.normalize
+        self.idf: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        self.n_features = self.dimension
+
+        if self.model_path and os.path.exists(self.model_path):
+            self.load_model(self.model_path)
+        logger.info(f"Local embedding service initialized, dimension: {self.dimension}, "
+                    f"projection: {'svd' if self.components is not None else 'none'}")
+
+    @staticmethod
+    def extract_features(text: str) -> List[str]:
+        """切分文本特征
+
+        Args:
+            text: 文本
+
+        Returns:
+            特征列表
+        """
+        features = []
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            if CJK_RUN.fullmatch(token):
+                features.extend(token)
+                features.extend(token[i:i + 2] for i in range(len(token) - 1))
+            else:
+                features.append(token)
+                padded = f"<{token}>"
+                if len(padded) > 3:
+                    features.extend(f"#{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def hash_features(self, texts: List[str], n_features: int) -> np.ndarray:
+        """把文本哈希为对数词频加权的特征矩阵
+
+        Args:
+            texts: 文本列表
+            n_features: 特征空间维度
+
+        Returns:
+            形状为(len(texts), n_features)的float32矩阵
+        """
+        matrix = np.zeros((len(texts), n_features), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self.extract_features(text)
+            if not features:
+                continue
+            hashes = np.fromiter((feature_hash(feature) for feature in features), dtype=np.int64, count=len(features))
+            # 余数决定位置，商的奇偶决定符号，与位置相互独立，冲突的特征相互抵消而不是累加
+            quotients, buckets = np.divmod(hashes, n_features)
+            signs = np.where(quotients & 1, -1.0, 1.0)
+            counts = np.bincount(buckets, weights=signs, minlength=n_features)
+            matrix[row] = np.sign(counts) * np.log1p(np.abs(counts))
+        return matrix
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """生成Embedding矩阵
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            形状为(len(texts), dimension)的float32矩阵
+        """
+        matrix = self.hash_features(texts, self.n_features)
+        if self.components is not None:
+            matrix = (matrix * self.idf) @ self.components
+            if matrix.shape[1] < self.dimension:
+                # 语料不足以拟合目标维度时补零，保证向量维度与配置一致
+                matrix = np.pad(matrix, ((0, 0), (0, self.dimension - matrix.shape[1])))
+        if self.normalize:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+        return matrix.astype(np.float32)
+
+    def fit(self, texts: List[str], n_features: int = 16384, oversample: int = 10, n_iter: int = 2, seed: int = 0) -> None:
+        """在语料上拟合IDF权重和SVD投影
+
+        使用随机化SVD，只需要保存语料数×(dimension+oversample)和(dimension+oversample)×n_features两个矩阵。
+
+        Args:
+            texts: 语料文本列表
+            n_features: 哈希特征空间维度
+            oversample: 随机化SVD的过采样数
+            n_iter: 随机化SVD的幂迭代次数
+            seed: 随机种子
+        """
+        if not texts:
+            raise ValueError("拟合本地Embedding模型需要至少一条文本")
+
+        matrix = self.hash_features(texts, n_features)
+        document_frequency = np.count_nonzero(matrix, axis=0)
+        idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        matrix *= idf
+
+        rank = min(self.dimension, len(texts), n_features)
+        rng = np.random.default_rng(seed)
+        sample = matrix @ rng.standard_normal((n_features, min(rank + oversample, n_features)), dtype=np.float32)
+        basis, _ = np.linalg.qr(sample)
+        for _ in range(n_iter):
+            basis, _ = np.linalg.qr(matrix @ (matrix.T @ basis))
+        _, _, vt = np.linalg.svd(basis.T @ matrix, full_matrices=False)
+
+        self.idf = idf
+        self.components = np.ascontiguousarray(vt[:rank].T, dtype=np.float32)
+        self.n_features = n_features
+        logger.info(f"Fitted local embedding projection on {len(texts)} texts, rank {rank}")
+
+    def save_model(self, path: Optional[str] = None) -> None:
+        """保存拟合的模型
+
+        Args:
+            path: 模型文件路径，为空时使用model_path
+        """
+        path = path or self.model_path
+        if self.components is None:
+            raise ValueError("本地Embedding模型尚未拟合")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(f, idf=self.idf, components=self.components)
+
+    def load_model(self, path: str) -> None:
+        """加载拟合的模型
+
+        Args:
+            path: 模型文件路径
+        """
+        with np.load(path) as data:
+            components = data["components"]
+            if components.shape[1] > self.dimension:
+                raise ValueError(f"本地Embedding模型维度{components.shape[1]}大于配置的维度{self.dimension}")
+            self.idf = data["idf"]
+            self.components = components
+        self.n_features = self.components.shape[0]
+
+    def generate_embedding(self, text: str) -> List[float]:
+        """生成单个文本的Embedding
+
+        Args:
+            text: 要生成Embedding的文本
+
+        Returns:
+            Embedding向量列表
+        """
+        return self.embed([text])[0].tolist()
+
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """生成多个文本的Embedding
+
+        Args:
+            texts: 要生成Embedding的文本列表
+
+        Returns:
+            Embedding向量列表的列表
+        """
+        if not texts:
+            return []
+        return self.embed(texts).tolist()
+
+    async def generate_embedding_async(self, text: str) -> List[float]:
+        """异步生成单个文本的Embedding，计算很快，直接在事件循环中执行"""
+        return self.generate_embedding(text)
+
+    async def generate_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        """异步生成多个文本的Embedding，计算很快，直接在事件循环中执行"""
+        return self.generate_embeddings(texts)
+
+    def get_cached_embedding(self, text: str, dimension: Optional[int] = None) -> List[float]:
+        """直接计算Embedding，不使用缓存"""
+        return self.reduce_embedding(self.generate_embedding(text), dimension)
+
+    def get_cached_embeddings(self, texts: List[str], dimension: Optional[int] = None) -> List[List[float]]:
+        """直接计算Embedding，不使用缓存"""
+        return [self.reduce_embedding(embedding, dimension) for embedding in self.generate_embeddings(texts)]
+
+    async def get_cached_embedding_async(self, text: str, dimension: Optional[int] = None) -> List[float]:
+        """直接计算Embedding，不使用缓存"""
+        return self.get_cached_embedding(text, dimension)
+
+    async def get_cached_embeddings_async(self, texts: List[str], dimension: Optional[int] = None) -> List[List[float]]:
+        """直接计算Embedding，不使用缓存"""
+        return self.get_cached_embeddings(texts, dimension)
@@ -1,7 +1,9 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 import openai
 import numpy as np
-from app.services.embedding.base import EmbeddingService, cached_embedding
+from app.services.embedding.base import EmbeddingService, EmbeddingError, cached_embedding
 from app.core.config import settings
 from app.core.logging import get_logger
 
@@ -18,7 +20,10 @@ class OpenAIEmbeddingService(EmbeddingService):
                  timeout: Optional[int] = None,
                  max_retries: Optional[int] = None,
                  dimension: Optional[int] = None,
-                 normalize: Optional[bool] = None):
+                 normalize: Optional[bool] = None,
+                 request_batch_size: Optional[int] = None,
+                 request_max_tokens: Optional[int] = None,
+                 request_concurrency: Optional[int] = None):
         """初始化OpenAI Embedding服务
         
         Args:
@@ -29,6 +34,9 @@ class OpenAIEmbeddingService(EmbeddingService):
             max_retries: 最大重试次数
             dimension: 嵌入向量维度
             normalize: 是否归一化向量
+            request_batch_size: 批量生成时每个接口请求的最大文本数
+            request_max_tokens: 批量生成时每个接口请求的最大估算token数
+            request_concurrency: 批量生成时同时进行的接口请求数
         """
         super().__init__()  # 调用父类初始化，设置缓存
         try:
@@ -42,6 +50,9 @@ class OpenAIEmbeddingService(EmbeddingService):
             self.max_retries = max_retries or settings.embedding.max_retries
             self.dimension = dimension or settings.embedding.dimension
             self.normalize = normalize or settings.embedding.normalize
+            self.request_batch_size = max(1, request_batch_size or settings.embedding.request_batch_size)
+            self.request_max_tokens = request_max_tokens or settings.embedding.request_max_tokens
+            self.request_concurrency = max(1, request_concurrency or settings.embedding.request_concurrency)
             
             logger.info(f"Using embedding model: {self.model}")
             logger.info(f"Using base_url: {self.base_url}")
@@ -55,6 +66,8 @@ class OpenAIEmbeddingService(EmbeddingService):
                 timeout=self.timeout,
                 max_retries=self.max_retries
             )
+            # 异步客户端在首次使用时创建，之后在进程内复用其连接池
+            self._async_client: Optional[openai.AsyncOpenAI] = None
             logger.info("OpenAI Embedding Service initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize OpenAI Embedding Service: {e}")
@@ -63,6 +76,29 @@ class OpenAIEmbeddingService(EmbeddingService):
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise
     
+    @property
+    def async_client(self) -> openai.AsyncOpenAI:
+        """获取复用的异步客户端"""
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=self.max_retries
+            )
+        return self._async_client
+    
+    def close(self) -> None:
+        """关闭同步客户端的连接池"""
+        self.client.close()
+    
+    async def aclose(self) -> None:
+        """关闭同步和异步客户端的连接池"""
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+    
     def _normalize_vector(self, vector: List[float]) -> List[float]:
         """归一化向量
         
@@ -111,8 +147,8 @@ class OpenAIEmbeddingService(EmbeddingService):
             return self._normalize_vector(embedding)
         except Exception as e:
             logger.error(f"Failed to generate embedding for text '{text[:50]}...': {e}")
-            # 生成随机向量作为降级方案
-            return self._normalize_vector(np.random.rand(self.dimension).tolist())
+            # 不使用随机向量代替，避免写入缓存和向量存储后影响相似度检索
+            raise EmbeddingError(str(e)) from e
     
     async def generate_embedding_async(self, text: str) -> List[float]:
         """生成单个文本的Embedding（异步实现）
@@ -123,18 +159,8 @@ class OpenAIEmbeddingService(EmbeddingService):
         Returns:
             Embedding向量列表
         """
-        from openai import AsyncOpenAI
-        
-        # 创建异步客户端
-        async_client = AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-            timeout=self.timeout,
-            max_retries=self.max_retries
-        )
-        
         try:
-            response = await async_client.embeddings.create(
+            response = await self.async_client.embeddings.create(
                 input=text,
                 model=self.model
             )
@@ -142,12 +168,10 @@ class OpenAIEmbeddingService(EmbeddingService):
             return self._normalize_vector(embedding)
         except Exception as e:
             logger.error(f"Failed to generate embedding for text '{text[:50]}...': {e}")
-            # 生成随机向量作为降级方案
-            return self._normalize_vector(np.random.rand(self.dimension).tolist())
-        finally:
-            await async_client.close()
+            # 不使用随机向量代替，避免写入缓存和向量存储后影响相似度检索
+            raise EmbeddingError(str(e)) from e
     
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def generate_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
         """生成多个文本的Embedding（兼容旧代码）
         
         Args:
@@ -158,12 +182,34 @@ class OpenAIEmbeddingService(EmbeddingService):
         """
         return self.generate_embeddings_sync(texts)
     
-    def generate_embeddings_sync(self, texts: List[str]) -> List[List[float]]:
+    def generate_embeddings_sync(self, texts: List[str]) -> List[Optional[List[float]]]:
         """生成多个文本的Embedding（同步实现）
         
+        按条数和估算的token数切分为多个请求，最多request_concurrency个请求并行，结果按输入顺序合并。
+        
         Args:
             texts: 要生成Embedding的文本列表
             
+        Returns:
+            Embedding向量列表的列表，请求失败的文本对应None
+        """
+        if not texts:
+            return []
+        
+        batches = self.split_batches(texts, self.request_batch_size, self.request_max_tokens)
+        if len(batches) == 1:
+            return self._generate_batch_sync(batches[0])
+        
+        with ThreadPoolExecutor(max_workers=min(self.request_concurrency, len(batches))) as executor:
+            results = executor.map(self._generate_batch_sync, batches)
+            return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+    
+    def _generate_batch_sync(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """发送一个批量Embedding请求，失败时这一批的文本对应None
+        
+        Args:
+            texts: 一个请求包含的文本列表
+            
         Returns:
             Embedding向量列表的列表
         """
@@ -175,37 +221,49 @@ class OpenAIEmbeddingService(EmbeddingService):
             return [self._normalize_vector(item.embedding) for item in response.data]
         except Exception as e:
             logger.error(f"Failed to generate embeddings for {len(texts)} texts: {e}")
-            # 生成随机向量作为降级方案
-            return [self._normalize_vector(np.random.rand(self.dimension).tolist()) for _ in texts]
+            # 不使用随机向量代替，由调用方标记为待补写
+            return [None] * len(texts)
     
-    async def generate_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+    async def generate_embeddings_async(self, texts: List[str]) -> List[Optional[List[float]]]:
         """生成多个文本的Embedding（异步实现）
         
+        按条数和估算的token数切分为多个请求，最多request_concurrency个请求并发，结果按输入顺序合并。
+        
         Args:
             texts: 要生成Embedding的文本列表
             
         Returns:
-            Embedding向量列表的列表
+            Embedding向量列表的列表，请求失败的文本对应None
         """
-        from openai import AsyncOpenAI
+        if not texts:
+            return []
+        
+        batches = self.split_batches(texts, self.request_batch_size, self.request_max_tokens)
+        semaphore = asyncio.Semaphore(self.request_concurrency)
         
-        # 创建异步客户端
-        async_client = AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-            timeout=self.timeout,
-            max_retries=self.max_retries
-        )
+        async def generate_batch(batch: List[str]) -> List[Optional[List[float]]]:
+            async with semaphore:
+                return await self._generate_batch_async(batch)
         
+        results = await asyncio.gather(*(generate_batch(batch) for batch in batches))
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+    
+    async def _generate_batch_async(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """异步发送一个批量Embedding请求，失败时这一批的文本对应None
+        
+        Args:
+            texts: 一个请求包含的文本列表
+            
+        Returns:
+            Embedding向量列表的列表
+        """
         try:
-            response = await async_client.embeddings.create(
+            response = await self.async_client.embeddings.create(
                 input=texts,
                 model=self.model
             )
             return [self._normalize_vector(item.embedding) for item in response.data]
         except Exception as e:
             logger.error(f"Failed to generate embeddings for {len(texts)} texts: {e}")
-            # 生成随机向量作为降级方案
-            return [self._normalize_vector(np.random.rand(self.dimension).tolist()) for _ in texts]
-        finally:
-            await async_client.close()
+            # 不使用随机向量代替，由调用方标记为待补写
+            return [None] * len(texts)
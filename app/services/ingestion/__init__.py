@@ -0,0 +1,3 @@
+from app.services.ingestion.queue import IngestionQueue, ClaimExpiredError
+
+__all__ = ["IngestionQueue", "ClaimExpiredError"]
@@ -0,0 +1,218 @@
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+import uuid
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, select, update
+
+from app.models import IngestionJob, UserMemory
+from app.schemas.memory import ChatHistoryCreate
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class ClaimExpiredError(Exception):
+    """任务的领取已过期，任务已被重新入队或由其他工作线程处理"""
+    pass
+
+
+class IngestionQueue:
+    """基于SQL表的持久化记忆生成任务队列"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.config = settings.ingestion
+
+    def enqueue(self, chat_history: ChatHistoryCreate) -> IngestionJob:
+        """提交单个聊天历史任务
+
+        Args:
+            chat_history: 聊天历史
+
+        Returns:
+            创建的任务对象
+        """
+        return self.enqueue_many([chat_history])[0]
+
+    def enqueue_many(self, chat_histories: List[ChatHistoryCreate]) -> List[IngestionJob]:
+        """批量提交聊天历史任务，所有任务在一次提交中写入
+
+        Args:
+            chat_histories: 聊天历史列表
+
+        Returns:
+            与输入顺序一致的任务对象列表
+        """
+        jobs = [
+            IngestionJob(
+                job_id=str(uuid.uuid4()),
+                user_id=chat_history.user_id,
+                app_name=chat_history.app_name,
+                payload=chat_history.model_dump(mode="json"),
+                status="pending",
+                attempts=0
+            )
+            for chat_history in chat_histories
+        ]
+        self.db.add_all(jobs)
+        self.db.commit()
+        return jobs
+
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        """根据任务ID获取任务
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            任务对象，不存在返回None
+        """
+        return self.db.query(IngestionJob).filter(IngestionJob.job_id == job_id).first()
+
+    def claim_batch(self, batch_size: Optional[int] = None) -> List[IngestionJob]:
+        """原子地领取一批待处理任务
+
+        使用带领取标识的条件UPDATE，多个工作线程或进程并发领取时同一任务只会被领取一次。
+
+        Args:
+            batch_size: 领取数量
+
+        Returns:
+            领取到的任务列表
+        """
+        batch_size = batch_size or self.config.batch_size
+        claim_token = str(uuid.uuid4())
+
+        pending_ids = select(IngestionJob.id).where(
+            IngestionJob.status == "pending"
+        ).order_by(IngestionJob.id).limit(batch_size).scalar_subquery()
+
+        result = self.db.execute(
+            update(IngestionJob)
+            .where(and_(IngestionJob.id.in_(pending_ids), IngestionJob.status == "pending"))
+            .values(
+                status="processing",
+                claim_token=claim_token,
+                claimed_at=datetime.utcnow(),
+                attempts=IngestionJob.attempts + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+
+        if not result.rowcount:
+            return []
+
+        return self.db.query(IngestionJob).filter(
+            IngestionJob.claim_token == claim_token
+        ).order_by(IngestionJob.id).all()
+
+    def mark_completed(self, job_ids: List[int], memory_ids: List[Optional[int]], claim_token: str) -> None:
+        """在调用方的事务中标记任务完成并记录生成的记忆ID，由调用方提交
+
+        与新记忆在同一事务中提交，任务只有在记忆写入后才算完成，重试时不会重复创建记忆。
+        任务的领取已过期并被重新入队或领取时抛出ClaimExpiredError，调用方应回滚整个事务。
+
+        Args:
+            job_ids: 任务主键列表
+            memory_ids: 与任务顺序一致的记忆ID列表
+            claim_token: 领取批次标识
+        """
+        now = datetime.utcnow()
+        for job_id, memory_id in zip(job_ids, memory_ids):
+            result = self.db.execute(
+                update(IngestionJob)
+                .where(and_(
+                    IngestionJob.id == job_id,
+                    IngestionJob.claim_token == claim_token,
+                    IngestionJob.status == "processing"
+                ))
+                .values(status="completed", memory_id=memory_id, error=None, completed_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            if not result.rowcount:
+                raise ClaimExpiredError(f"Claim of ingestion job {job_id} expired before completion")
+
+    def mark_failed(self, job_ids: List[int], error: str, claim_token: Optional[str] = None) -> int:
+        """标记任务失败，未达到最大尝试次数的任务重新入队
+
+        只更新仍处于处理中且由claim_token领取的任务，已被其他工作线程重新领取或已完成的任务保持不变。
+
+        Args:
+            job_ids: 任务主键列表
+            error: 错误信息
+            claim_token: 领取批次标识，为空时不校验
+
+        Returns:
+            更新的任务数量
+        """
+        conditions = [IngestionJob.id.in_(job_ids), IngestionJob.status == "processing"]
+        if claim_token:
+            conditions.append(IngestionJob.claim_token == claim_token)
+        return self._release(conditions, error)
+
+    def _release(self, conditions: List[Any], error: str) -> int:
+        """释放满足条件的处理中任务：达到最大尝试次数的标记为失败，其余重新入队
+
+        Args:
+            conditions: 任务的筛选条件
+            error: 错误信息
+
+        Returns:
+            更新的任务数量
+        """
+        exhausted = self.db.execute(
+            update(IngestionJob)
+            .where(and_(*conditions, IngestionJob.attempts >= self.config.max_attempts))
+            .values(status="failed", error=error, claim_token=None, completed_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        requeued = self.db.execute(
+            update(IngestionJob)
+            .where(and_(*conditions, IngestionJob.attempts < self.config.max_attempts))
+            .values(status="pending", error=error, claim_token=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        self.db.commit()
+        return exhausted + requeued
+
+    def heartbeat(self, claim_token: str) -> int:
+        """刷新一批处理中任务的领取时间，避免运行时间较长的批次被判定为失联
+
+        Args:
+            claim_token: 领取批次标识
+
+        Returns:
+            刷新的任务数量
+        """
+        result = self.db.execute(
+            update(IngestionJob)
+            .where(and_(IngestionJob.claim_token == claim_token, IngestionJob.status == "processing"))
+            .values(claimed_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+        return result.rowcount
+
+    def requeue_stale(self) -> int:
+        """将长时间未刷新领取时间的处理中任务重新入队（例如进程崩溃或重启遗留的任务）
+
+        处理中的批次由工作线程定期刷新领取时间，只有失联的任务会超过stale_timeout_seconds。
+
+        Returns:
+            重新入队或标记失败的任务数量
+        """
+        stale_before = datetime.utcnow() - timedelta(seconds=self.config.stale_timeout_seconds)
+        count = self._release(
+            [IngestionJob.status == "processing", IngestionJob.claimed_at < stale_before],
+            "Job claim expired before completion"
+        )
+        if count:
+            logger.warning(f"Requeued {count} stale ingestion jobs")
+        return count
+
+    @staticmethod
+    def to_chat_history(job: IngestionJob) -> ChatHistoryCreate:
+        """将任务负载还原为聊天历史Schema"""
+        return ChatHistoryCreate.model_validate(job.payload)
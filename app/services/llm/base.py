@@ -30,6 +30,14 @@ class LLMService(ABC):
             生成的文本
         """
         pass
+    
+    def close(self) -> None:
+        """释放服务持有的连接等资源，默认无需处理"""
+        pass
+    
+    async def aclose(self) -> None:
+        """异步释放服务持有的连接等资源，默认调用close"""
+        self.close()
 
 
 class LLMServiceFactory:
@@ -48,6 +48,31 @@ class OpenAILLMService(LLMService):
             timeout=self.timeout,
             max_retries=self.max_retries
         )
+        # 异步客户端在首次使用时创建，之后在进程内复用其连接池
+        self._async_client: Optional[openai.AsyncOpenAI] = None
+    
+    @property
+    def async_client(self) -> openai.AsyncOpenAI:
+        """获取复用的异步客户端"""
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=self.max_retries
+            )
+        return self._async_client
+    
+    def close(self) -> None:
+        """关闭同步客户端的连接池"""
+        self.client.close()
+    
+    async def aclose(self) -> None:
+        """关闭同步和异步客户端的连接池"""
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
     
     def generate_text(self, prompt: str, **kwargs) -> str:
         """生成文本（同步方法，用于兼容现有代码）
@@ -193,27 +218,14 @@ class OpenAILLMService(LLMService):
         Returns:
             生成的文本
         """
-        from openai import AsyncOpenAI
-        
-        # 创建异步客户端
-        async_client = AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-            timeout=self.timeout,
-            max_retries=self.max_retries
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=kwargs.get("temperature", self.temperature),
+            max_tokens=kwargs.get("max_tokens", self.max_tokens),
+            top_p=kwargs.get("top_p", 1.0),
+            frequency_penalty=kwargs.get("frequency_penalty", 0.0),
+            presence_penalty=kwargs.get("presence_penalty", 0.0)
         )
         
-        try:
-            response = await async_client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=kwargs.get("temperature", self.temperature),
-                max_tokens=kwargs.get("max_tokens", self.max_tokens),
-                top_p=kwargs.get("top_p", 1.0),
-                frequency_penalty=kwargs.get("frequency_penalty", 0.0),
-                presence_penalty=kwargs.get("presence_penalty", 0.0)
-            )
-            
-            return response.choices[0].message.content
-        finally:
-            await async_client.close()
+        return response.choices[0].message.content
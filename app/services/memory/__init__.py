@@ -1,9 +1,21 @@
 from app.services.memory.manager import MemoryManager
+from app.services.memory.async_manager import AsyncMemoryManager
 from app.services.memory.merger import MemoryMerger
 from app.services.memory.cleanup import MemoryCleanupService
+from app.services.memory.access import MemoryAccessTracker, memory_access_tracker
+from app.services.memory.search import MemoryFullTextIndex, memory_fulltext_index
+from app.services.memory.reindex import MemoryReindexer
+from app.services.memory.backfill import MemoryEmbeddingBackfill
 
 __all__ = [
     "MemoryManager",
+    "AsyncMemoryManager",
     "MemoryMerger",
-    "MemoryCleanupService"
+    "MemoryCleanupService",
+    "MemoryAccessTracker",
+    "memory_access_tracker",
+    "MemoryFullTextIndex",
+    "memory_fulltext_index",
+    "MemoryReindexer",
+    "MemoryEmbeddingBackfill"
 ]
@@ -0,0 +1,76 @@
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+
+from app.models import UserMemory
+
+
+class MemoryAccessTracker:
+    """记忆访问时间记录器（写回缓冲）
+
+    查询路径只在内存中记录被访问的记忆ID，由定时任务批量写回last_accessed_at，
+    避免每次读取都执行UPDATE和提交，读请求不再与记忆写入争用SQLite写锁。
+    """
+
+    # 单条UPDATE语句包含的最大记忆数
+    flush_chunk_size = 500
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, datetime] = {}
+
+    def record(self, memory_ids: Iterable[int], accessed_at: Optional[datetime] = None) -> None:
+        """记录记忆被访问
+
+        Args:
+            memory_ids: 被访问的记忆ID列表
+            accessed_at: 访问时间，默认为当前时间
+        """
+        accessed_at = accessed_at or datetime.utcnow()
+        with self._lock:
+            for memory_id in memory_ids:
+                self._pending[memory_id] = accessed_at
+
+    def flush(self, db: Session) -> int:
+        """将记录的访问时间批量写回数据库
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            写回的记忆数量
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return 0
+
+        try:
+            # 每个分块一条 UPDATE ... SET last_accessed_at = CASE id ... END WHERE id IN (...)，
+            # 保留每条记忆各自的访问时间，已被删除的记忆直接跳过
+            table = UserMemory.__table__
+            items = list(pending.items())
+            for start in range(0, len(items), self.flush_chunk_size):
+                chunk = dict(items[start:start + self.flush_chunk_size])
+                db.execute(
+                    update(table)
+                    .where(table.c.id.in_(list(chunk.keys())))
+                    .values(last_accessed_at=case(chunk, value=table.c.id))
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            # 写回失败时保留记录，等待下次重试；期间的新访问时间优先
+            with self._lock:
+                for memory_id, accessed_at in pending.items():
+                    self._pending.setdefault(memory_id, accessed_at)
+            raise
+
+        return len(pending)
+
+
+# 初始化访问时间记录器实例
+memory_access_tracker = MemoryAccessTracker()
@@ -0,0 +1,407 @@
+import asyncio
+from typing import List, Dict, Any, Optional, Set, Tuple
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import UserMemory, ChatHistory, AppConfig
+from app.core.container import service_container
+from app.services.memory.manager import MemoryManager
+from app.services.memory.access import memory_access_tracker
+from app.services.memory.search import memory_fulltext_index
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class AsyncMemoryManager:
+    """异步记忆管理器，供API请求路径使用
+
+    数据库访问基于SQLAlchemy异步引擎，Embedding生成使用异步客户端；
+    向量存储没有异步接口，其调用在线程池中执行，避免阻塞事件循环。
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        # 复用进程级共享的服务实例
+        self.embedding_service = service_container.embedding_service
+        self.vector_store = service_container.vector_store
+
+    async def get_or_create_app_config(self, app_name: str) -> AppConfig:
+        """获取或创建应用配置
+
+        Args:
+            app_name: 应用名称
+
+        Returns:
+            应用配置对象
+        """
+        result = await self.db.execute(select(AppConfig).where(AppConfig.app_name == app_name))
+        config = result.scalars().first()
+
+        if not config:
+            # 创建默认应用配置
+            config = AppConfig(app_name=app_name)
+            self.db.add(config)
+            await self.db.commit()
+            await self.db.refresh(config)
+
+        return config
+
+    async def update_app_config(self, app_name: str, **kwargs) -> AppConfig:
+        """更新应用配置
+
+        Args:
+            app_name: 应用名称
+            **kwargs: 配置参数
+
+        Returns:
+            更新后的应用配置对象
+        """
+        config = await self.get_or_create_app_config(app_name)
+
+        # 更新配置参数
+        for key, value in kwargs.items():
+            if hasattr(config, key):
+                setattr(config, key, value)
+
+        await self.db.commit()
+        await self.db.refresh(config)
+        return config
+
+    async def get_all_app_configs(self) -> List[AppConfig]:
+        """获取所有应用配置
+
+        Returns:
+            应用配置列表
+        """
+        result = await self.db.execute(select(AppConfig))
+        return list(result.scalars().all())
+
+    async def get_memory(self, memory_id: int) -> Optional[UserMemory]:
+        """获取单个记忆
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            记忆对象，不存在返回None
+        """
+        result = await self.db.execute(
+            select(UserMemory).where(and_(UserMemory.id == memory_id, UserMemory.is_active == True))
+        )
+        memory = result.scalars().first()
+
+        if memory:
+            # 记录访问时间，由定时任务批量写回
+            memory_access_tracker.record([memory.id])
+
+        return memory
+
+    async def query_memories(self,
+                             user_id: str,
+                             app_name: str,
+                             query: str,
+                             top_k: int = 5,
+                             filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """查询相似记忆
+
+        Args:
+            user_id: 用户ID
+            app_name: 应用名称
+            query: 查询内容
+            top_k: 返回结果数量
+            filters: 元数据过滤条件（tags、min_priority、max_priority、created_after、created_before、is_archived）
+
+        Returns:
+            相似记忆列表
+        """
+        return (await self.query_memories_batch([(user_id, app_name, query, top_k)], [filters]))[0]
+
+    async def query_memories_batch(self,
+                                   queries: List[Tuple[str, str, str, int]],
+                                   filters: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[List[Dict[str, Any]]]:
+        """批量查询相似记忆
+
+        所有查询内容的Embedding在一次请求中生成，向量检索合并执行，命中的记忆通过一次IN查询加载。
+        启用混合检索的应用，关键词检索与向量检索并行执行，结果按倒数排名融合。
+        过滤条件下推到向量检索和关键词检索中，不满足条件的记忆不占用top_k名额。
+
+        Args:
+            queries: (user_id, app_name, query, top_k) 元组列表
+            filters: 每个查询的元数据过滤条件
+
+        Returns:
+            与输入顺序一致的相似记忆列表
+        """
+        filters = filters or [None] * len(queries)
+        # 混合检索的查询每一路多召回一些候选，融合后再截断为top_k
+        app_configs = await self.get_search_app_configs({app_name for _, app_name, _, _ in queries})
+        hybrid_apps = {app_name for app_name, config in app_configs.items() if config.enable_hybrid_search}
+        dimensions = {app_name: config.embedding_dimension for app_name, config in app_configs.items()}
+        hybrid_indices = [index for index, (_, app_name, _, _) in enumerate(queries) if app_name in hybrid_apps]
+        candidate_ks = [
+            top_k * settings.memory.hybrid_candidate_factor if app_name in hybrid_apps else top_k
+            for _, app_name, _, top_k in queries
+        ]
+
+        # 向量检索不访问数据库会话，与关键词检索并行执行
+        vector_results, lexical_results = await asyncio.gather(
+            self.query_vector_candidates(queries, candidate_ks, dimensions, filters),
+            self.query_keyword_candidates(
+                [queries[index] for index in hybrid_indices],
+                [candidate_ks[index] for index in hybrid_indices],
+                [filters[index] for index in hybrid_indices]
+            ),
+            return_exceptions=True
+        )
+        if isinstance(vector_results, Exception):
+            logger.error(f"Failed to query memories with embedding: {vector_results}")
+            vector_results = [[] for _ in queries]
+        if isinstance(lexical_results, Exception):
+            logger.error(f"Failed to query memories with keyword: {lexical_results}")
+            lexical_results = [[] for _ in hybrid_indices]
+
+        for index, keyword_results in zip(hybrid_indices, lexical_results):
+            vector_results[index] = self.fuse_ranked_results(vector_results[index], keyword_results, queries[index][3])
+
+        # 一次IN查询加载所有查询命中记忆所需的字段
+        memory_ids = list({result["memory_id"] for results in vector_results for result in results})
+        rows = (await self.db.execute(MemoryManager.memory_rows_statement(memory_ids))).all() if memory_ids else []
+        batch_results = [
+            MemoryManager.build_query_results(results, rows, query_filters)
+            for results, query_filters in zip(vector_results, filters)
+        ]
+
+        # 未启用混合检索且向量检索失败或返回空结果的查询，回退到基于关键词的查询
+        for index, (user_id, app_name, query, top_k) in enumerate(queries):
+            if not batch_results[index] and app_name not in hybrid_apps:
+                logger.info("Vector query returned empty results, falling back to keyword-based query")
+                batch_results[index] = await self.query_memories_by_keyword(user_id, app_name, query, top_k, filters[index])
+
+        # 访问时间由定时任务批量写回，不在读取路径上更新
+        memory_access_tracker.record([result["memory_id"] for results in batch_results for result in results])
+        return batch_results
+
+    @staticmethod
+    def fuse_ranked_results(vector_results: List[Dict[str, Any]], lexical_results: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """使用倒数排名融合（RRF）合并向量检索和关键词检索的结果
+
+        Args:
+            vector_results: 向量检索结果，similarity为距离
+            lexical_results: 关键词检索结果，similarity为0-1的相似度
+            top_k: 返回结果数量
+
+        Returns:
+            按融合分数降序排列的前top_k个结果，格式与向量检索结果一致（similarity为两路中较高相似度对应的距离）
+        """
+        rrf_k = settings.memory.hybrid_rrf_k
+        scores: Dict[int, float] = {}
+        similarities: Dict[int, float] = {}
+
+        ranked_lists = [
+            [(result["memory_id"], 1 - result["similarity"]) for result in vector_results],
+            # 关键词完全不匹配的结果不参与融合
+            [(result["memory_id"], result["similarity"]) for result in lexical_results if result["similarity"] > 0]
+        ]
+        for ranked in ranked_lists:
+            for rank, (memory_id, similarity) in enumerate(ranked, start=1):
+                scores[memory_id] = scores.get(memory_id, 0.0) + 1.0 / (rrf_k + rank)
+                similarities[memory_id] = max(similarities.get(memory_id, 0.0), similarity)
+
+        ranked_ids = sorted(scores, key=lambda memory_id: scores[memory_id], reverse=True)[:top_k]
+        return [{"memory_id": memory_id, "similarity": 1 - similarities[memory_id]} for memory_id in ranked_ids]
+
+    async def query_vector_candidates(self,
+                                      queries: List[Tuple[str, str, str, int]],
+                                      top_ks: List[int],
+                                      dimensions: Optional[Dict[str, Optional[int]]] = None,
+                                      filters: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[List[Dict[str, Any]]]:
+        """批量生成查询Embedding并执行向量检索
+
+        Args:
+            queries: (user_id, app_name, query, top_k) 元组列表
+            top_ks: 每个查询的召回数量
+            dimensions: 应用名称到Embedding维度的映射，缺省的应用使用完整维度
+            filters: 每个查询的元数据过滤条件
+
+        Returns:
+            与输入顺序一致的向量检索结果，similarity为距离，Embedding生成失败的查询为空列表
+        """
+        # 一次调用生成所有查询内容的完整Embedding（使用缓存），再按各应用的维度截断
+        dimensions = dimensions or {}
+        filters = filters or [None] * len(queries)
+        embeddings = await self.embedding_service.get_cached_embeddings_async([query for _, _, query, _ in queries])
+        # Embedding生成失败的查询返回空结果，由调用方回退到关键词检索
+        positions = [position for position, embedding in enumerate(embeddings) if embedding is not None]
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        if not positions:
+            return results
+
+        # 合并执行向量检索
+        batch_results = await asyncio.to_thread(
+            self.vector_store.query_embeddings_batch,
+            query_embeddings=[
+                self.embedding_service.reduce_embedding(embeddings[position], dimensions.get(queries[position][1]))
+                for position in positions
+            ],
+            user_ids=[queries[position][0] for position in positions],
+            app_names=[queries[position][1] for position in positions],
+            top_ks=[top_ks[position] for position in positions],
+            filters=[filters[position] for position in positions]
+        )
+        for position, query_results in zip(positions, batch_results):
+            results[position] = query_results
+        return results
+
+    async def query_keyword_candidates(self,
+                                       queries: List[Tuple[str, str, str, int]],
+                                       top_ks: List[int],
+                                       filters: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[List[Dict[str, Any]]]:
+        """依次执行关键词检索
+
+        Args:
+            queries: (user_id, app_name, query, top_k) 元组列表
+            top_ks: 每个查询的召回数量
+            filters: 每个查询的元数据过滤条件
+
+        Returns:
+            与输入顺序一致的关键词检索结果
+        """
+        filters = filters or [None] * len(queries)
+        return [
+            await self.query_memories_by_keyword(user_id, app_name, query, top_k, query_filters)
+            for (user_id, app_name, query, _), top_k, query_filters in zip(queries, top_ks, filters)
+        ]
+
+    async def get_search_app_configs(self, app_names: Set[str]) -> Dict[str, Any]:
+        """一次查询获取应用的检索相关配置
+
+        Args:
+            app_names: 应用名称集合
+
+        Returns:
+            应用名称到配置行（enable_hybrid_search、embedding_dimension）的映射，不存在的应用不包含在结果中
+        """
+        result = await self.db.execute(select(
+            AppConfig.app_name,
+            AppConfig.enable_hybrid_search,
+            AppConfig.embedding_dimension
+        ).where(AppConfig.app_name.in_(app_names)))
+        return {row.app_name: row for row in result.all()}
+
+    async def query_memories_by_keyword(self,
+                                        user_id: str,
+                                        app_name: str,
+                                        query: str,
+                                        top_k: int,
+                                        filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """基于关键词查询记忆，作为向量查询不可用时的降级方案
+
+        Args:
+            user_id: 用户ID
+            app_name: 应用名称
+            query: 查询内容
+            top_k: 返回结果数量
+            filters: 元数据过滤条件
+
+        Returns:
+            相似记忆列表
+        """
+        # 优先使用全文索引的BM25检索
+        conditions = MemoryManager.memory_filter_conditions(filters)
+        statement = memory_fulltext_index.search_statement(user_id, app_name, query, top_k, conditions)
+        short_term_statement = memory_fulltext_index.short_term_statement(user_id, app_name, query, conditions)
+        if statement is not None or short_term_statement is not None:
+            result_lists = []
+            if statement is not None:
+                result_lists.append(memory_fulltext_index.build_results((await self.db.execute(statement)).all()))
+            if short_term_statement is not None:
+                # trigram无法匹配的短词按子串召回候选，再按关键词相似度排序
+                rows = (await self.db.execute(short_term_statement)).all()
+                result_lists.append(MemoryManager.rank_rows_by_keyword(query, rows, top_k))
+            return memory_fulltext_index.merge_results(result_lists, top_k)
+
+        # 全文索引不可用或查询为空时，扫描该用户的记忆计算关键词相似度
+        rows = (await self.db.execute(MemoryManager.memory_rows_statement(user_id=user_id, app_name=app_name, filters=filters))).all()
+        return MemoryManager.rank_rows_by_keyword(query, rows, top_k)
+
+    async def delete_memory(self, memory_id: int) -> bool:
+        """删除记忆
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            是否删除成功
+        """
+        result = await self.db.execute(select(UserMemory).where(UserMemory.id == memory_id))
+        memory = result.scalars().first()
+
+        if memory:
+            # 软删除记忆
+            memory.is_active = False
+            await self.db.commit()
+
+            # 从向量存储中删除Embedding
+            await asyncio.to_thread(self.vector_store.delete_embedding, memory_id, memory.user_id, memory.app_name)
+
+            return True
+
+        return False
+
+    async def get_memories_by_user_app(self, user_id: str, app_name: str) -> List[UserMemory]:
+        """获取用户在特定应用下的所有记忆
+
+        Args:
+            user_id: 用户ID
+            app_name: 应用名称
+
+        Returns:
+            记忆列表
+        """
+        result = await self.db.execute(
+            select(UserMemory).where(
+                and_(
+                    UserMemory.user_id == user_id,
+                    UserMemory.app_name == app_name,
+                    UserMemory.is_active == True
+                )
+            ).order_by(UserMemory.last_accessed_at.desc())
+        )
+        return list(result.scalars().all())
+
+    async def get_chat_history(self, user_id: str, app_name: str, session_id: str = None) -> List[Dict[str, Any]]:
+        """获取聊天历史
+
+        Args:
+            user_id: 用户ID
+            app_name: 应用名称
+            session_id: 会话ID（可选）
+
+        Returns:
+            聊天历史列表
+        """
+        statement = select(ChatHistory).where(
+            and_(
+                ChatHistory.user_id == user_id,
+                ChatHistory.app_name == app_name
+            )
+        )
+
+        # 如果提供了session_id，添加到查询条件
+        if session_id:
+            statement = statement.where(ChatHistory.session_id == session_id)
+
+        # 按时间戳升序排列
+        result = await self.db.execute(statement.order_by(ChatHistory.timestamp.asc()))
+
+        return [{
+            "id": chat.id,
+            "user_id": chat.user_id,
+            "app_name": chat.app_name,
+            "session_id": chat.session_id,
+            "role": chat.role,
+            "content": chat.content,
+            "timestamp": chat.timestamp.isoformat()
+        } for chat in result.scalars().all()]
@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from app.models import UserMemory, AppConfig
+from app.core.config import settings
+from app.core.container import service_container
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class MemoryEmbeddingBackfill:
+    """为Embedding生成失败的记忆补写向量
+
+    创建或合并记忆时Embedding服务不可用，记忆被标记为embedding_pending，不写入缓存和向量存储。
+    定时任务按ID顺序分批读取到期的待补写记忆，每批合并为一次Embedding请求，成功的记忆写入embedding列
+    并加入向量存储，失败的记忆按指数退避推迟下次重试。一批全部失败时认为服务仍不可用，不计入各条记忆的失败次数，
+    结束本次补写，下次定时任务再重试。
+    """
+
+    def __init__(self,
+                 db: Session,
+                 batch_size: Optional[int] = None,
+                 retry_base_seconds: Optional[int] = None,
+                 retry_max_seconds: Optional[int] = None):
+        """初始化补写任务
+
+        Args:
+            db: 数据库会话
+            batch_size: 每批补写的记忆数
+            retry_base_seconds: 第一次失败后的重试间隔（秒），之后每次失败翻倍
+            retry_max_seconds: 重试间隔的上限（秒）
+        """
+        self.db = db
+        self.batch_size = batch_size or settings.memory.embedding_backfill_batch_size
+        self.retry_base_seconds = retry_base_seconds or settings.memory.embedding_retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds or settings.memory.embedding_retry_max_seconds
+        self.embedding_service = service_container.embedding_service
+        self.vector_store = service_container.vector_store
+
+    def retry_delay(self, attempts: int) -> timedelta:
+        """计算第attempts次失败后的重试间隔"""
+        return timedelta(seconds=min(self.retry_max_seconds, self.retry_base_seconds * 2 ** max(0, attempts - 1)))
+
+    @staticmethod
+    def pending_conditions() -> List[Any]:
+        """待补写记忆的查询条件"""
+        return [UserMemory.embedding_pending == True, UserMemory.is_active == True]
+
+    def backfill_batch(self, memories: List[UserMemory], dimensions: Dict[str, Optional[int]]) -> int:
+        """为一批记忆生成Embedding并写入向量存储
+
+        Args:
+            memories: 待补写的记忆
+            dimensions: 应用名称到Embedding维度的映射
+
+        Returns:
+            补写成功的记忆数
+        """
+        now = datetime.utcnow()
+        generated = self.embedding_service.get_cached_embeddings([memory.memory_content for memory in memories])
+        if all(embedding is None for embedding in generated):
+            # 服务不可用，不是这些记忆本身的问题，保持失败次数和重试时间不变
+            return 0
+
+        filled = []
+        for memory, embedding in zip(memories, generated):
+            if embedding is None:
+                memory.embedding_attempts = (memory.embedding_attempts or 0) + 1
+                memory.embedding_retry_at = now + self.retry_delay(memory.embedding_attempts)
+                continue
+            embedding = self.embedding_service.reduce_embedding(embedding, dimensions.get(memory.app_name))
+            memory.embedding, memory.embedding_dtype = self.embedding_service.pack_embedding(embedding)
+            memory.embedding_pending = False
+            memory.embedding_attempts = 0
+            memory.embedding_retry_at = None
+            filled.append((memory, embedding))
+        self.db.commit()
+
+        # 以upsert方式写入，合并时生成失败的记忆会覆盖向量存储中的旧向量
+        if filled:
+            self.vector_store.add_embeddings(
+                embeddings=[embedding for _, embedding in filled],
+                documents=[memory.memory_content for memory, _ in filled],
+                memory_ids=[memory.id for memory, _ in filled],
+                user_ids=[memory.user_id for memory, _ in filled],
+                app_names=[memory.app_name for memory, _ in filled],
+                metadatas=[self.vector_store.memory_metadata(memory) for memory, _ in filled]
+            )
+        return len(filled)
+
+    def run(self) -> int:
+        """补写所有到期的待补写记忆
+
+        Returns:
+            补写成功的记忆数
+        """
+        dimensions = dict(self.db.execute(select(AppConfig.app_name, AppConfig.embedding_dimension)).all())
+        filled = 0
+        last_id = 0
+        while True:
+            now = datetime.utcnow()
+            memories = self.db.execute(
+                select(UserMemory)
+                .where(*self.pending_conditions(), UserMemory.id > last_id)
+                .where(or_(UserMemory.embedding_retry_at.is_(None), UserMemory.embedding_retry_at <= now))
+                .order_by(UserMemory.id)
+                .limit(self.batch_size)
+            ).scalars().all()
+            if not memories:
+                break
+
+            last_id = memories[-1].id
+            count = self.backfill_batch(memories, dimensions)
+            filled += count
+            if count == 0:
+                logger.warning(f"Embedding backfill failed for a whole batch of {len(memories)} memories, retrying later")
+                break
+
+        if filled:
+            logger.info(f"Backfilled embeddings for {filled} memories")
+        return filled
+
+    @classmethod
+    def get_backlog(cls, db: Session) -> Dict[str, Any]:
+        """获取待补写Embedding的积压情况
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            pending（待补写记忆数）、due（已到重试时间的记忆数）、max_attempts（最大失败次数）、
+            oldest_pending_at（最早的待补写记忆的更新时间）
+        """
+        now = datetime.utcnow()
+        pending, due, max_attempts, oldest = db.execute(
+            select(
+                func.count(UserMemory.id),
+                func.count(UserMemory.id).filter(or_(UserMemory.embedding_retry_at.is_(None), UserMemory.embedding_retry_at <= now)),
+                func.max(UserMemory.embedding_attempts),
+                func.min(UserMemory.updated_at)
+            ).where(*cls.pending_conditions())
+        ).one()
+        return {
+            "pending": pending,
+            "due": due,
+            "max_attempts": max_attempts or 0,
+            "oldest_pending_at": oldest.isoformat() if oldest else None
+        }
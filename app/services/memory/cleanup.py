@@ -4,7 +4,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_
 
 from app.models import UserMemory, AppConfig
-from app.services.chroma import ChromaClient
+from app.core.container import service_container
+from app.services.memory.access import memory_access_tracker
 
 
 class MemoryCleanupService:
@@ -12,7 +13,7 @@ class MemoryCleanupService:
     
     def __init__(self, db: Session):
         self.db = db
-        self.chroma_client = ChromaClient()
+        self.vector_store = service_container.vector_store
     
     def get_expired_memories(self) -> List[UserMemory]:
         """获取所有过期记忆
@@ -223,14 +224,17 @@ class MemoryCleanupService:
         memory.is_active = False
         memory.updated_at = datetime.utcnow()
         
-        # 从Chroma中删除Embedding
-        self.chroma_client.delete_embedding(memory.id)
+        # 从向量存储中删除Embedding
+        self.vector_store.delete_embedding(memory.id, memory.user_id, memory.app_name)
         
         self.db.commit()
     
     def run_cleanup(self) -> None:
         """执行记忆清理
         """
+        # 先写回缓冲中的访问时间，保证基于最后访问时间的清理策略看到准确的时间
+        memory_access_tracker.flush(self.db)
+        
         # 清理过期记忆
         expired_memories = self.get_expired_memories()
         for memory in expired_memories:
@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_, func, select, update
 import json
 import numpy as np
 
@@ -9,10 +9,11 @@ from app.models import UserMemory, ChatHistory, AppConfig
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
-from app.schemas.memory import MemoryCreate, MemoryResponse, ChatMessage
-from app.services.embedding import EmbeddingServiceFactory
-from app.services.llm import LLMServiceFactory
-from app.services.chroma import ChromaClient
+from app.schemas.memory import MemoryCreate, MemoryResponse, ChatMessage, ChatHistoryCreate
+from app.core.container import service_container
+from app.services.memory.access import memory_access_tracker
+from app.services.memory.reindex import MemoryReindexer
+from app.services.vector_store import VectorStore
 from app.core.config import settings
 
 
@@ -21,9 +22,10 @@ class MemoryManager:
     
     def __init__(self, db: Session):
         self.db = db
-        self.embedding_service = EmbeddingServiceFactory.get_embedding_service()
-        self.llm_service = LLMServiceFactory.get_llm_service()
-        self.chroma_client = ChromaClient()
+        # 复用进程级共享的服务实例
+        self.embedding_service = service_container.embedding_service
+        self.llm_service = service_container.llm_service
+        self.vector_store = service_container.vector_store
     
     def get_or_create_config(self, user_id: str, app_name: str) -> AppConfig:
         """获取或创建应用配置
@@ -189,39 +191,29 @@ class MemoryManager:
         
         return True
     
-    def get_similar_memory(self, user_id: str, app_name: str, content: str, threshold: float = 0.85) -> Optional[UserMemory]:
-        """查找相似的记忆
+    def query_nearest_memories(self, user_ids: List[str], app_names: List[str], embeddings: List[List[float]]) -> List[Optional[List[Dict[str, Any]]]]:
+        """批量查询与各Embedding最接近的一条记忆向量，合并为一次向量存储查询
         
         Args:
-            user_id: 用户ID
-            app_name: 应用名称
-            content: 要比较的内容
-            threshold: 相似度阈值
+            user_ids: 用户ID列表
+            app_names: 应用名称列表
+            embeddings: 内容的Embedding向量列表
             
         Returns:
-            相似的记忆对象，没有则返回None
+            与输入顺序一致的top-1结果列表，查询失败时各项为None
         """
+        if not embeddings:
+            return []
         try:
-            # 生成内容的Embedding（使用缓存）
-            content_embedding = self.embedding_service.get_cached_embedding(content)
-            
-            # 查询相似记忆
-            chroma_results = self.chroma_client.query_embeddings(
-                query_embedding=content_embedding,
-                user_id=user_id,
-                app_name=app_name,
-                top_k=1
+            return self.vector_store.query_embeddings_batch(
+                query_embeddings=embeddings,
+                user_ids=user_ids,
+                app_names=app_names,
+                top_ks=[1] * len(embeddings)
             )
-            
-            if chroma_results and len(chroma_results) > 0:
-                similarity = 1 - chroma_results[0]["similarity"]
-                if similarity >= threshold:
-                    return self.get_memory(chroma_results[0]["memory_id"])
         except Exception as e:
-            # 如果查询失败，返回None
-            return None
-        
-        return None
+            logger.warning(f"Failed to query nearest memories: {e}")
+            return [None] * len(embeddings)
     
     def extract_elements(self, user_id: str, app_name: str, memory_content: str) -> Dict[str, Any]:
         """抽取记忆要素
@@ -234,7 +226,6 @@ class MemoryManager:
         Returns:
             抽取的要素
         """
-        import hashlib
         from app.utils.cache import cache
         
         # 检查内容是否需要提取要素
@@ -245,39 +236,19 @@ class MemoryManager:
         app_config = self.get_or_create_app_config(app_name)
         
         # 生成缓存键
-        cache_key = f"llm_extract:{app_name}:{hashlib.md5((memory_content + str(app_config.extraction_fields)).encode('utf-8')).hexdigest()}"
+        cache_key = self._extraction_cache_key(app_name, app_config, memory_content)
         
         # 尝试从缓存获取
         cached_result = cache.get(cache_key)
         if cached_result is not None:
             return cached_result
         
-        # 构建动态的抽取prompt，使用应用配置中的extraction_fields
-        fields_desc = "\n".join([f"{key}: {desc}" for key, desc in app_config.extraction_fields.items()])
-        
-        # 提取字段列表，用于模板变量渲染
-        field_list = list(app_config.extraction_fields.keys())
-        
         # 定义返回要求，作为模板变量
         return_requirements = "1. 使用JSON格式\n2. 键名必须与上述要素列表完全一致\n3. 每个键对应的值必须准确反映记忆中的内容\n4. 如果某个要素不存在，可省略该字段\n5. 不要添加任何额外内容\n\n请直接返回JSON结果："
-        
-        # 准备所有模板变量
-        template_vars = {
-            "field_list": ", ".join(field_list),
-            "field_count": str(len(field_list)),
-            "fields_desc": fields_desc,
-            "memory_content": memory_content,
-            "return_requirements": return_requirements
-        }
-        
-        # 渲染模板变量，支持多种模板变量
-        rendered_template = app_config.extraction_template
-        for var_name, var_value in template_vars.items():
-            rendered_template = rendered_template.replace(f"{{{{{var_name}}}}}", var_value)
-        
+
         # 使用完全渲染后的模板作为最终prompt
-        prompt = rendered_template
-        
+        prompt = self._render_extraction_prompt(app_config, memory_content, return_requirements)
+
         # 调用LLM进行要素提取
         response = self.llm_service.generate_text(prompt, app_name=app_name)
         
@@ -286,7 +257,7 @@ class MemoryManager:
             elements = json.loads(response)
             
             # 缓存结果
-            cache.set(cache_key, elements, expiry=settings.memory.llm_cache_ttl)
+            cache.set(cache_key, elements, expiry=timedelta(seconds=settings.memory.llm_cache_ttl))
             
             return elements
         except json.JSONDecodeError as e:
@@ -296,6 +267,62 @@ class MemoryManager:
             logger.error(f"Failed to extract elements: {e}")
             return {}
     
+    @staticmethod
+    def _extraction_cache_key(app_name: str, app_config: AppConfig, memory_content: str) -> str:
+        """生成要素抽取结果的缓存键"""
+        import hashlib
+        return f"llm_extract:{app_name}:{hashlib.md5((memory_content + str(app_config.extraction_fields)).encode('utf-8')).hexdigest()}"
+
+    def _render_extraction_prompt(self, app_config: AppConfig, memory_content: str, return_requirements: str) -> str:
+        """使用应用配置中的抽取模板渲染要素提取prompt
+
+        Args:
+            app_config: 应用配置
+            memory_content: 记忆内容
+            return_requirements: 返回格式要求
+
+        Returns:
+            渲染后的prompt
+        """
+        # 构建动态的抽取prompt，使用应用配置中的extraction_fields
+        fields_desc = "\n".join([f"{key}: {desc}" for key, desc in app_config.extraction_fields.items()])
+
+        # 提取字段列表，用于模板变量渲染
+        field_list = list(app_config.extraction_fields.keys())
+
+        # 准备所有模板变量
+        template_vars = {
+            "field_list": ", ".join(field_list),
+            "field_count": str(len(field_list)),
+            "fields_desc": fields_desc,
+            "memory_content": memory_content,
+            "return_requirements": return_requirements
+        }
+
+        # 渲染模板变量，支持多种模板变量
+        rendered_template = app_config.extraction_template
+        for var_name, var_value in template_vars.items():
+            rendered_template = rendered_template.replace(f"{{{{{var_name}}}}}", var_value)
+
+        return rendered_template
+
+    @staticmethod
+    def _parse_json_response(response: str) -> Any:
+        """解析LLM返回的JSON，兼容```json代码块包裹的情况
+
+        Args:
+            response: LLM返回的文本
+
+        Returns:
+            解析后的JSON对象
+        """
+        text = (response or "").strip()
+        if text.startswith("```"):
+            text = text.strip("`")
+            if text.startswith("json"):
+                text = text[4:]
+        return json.loads(text.strip())
+
     def calculate_expiry_time(self, user_id: str, app_name: str) -> Optional[datetime]:
         """计算记忆过期时间
         
@@ -313,86 +340,18 @@ class MemoryManager:
             return None
         else:
             return datetime.utcnow() + timedelta(days=config.expiry_days)
-    
-    def create_memory(self, user_id: str, app_name: str, memory_content: str, is_summary: bool = False) -> UserMemory:
-        """创建记忆
-        
+
+    @staticmethod
+    def calculate_priority(memory_content: str, extracted_elements: Dict[str, Any]) -> int:
+        """根据内容长度和要素数量计算记忆优先级
+
         Args:
-            user_id: 用户ID
-            app_name: 应用名称
             memory_content: 记忆内容
-            is_summary: 是否是对话总结结果
-            
+            extracted_elements: 抽取的要素
+
         Returns:
-            创建的记忆对象
+            优先级（1-5）
         """
-        # 如果不是总结结果，对内容进行总结
-        if not is_summary:
-            # 先对内容进行总结
-            summary = self.summarize_dialogue([ChatMessage(role="user", content=memory_content)])
-            # 使用总结作为记忆内容
-            memory_content = summary
-        
-        # 检查内容是否需要处理
-        if not self.should_process_content(user_id, app_name, memory_content):
-            # 如果内容不需要处理，创建一个低优先级的记忆
-            expiry_time = self.calculate_expiry_time(user_id, app_name)
-            memory = UserMemory(
-                user_id=user_id,
-                app_name=app_name,
-                memory_content=memory_content,
-                extracted_elements={},
-                memory_priority=1,  # 低优先级
-                memory_tags=["trivial"],
-                expiry_time=expiry_time,
-                last_accessed_at=datetime.utcnow()
-            )
-            self.db.add(memory)
-            self.db.commit()
-            self.db.refresh(memory)
-            return memory
-        
-        # 查找相似记忆，如果存在则更新
-        similar_memory = self.get_similar_memory(user_id, app_name, memory_content)
-        if similar_memory:
-            # 更新相似记忆，实现增量抽取
-            updated_content = f"{similar_memory.memory_content}\n\n---\n\n{memory_content}"
-            
-            # 重新抽取要素
-            updated_elements = self.extract_elements(user_id, app_name, updated_content)
-            
-            # 合并要素
-            merged_elements = similar_memory.extracted_elements or {}
-            merged_elements.update(updated_elements)
-            
-            # 更新记忆
-            similar_memory.memory_content = updated_content
-            similar_memory.extracted_elements = merged_elements
-            similar_memory.last_accessed_at = datetime.utcnow()
-            similar_memory.updated_at = datetime.utcnow()
-            
-            self.db.commit()
-            self.db.refresh(similar_memory)
-            
-            # 更新Embedding
-            updated_embedding = self.embedding_service.generate_embedding(updated_content)
-            self.chroma_client.update_embedding(
-                memory_id=similar_memory.id,
-                embedding=updated_embedding,
-                document=updated_content,
-                user_id=user_id,
-                app_name=app_name
-            )
-            
-            return similar_memory
-        
-        # 抽取要素
-        extracted_elements = self.extract_elements(user_id, app_name, memory_content)
-        
-        # 计算过期时间
-        expiry_time = self.calculate_expiry_time(user_id, app_name)
-        
-        # 设置记忆优先级（基于内容长度和要素数量）
         priority = 3  # 默认优先级
         if len(memory_content) > 1000:
             priority = 4
@@ -400,8 +359,18 @@ class MemoryManager:
             priority = 5
         elif len(extracted_elements) < 2:
             priority = 2
-        
-        # 自动生成记忆标签
+        return priority
+
+    @staticmethod
+    def generate_tags(extracted_elements: Dict[str, Any]) -> List[str]:
+        """根据抽取的要素自动生成记忆标签
+
+        Args:
+            extracted_elements: 抽取的要素
+
+        Returns:
+            标签列表
+        """
         tags = []
         if "name" in extracted_elements:
             tags.append("personal_info")
@@ -411,37 +380,681 @@ class MemoryManager:
             tags.append("plan")
         if "question" in extracted_elements or "problem" in extracted_elements:
             tags.append("question")
+        return tags
+
+    def consolidate_memory_content(self, app_name: str, existing_content: str, new_contents: List[str]) -> str:
+        """将新内容合并到已有记忆内容中
+
+        rolling模式下合并结果超出长度预算时，由LLM重新总结为一份不超过预算的规范化摘要，
+        已有内容始终不超过预算，因此每次合并的开销与记忆被强化的次数无关。
+
+        Args:
+            app_name: 应用名称
+            existing_content: 已有记忆内容
+            new_contents: 新内容列表
+
+        Returns:
+            合并后的记忆内容
+        """
+        combined = "\n\n---\n\n".join([existing_content] + list(new_contents))
+        max_length = settings.memory.consolidation_max_length
+        if settings.memory.consolidation_mode != "rolling" or len(combined) <= max_length:
+            return combined
+
+        new_block = "\n\n".join(new_contents)
+        prompt = f"请将以下已有记忆和新增内容合并为一份完整、简洁的记忆总结：\n\n1. 保留已有记忆中仍然有效的关键信息\n2. 新增内容与已有记忆冲突时以新增内容为准\n3. 总结不超过{max_length}字\n\n已有记忆：\n{existing_content}\n\n新增内容：\n{new_block}\n\n请直接返回合并后的总结，不要添加任何额外内容："
+        try:
+            consolidated = self.llm_service.generate_text(prompt, app_name=app_name).strip()
+            if consolidated:
+                return consolidated[:max_length]
+        except Exception as e:
+            logger.error(f"Failed to consolidate memory content: {e}")
+
+        # 总结失败时保留最新的内容，保证记忆长度不超过预算
+        return combined[-max_length:]
+
+    @staticmethod
+    def compute_embedding_centroid(existing_embedding: List[float], existing_count: int, new_embeddings: List[List[float]]) -> List[float]:
+        """计算记忆Embedding的加权质心
+
+        Args:
+            existing_embedding: 已有的Embedding向量
+            existing_count: 已有向量代表的内容数
+            new_embeddings: 新内容的Embedding向量列表
+
+        Returns:
+            新的质心向量
+        """
+        existing_count = max(1, existing_count or 1)
+        total = np.asarray(existing_embedding, dtype=float) * existing_count + np.sum(np.asarray(new_embeddings, dtype=float), axis=0)
+        centroid = total / (existing_count + len(new_embeddings))
+        if settings.embedding.normalize:
+            norm = np.linalg.norm(centroid)
+            if norm > 0:
+                centroid = centroid / norm
+        return centroid.tolist()
+
+    def embedding_columns(self, embedding: Optional[List[float]]) -> Dict[str, Any]:
+        """生成记忆表embedding列的取值
         
-        # 创建记忆对象
-        memory = UserMemory(
-            user_id=user_id,
-            app_name=app_name,
-            memory_content=memory_content,
-            extracted_elements=extracted_elements,
-            memory_priority=priority,
-            memory_tags=tags if tags else None,
-            expiry_time=expiry_time,
-            last_accessed_at=datetime.utcnow()
-        )
+        向量为空（Embedding生成失败）时把记忆标记为待补写，由后台任务生成Embedding后再写入向量存储。
         
-        self.db.add(memory)
-        self.db.commit()
-        self.db.refresh(memory)
-        
-        # 生成并存储Embedding（使用缓存）
-        embedding = self.embedding_service.get_cached_embedding(memory_content)
-        
-        # 存储到Chroma
-        self.chroma_client.add_embedding(
-            embedding=embedding,
-            document=memory_content,
-            memory_id=memory.id,
-            user_id=user_id,
-            app_name=app_name
-        )
+        Args:
+            embedding: 写入向量存储的Embedding向量
+            
+        Returns:
+            embedding和embedding_dtype字段，向量为空时为embedding_pending字段
+        """
+        if embedding is None:
+            return {"embedding_pending": True}
+        data, dtype = self.embedding_service.pack_embedding(embedding)
+        return {"embedding": data, "embedding_dtype": dtype}
+    
+    def get_stored_embeddings(self, memories: List[UserMemory]) -> Dict[int, Any]:
+        """获取记忆已写入的向量，优先读取记忆表的embedding列，没有时再从向量存储读取
         
-        return memory
+        Args:
+            memories: 记忆对象列表
+            
+        Returns:
+            记忆ID到向量的映射，都不存在的记忆不包含在结果中
+        """
+        embeddings = {}
+        for memory in memories:
+            vector = self.embedding_service.unpack_embedding(memory.embedding, memory.embedding_dtype)
+            if vector is not None:
+                embeddings[memory.id] = vector
+        missing = [memory for memory in memories if memory.id not in embeddings]
+        if missing:
+            embeddings.update(self.vector_store.get_embeddings(
+                [memory.id for memory in missing],
+                [memory.user_id for memory in missing],
+                [memory.app_name for memory in missing]
+            ))
+        return embeddings
     
+    def store_chat_histories_bulk(self, chat_histories: List[ChatHistoryCreate], session_ids: Optional[List[str]] = None) -> List[str]:
+        """批量存储聊天历史，所有会话的消息在一次提交中写入
+
+        Args:
+            chat_histories: 聊天历史列表
+            session_ids: 与聊天历史顺序一致的会话ID列表，不提供则自动生成；
+                提供时会先删除这些会话已有的消息，保证重试时不会重复写入
+
+        Returns:
+            与输入顺序一致的会话ID列表
+        """
+        import uuid
+
+        if session_ids:
+            self.db.query(ChatHistory).filter(
+                ChatHistory.session_id.in_(session_ids)
+            ).delete(synchronize_session=False)
+        else:
+            session_ids = [str(uuid.uuid4()) for _ in chat_histories]
+
+        chat_rows = []
+        for chat_history, session_id in zip(chat_histories, session_ids):
+            for message in chat_history.messages:
+                chat_rows.append(ChatHistory(
+                    user_id=chat_history.user_id,
+                    app_name=chat_history.app_name,
+                    session_id=session_id,
+                    role=message.role,
+                    content=message.content,
+                    timestamp=message.timestamp or datetime.utcnow()
+                ))
+
+        self.db.add_all(chat_rows)
+        self.db.commit()
+        return session_ids
+
+    def summarize_dialogues(self, dialogues: List[List[ChatMessage]]) -> List[str]:
+        """批量总结对话，每个分块只调用一次LLM
+
+        Args:
+            dialogues: 对话列表，每个对话为聊天消息列表
+
+        Returns:
+            与输入顺序一致的对话总结列表
+        """
+        chunk_size = max(1, settings.memory.bulk_llm_chunk_size)
+        summaries = []
+        for start in range(0, len(dialogues), chunk_size):
+            summaries.extend(self._summarize_dialogue_chunk(dialogues[start:start + chunk_size]))
+        return summaries
+
+    def _summarize_dialogue_chunk(self, dialogues: List[List[ChatMessage]]) -> List[str]:
+        """在一次LLM调用中总结一个分块内的多段对话，失败时逐条总结"""
+        if len(dialogues) == 1:
+            return [self.summarize_dialogue(dialogues[0])]
+
+        # 为每段对话编号，要求LLM按顺序返回JSON数组
+        blocks = []
+        for index, messages in enumerate(dialogues, start=1):
+            dialogue = "\n".join([f"{msg.role}: {msg.content}" for msg in messages])
+            blocks.append(f"[对话{index}]\n{dialogue}")
+        dialogue_block = "\n\n".join(blocks)
+        prompt = f"请分别对以下{len(dialogues)}段对话进行总结，概括每段对话的核心内容和关键信息，确保结果简洁明了。\n\n{dialogue_block}\n\n请返回一个长度为{len(dialogues)}的JSON字符串数组，第i个元素为第i段对话的总结，不要添加任何额外内容："
+
+        try:
+            summaries = self._parse_json_response(self.llm_service.generate_text(prompt))
+            if isinstance(summaries, list) and len(summaries) == len(dialogues):
+                return [str(summary).strip() for summary in summaries]
+            logger.warning(f"Batch summary returned unexpected shape for {len(dialogues)} dialogues, falling back to per-dialogue summaries")
+        except Exception as e:
+            logger.error(f"Failed to summarize dialogue batch: {e}")
+
+        return [self.summarize_dialogue(messages) for messages in dialogues]
+
+    def _build_combined_prompt(self, app_config: AppConfig, dialogue_block: str, count: int) -> str:
+        """构建同时完成对话总结和要素抽取的prompt
+
+        Args:
+            app_config: 应用配置
+            dialogue_block: 对话内容，多段对话时已编号
+            count: 对话段数，大于1时要求返回JSON数组
+
+        Returns:
+            prompt文本
+        """
+        fields_desc = "\n".join([f"{key}: {desc}" for key, desc in app_config.extraction_fields.items()])
+        result_format = '{"summary": "对话总结", "elements": {"要素名": "要素值"}}'
+        if count > 1:
+            return_requirements = f"请返回一个长度为{count}的JSON数组，第i个元素对应第i段对话，每个元素的结构为：{result_format}"
+        else:
+            return_requirements = f"请返回如下结构的JSON对象：{result_format}"
+
+        return f"请对以下对话进行处理，在一次回答中同时完成以下任务：\n\n1. summary：总结对话的核心内容，概括关键信息，确保简洁明了，不超过{app_config.max_summary_length}字\n2. elements：按照以下要素列表提取要素，键名必须与要素列表完全一致，不存在的要素可省略\n{fields_desc}\n\n对话内容：\n{dialogue_block}\n\n{return_requirements}\n不要添加任何额外内容，请直接返回JSON结果："
+
+    def _cache_combined_elements(self, app_name: str, app_config: AppConfig, summary: str, elements: Dict[str, Any]) -> None:
+        """将合并调用得到的要素写入抽取缓存，后续对同一总结抽取要素时可直接命中"""
+        from app.utils.cache import cache
+
+        cache.set(
+            self._extraction_cache_key(app_name, app_config, summary),
+            elements,
+            expiry=timedelta(seconds=settings.memory.llm_cache_ttl)
+        )
+
+    def summarize_and_extract(self, app_name: str, messages: List[ChatMessage]) -> tuple:
+        """在一次LLM调用中同时完成对话总结和要素抽取
+
+        Args:
+            app_name: 应用名称
+            messages: 聊天消息列表
+
+        Returns:
+            (对话总结, 抽取的要素) 元组
+        """
+        if not messages:
+            return "", {}
+
+        app_config = self.get_or_create_app_config(app_name)
+        dialogue = "\n".join([f"{msg.role}: {msg.content}" for msg in messages])
+        prompt = self._build_combined_prompt(app_config, dialogue, 1)
+
+        try:
+            result = self._parse_json_response(self.llm_service.generate_text(prompt, app_name=app_name))
+            summary = str(result.get("summary", "")).strip()
+            elements = result.get("elements") or {}
+            if summary and isinstance(elements, dict):
+                self._cache_combined_elements(app_name, app_config, summary, elements)
+                return summary, elements
+            logger.warning("Combined summarize-and-extract response is missing fields, falling back to separate calls")
+        except Exception as e:
+            logger.error(f"Failed to summarize and extract dialogue: {e}")
+
+        # 合并调用失败时退回到分别总结和抽取
+        summary = self.summarize_dialogue(messages)
+        return summary, self.extract_elements(None, app_name, summary)
+
+    def summarize_and_extract_dialogues(self, app_name: str, dialogues: List[List[ChatMessage]]) -> List[tuple]:
+        """批量对同一应用下的多段对话同时完成总结和要素抽取，每个分块只调用一次LLM
+
+        Args:
+            app_name: 应用名称
+            dialogues: 对话列表，每个对话为聊天消息列表
+
+        Returns:
+            与输入顺序一致的 (对话总结, 抽取的要素) 元组列表
+        """
+        app_config = self.get_or_create_app_config(app_name)
+        chunk_size = max(1, settings.memory.bulk_llm_chunk_size)
+        results = []
+
+        for start in range(0, len(dialogues), chunk_size):
+            chunk = dialogues[start:start + chunk_size]
+            if len(chunk) == 1:
+                results.append(self.summarize_and_extract(app_name, chunk[0]))
+                continue
+
+            blocks = []
+            for index, messages in enumerate(chunk, start=1):
+                dialogue = "\n".join([f"{msg.role}: {msg.content}" for msg in messages])
+                blocks.append(f"[对话{index}]\n{dialogue}")
+            prompt = self._build_combined_prompt(app_config, "\n\n".join(blocks), len(chunk))
+
+            try:
+                parsed = self._parse_json_response(self.llm_service.generate_text(prompt, app_name=app_name))
+                if isinstance(parsed, list) and len(parsed) == len(chunk) and all(
+                    isinstance(item, dict) and item.get("summary") and isinstance(item.get("elements") or {}, dict)
+                    for item in parsed
+                ):
+                    for item in parsed:
+                        summary = str(item["summary"]).strip()
+                        elements = item.get("elements") or {}
+                        self._cache_combined_elements(app_name, app_config, summary, elements)
+                        results.append((summary, elements))
+                    continue
+                logger.warning(f"Batch summarize-and-extract returned unexpected shape for {len(chunk)} dialogues, falling back to per-dialogue calls")
+            except Exception as e:
+                logger.error(f"Failed to summarize and extract dialogue batch: {e}")
+
+            results.extend([self.summarize_and_extract(app_name, messages) for messages in chunk])
+
+        return results
+
+    def extract_elements_bulk(self, app_name: str, memory_contents: List[str]) -> List[Dict[str, Any]]:
+        """批量抽取同一应用下多条记忆的要素，每个分块只调用一次LLM
+
+        Args:
+            app_name: 应用名称
+            memory_contents: 记忆内容列表
+
+        Returns:
+            与输入顺序一致的要素列表
+        """
+        from app.utils.cache import cache
+
+        results: List[Dict[str, Any]] = [{} for _ in memory_contents]
+        app_config = self.get_or_create_app_config(app_name)
+
+        # 先命中缓存，只对未缓存的内容调用LLM
+        pending = []
+        for index, memory_content in enumerate(memory_contents):
+            if len(memory_content.strip()) < 10:
+                continue
+            cached_result = cache.get(self._extraction_cache_key(app_name, app_config, memory_content))
+            if cached_result is not None:
+                results[index] = cached_result
+            else:
+                pending.append(index)
+
+        chunk_size = max(1, settings.memory.bulk_llm_chunk_size)
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            if len(chunk) == 1:
+                results[chunk[0]] = self.extract_elements(None, app_name, memory_contents[chunk[0]])
+                continue
+
+            memory_block = "\n\n".join([f"[记忆{n}]\n{memory_contents[index]}" for n, index in enumerate(chunk, start=1)])
+            return_requirements = f"1. 以上共有{len(chunk)}条记忆，请分别提取要素\n2. 返回一个长度为{len(chunk)}的JSON数组，第i个元素为第i条记忆的要素JSON对象\n3. 键名必须与上述要素列表完全一致\n4. 如果某个要素不存在，可省略该字段\n5. 不要添加任何额外内容\n\n请直接返回JSON数组："
+            prompt = self._render_extraction_prompt(app_config, memory_block, return_requirements)
+
+            try:
+                elements_list = self._parse_json_response(self.llm_service.generate_text(prompt, app_name=app_name))
+                if isinstance(elements_list, list) and len(elements_list) == len(chunk) and all(isinstance(item, dict) for item in elements_list):
+                    for index, elements in zip(chunk, elements_list):
+                        results[index] = elements
+                        cache.set(
+                            self._extraction_cache_key(app_name, app_config, memory_contents[index]),
+                            elements,
+                            expiry=timedelta(seconds=settings.memory.llm_cache_ttl)
+                        )
+                    continue
+                logger.warning(f"Batch extraction returned unexpected shape for {len(chunk)} memories, falling back to per-memory extraction")
+            except Exception as e:
+                logger.error(f"Failed to extract elements in batch: {e}")
+
+            for index in chunk:
+                results[index] = self.extract_elements(None, app_name, memory_contents[index])
+
+        return results
+
+    def _extract_elements_grouped(self, items: List[tuple]) -> List[Dict[str, Any]]:
+        """按应用分组批量抽取要素
+
+        Args:
+            items: (app_name, memory_content) 元组列表
+
+        Returns:
+            与输入顺序一致的要素列表
+        """
+        results: List[Dict[str, Any]] = [{} for _ in items]
+        grouped: Dict[str, List[int]] = {}
+        for index, (app_name, _) in enumerate(items):
+            grouped.setdefault(app_name, []).append(index)
+
+        for app_name, indices in grouped.items():
+            elements_list = self.extract_elements_bulk(app_name, [items[index][1] for index in indices])
+            for index, elements in zip(indices, elements_list):
+                results[index] = elements
+
+        return results
+
+    def create_memories_bulk(self,
+                             chat_histories: List[ChatHistoryCreate],
+                             session_ids: Optional[List[str]] = None,
+                             before_commit: Optional[Callable[[List[UserMemory]], None]] = None) -> List[UserMemory]:
+        """批量提交聊天历史并生成记忆
+
+        聊天记录写入、对话总结、要素抽取、Embedding生成和Chroma写入均按批执行，
+        而不是每个会话各执行一次。
+
+        Args:
+            chat_histories: 聊天历史列表
+            session_ids: 与聊天历史顺序一致的会话ID列表（可选）
+            before_commit: 记忆写入数据库后、提交前调用，参数为与输入顺序一致的记忆列表，
+                调用方可在同一事务中记录结果
+
+        Returns:
+            与输入顺序一致的记忆对象列表
+        """
+        if not chat_histories:
+            return []
+
+        # 一次提交写入所有聊天记录
+        self.store_chat_histories_bulk(chat_histories, session_ids)
+
+        # 按应用分组，启用合并模式的应用在一次LLM调用中同时完成总结和要素抽取
+        results: List[Optional[tuple]] = [None] * len(chat_histories)
+        grouped: Dict[str, List[int]] = {}
+        for index, chat_history in enumerate(chat_histories):
+            grouped.setdefault(chat_history.app_name, []).append(index)
+
+        for app_name, indices in grouped.items():
+            dialogues = [chat_histories[index].messages for index in indices]
+            if self.get_or_create_app_config(app_name).enable_combined_extraction:
+                group_results = self.summarize_and_extract_dialogues(app_name, dialogues)
+            else:
+                # 分块批量总结对话，要素在后续步骤中抽取
+                group_results = [(summary, None) for summary in self.summarize_dialogues(dialogues)]
+            for index, result in zip(indices, group_results):
+                results[index] = result
+
+        return self.create_memories_from_contents([
+            (chat_history.user_id, chat_history.app_name, summary, extracted_elements)
+            for chat_history, (summary, extracted_elements) in zip(chat_histories, results)
+        ], before_commit=before_commit)
+
+    def create_memories_from_contents(self,
+                                      items: List[tuple],
+                                      before_commit: Optional[Callable[[List[UserMemory]], None]] = None,
+                                      similarity_threshold: float = 0.85) -> List[UserMemory]:
+        """根据已总结的记忆内容批量创建或更新记忆
+
+        所有内容的Embedding一次生成，最近邻记忆一次批量查询；与已有记忆相似的内容合并到已有记忆中，
+        同一批次中彼此相似的新内容合并为一条新记忆。
+        新记忆和更新在一次事务中提交；提交后写入向量存储失败时，相关记忆标记为待补写，由后台任务补写向量。
+
+        Args:
+            items: (user_id, app_name, memory_content, extracted_elements) 元组列表，
+                extracted_elements为None时由本方法批量抽取
+            before_commit: 记忆写入数据库后、提交前调用，参数为与输入顺序一致的记忆列表
+            similarity_threshold: 内容合并到相似记忆的相似度阈值
+
+        Returns:
+            与输入顺序一致的记忆对象列表
+        """
+        memories: List[Optional[UserMemory]] = [None] * len(items)
+        expiry_times: Dict[tuple, Optional[datetime]] = {}
+        dimensions: Dict[str, Optional[int]] = {}
+
+        def get_expiry_time(user_id: str, app_name: str) -> Optional[datetime]:
+            key = (user_id, app_name)
+            if key not in expiry_times:
+                expiry_times[key] = self.calculate_expiry_time(user_id, app_name)
+            return expiry_times[key]
+
+        def get_dimension(app_name: str) -> Optional[int]:
+            if app_name not in dimensions:
+                dimensions[app_name] = self.get_embedding_dimension(app_name)
+            return dimensions[app_name]
+
+        # 过滤无需处理的内容，直接创建低优先级记忆
+        new_memories = []
+        processable = []
+        for index, (user_id, app_name, memory_content, _) in enumerate(items):
+            if self.should_process_content(user_id, app_name, memory_content):
+                processable.append(index)
+                continue
+            memory = UserMemory(
+                user_id=user_id,
+                app_name=app_name,
+                memory_content=memory_content,
+                extracted_elements={},
+                memory_priority=1,  # 低优先级
+                memory_tags=["trivial"],
+                expiry_time=get_expiry_time(user_id, app_name),
+                last_accessed_at=datetime.utcnow()
+            )
+            memories[index] = memory
+            new_memories.append(memory)
+
+        # 一次调用生成所有待处理内容的完整Embedding（使用缓存），再按各应用的维度截断
+        embeddings = [
+            self.embedding_service.reduce_embedding(embedding, get_dimension(items[index][1]))
+            for index, embedding in zip(processable, self.embedding_service.get_cached_embeddings([items[index][2] for index in processable]))
+        ]
+
+        # 一次批量查询所有内容的最近邻记忆，再一次加载命中的记忆
+        queried = [(index, embedding) for index, embedding in zip(processable, embeddings) if embedding is not None]
+        nearest_results = self.query_nearest_memories(
+            [items[index][0] for index, _ in queried],
+            [items[index][1] for index, _ in queried],
+            [embedding for _, embedding in queried]
+        )
+        nearest_ids = {
+            index: results[0]["memory_id"]
+            for (index, _), results in zip(queried, nearest_results)
+            if results and 1 - results[0]["similarity"] >= similarity_threshold
+        }
+        nearest_memories = {
+            memory.id: memory for memory in self.db.query(UserMemory).filter(
+                UserMemory.id.in_(set(nearest_ids.values())),
+                UserMemory.is_active == True
+            ).all()
+        } if nearest_ids else {}
+
+        # 相似的内容合并到已有记忆中；同一批次中与之前的新内容相似的内容合并到该新内容创建的记忆中；
+        # Embedding生成失败的内容直接创建为待补写的记忆
+        similar_memories: Dict[int, UserMemory] = {}
+        similar_items: Dict[int, List[int]] = {}
+        created = []
+        duplicates: Dict[int, List[int]] = {}
+        batch_vectors: Dict[tuple, List[tuple]] = {}
+        for index, embedding in zip(processable, embeddings):
+            user_id, app_name, memory_content, _ = items[index]
+            similar_memory = nearest_memories.get(nearest_ids.get(index))
+            if similar_memory:
+                similar_memories[similar_memory.id] = similar_memory
+                similar_items.setdefault(similar_memory.id, []).append(index)
+                memories[index] = similar_memory
+                continue
+            if embedding is not None:
+                vector = np.asarray(embedding, dtype=float)
+                vector = vector / (np.linalg.norm(vector) or 1)
+                group = batch_vectors.setdefault((user_id, app_name, len(embedding)), [])
+                if group:
+                    scores = np.stack([group_vector for _, group_vector in group]) @ vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= similarity_threshold:
+                        duplicates.setdefault(group[best][0], []).append(index)
+                        continue
+                group.append((index, vector))
+            created.append((index, embedding))
+
+        # 更新相似记忆，rolling模式下内容超出长度预算时重新总结
+        rolling = settings.memory.consolidation_mode == "rolling"
+        updated_ids = list(similar_memories.keys())
+        updated_contents = [
+            self.consolidate_memory_content(
+                similar_memories[memory_id].app_name,
+                similar_memories[memory_id].memory_content,
+                [items[index][2] for index in similar_items[memory_id]]
+            )
+            for memory_id in updated_ids
+        ]
+        if rolling:
+            # rolling模式只对尚未抽取要素的新内容抽取，再合并到已有要素中
+            pending = [index for memory_id in updated_ids for index in similar_items[memory_id] if items[index][3] is None]
+            item_elements = dict(zip(pending, self._extract_elements_grouped([
+                (items[index][1], items[index][2]) for index in pending
+            ])))
+            reextracted_elements = {}
+        else:
+            # 新内容已在总结时抽取要素的直接合并，其余对合并后的内容重新抽取
+            item_elements = {}
+            reextract = [
+                position for position, memory_id in enumerate(updated_ids)
+                if any(items[index][3] is None for index in similar_items[memory_id])
+            ]
+            reextracted_elements = dict(zip(reextract, self._extract_elements_grouped([
+                (similar_memories[updated_ids[position]].app_name, updated_contents[position])
+                for position in reextract
+            ])))
+
+        # rolling模式下用新内容的Embedding更新加权质心，缺少已有向量时再对合并后的内容生成Embedding
+        item_embeddings = dict(zip(processable, embeddings))
+        existing_embeddings = self.get_stored_embeddings([similar_memories[memory_id] for memory_id in updated_ids]) if rolling and updated_ids else {}
+        updated_embeddings: List[Optional[List[float]]] = []
+        for memory_id in updated_ids:
+            new_embeddings = [item_embeddings[index] for index in similar_items[memory_id]]
+            # 应用的Embedding维度变化后，已有向量无法与新向量求质心
+            if memory_id in existing_embeddings and len(existing_embeddings[memory_id]) == len(new_embeddings[0]):
+                updated_embeddings.append(self.compute_embedding_centroid(
+                    existing_embeddings[memory_id],
+                    similar_memories[memory_id].reinforcement_count,
+                    new_embeddings
+                ))
+            else:
+                updated_embeddings.append(None)
+        missing = [position for position, embedding in enumerate(updated_embeddings) if embedding is None]
+        if missing:
+            missing_embeddings = self.embedding_service.get_cached_embeddings([updated_contents[position] for position in missing])
+            for position, embedding in zip(missing, missing_embeddings):
+                if embedding is not None:
+                    updated_embeddings[position] = self.embedding_service.reduce_embedding(
+                        embedding, get_dimension(similar_memories[updated_ids[position]].app_name)
+                    )
+
+        for position, (memory_id, content) in enumerate(zip(updated_ids, updated_contents)):
+            similar_memory = similar_memories[memory_id]
+            merged_elements = dict(similar_memory.extracted_elements or {})
+            if position in reextracted_elements:
+                merged_elements.update(reextracted_elements[position])
+            else:
+                for index in similar_items[memory_id]:
+                    merged_elements.update(items[index][3] if items[index][3] is not None else item_elements[index])
+            similar_memory.memory_content = content
+            similar_memory.extracted_elements = merged_elements
+            similar_memory.reinforcement_count = (similar_memory.reinforcement_count or 1) + len(similar_items[memory_id])
+            if updated_embeddings[position] is not None:
+                similar_memory.embedding, similar_memory.embedding_dtype = self.embedding_service.pack_embedding(updated_embeddings[position])
+            else:
+                similar_memory.embedding_pending = True
+            similar_memory.last_accessed_at = datetime.utcnow()
+            similar_memory.updated_at = datetime.utcnow()
+
+        # 为尚未抽取要素的新记忆（包括批次内合并的内容）批量抽取要素
+        pending_extraction = [
+            index for created_index, _ in created
+            for index in [created_index] + duplicates.get(created_index, [])
+            if items[index][3] is None
+        ]
+        created_elements = dict(zip(pending_extraction, self._extract_elements_grouped([
+            (items[index][1], items[index][2]) for index in pending_extraction
+        ])))
+
+        # 批次内合并的新记忆：合并内容，rolling模式下取各内容Embedding的质心，否则对合并后的内容生成Embedding
+        merged_contents = {
+            index: self.consolidate_memory_content(items[index][1], items[index][2], [items[duplicate][2] for duplicate in duplicates[index]])
+            for index, _ in created if index in duplicates
+        }
+        merged_embeddings = {}
+        if merged_contents and rolling:
+            merged_embeddings = {
+                index: self.compute_embedding_centroid(item_embeddings[index], 1, [item_embeddings[duplicate] for duplicate in duplicates[index]])
+                for index in merged_contents
+            }
+        elif merged_contents:
+            for index, embedding in zip(merged_contents, self.embedding_service.get_cached_embeddings(list(merged_contents.values()))):
+                merged_embeddings[index] = self.embedding_service.reduce_embedding(embedding, get_dimension(items[index][1])) if embedding is not None else None
+        created = [(index, merged_embeddings.get(index, embedding)) for index, embedding in created]
+
+        for index, embedding in created:
+            user_id, app_name, memory_content, extracted_elements = items[index]
+            group = [index] + duplicates.get(index, [])
+            extracted_elements = {}
+            for member in group:
+                extracted_elements.update(items[member][3] if items[member][3] is not None else created_elements[member])
+            memory_content = merged_contents.get(index, memory_content)
+            tags = self.generate_tags(extracted_elements)
+            memory = UserMemory(
+                user_id=user_id,
+                app_name=app_name,
+                memory_content=memory_content,
+                extracted_elements=extracted_elements,
+                memory_priority=self.calculate_priority(memory_content, extracted_elements),
+                memory_tags=tags if tags else None,
+                reinforcement_count=len(group),
+                expiry_time=get_expiry_time(user_id, app_name),
+                last_accessed_at=datetime.utcnow(),
+                **self.embedding_columns(embedding)
+            )
+            for member in group:
+                memories[member] = memory
+            new_memories.append(memory)
+
+        # 一次提交写入所有新记忆和更新
+        self.db.add_all(new_memories)
+        self.db.flush()
+        # 待补写Embedding的记忆不写入向量存储
+        created = [(index, embedding) for index, embedding in created if embedding is not None]
+        created_ids = [memories[index].id for index, _ in created]
+        if before_commit is not None:
+            before_commit(memories)
+        self.db.commit()
+
+        # 批量写入向量存储，一次查询加载新记忆用于过滤的字段
+        updated_positions = [position for position, embedding in enumerate(updated_embeddings) if embedding is not None]
+        try:
+            if created:
+                metadatas = {
+                    row.id: self.vector_store.memory_metadata(row)
+                    for row in self.db.execute(self.memory_metadata_statement(created_ids)).all()
+                }
+                self.vector_store.add_embeddings(
+                    embeddings=[embedding for _, embedding in created],
+                    documents=[memories[index].memory_content for index, _ in created],
+                    memory_ids=created_ids,
+                    user_ids=[items[index][0] for index, _ in created],
+                    app_names=[items[index][1] for index, _ in created],
+                    metadatas=[metadatas.get(memory_id, {}) for memory_id in created_ids]
+                )
+            if updated_positions:
+                self.vector_store.update_embeddings(
+                    memory_ids=[updated_ids[position] for position in updated_positions],
+                    embeddings=[updated_embeddings[position] for position in updated_positions],
+                    documents=[updated_contents[position] for position in updated_positions],
+                    user_ids=[similar_memories[updated_ids[position]].user_id for position in updated_positions],
+                    app_names=[similar_memories[updated_ids[position]].app_name for position in updated_positions]
+                )
+        except Exception as e:
+            # 记忆已提交，重试整批会重复创建记忆，改为由补写任务重新写入向量
+            written_ids = created_ids + [updated_ids[position] for position in updated_positions]
+            logger.error(f"Failed to write {len(written_ids)} embeddings to vector store, deferring to backfill: {e}")
+            self.db.execute(
+                update(UserMemory)
+                .where(UserMemory.id.in_(written_ids))
+                .values(embedding_pending=True, embedding_retry_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+
+        return memories
+
     def get_memory(self, memory_id: int) -> Optional[UserMemory]:
         """获取单个记忆
         
@@ -459,163 +1072,246 @@ class MemoryManager:
         ).first()
         
         if memory:
-            # 更新最后访问时间
-            memory.last_accessed_at = datetime.utcnow()
-            self.db.commit()
-            self.db.refresh(memory)
+            # 记录访问时间，由定时任务批量写回
+            memory_access_tracker.record([memory.id])
         
         return memory
     
 
     
-    def query_memories(self, user_id: str, app_name: str, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """查询相似记忆
+    def get_embedding_dimension(self, app_name: str) -> Optional[int]:
+        """获取应用的Embedding维度
         
         Args:
-            user_id: 用户ID
             app_name: 应用名称
-            query: 查询内容
-            top_k: 返回结果数量
             
         Returns:
-            相似记忆列表
+            应用配置的Embedding维度，未配置时为None，表示使用embedding.dimension
         """
-        try:
-            # 生成查询内容的Embedding（使用缓存）
-            query_embedding = self.embedding_service.get_cached_embedding(query)
-            
-            # 查询相似记忆
-            chroma_results = self.chroma_client.query_embeddings(
-                query_embedding=query_embedding,
-                user_id=user_id,
-                app_name=app_name,
-                top_k=top_k
-            )
+        return self.db.execute(
+            select(AppConfig.embedding_dimension).where(AppConfig.app_name == app_name)
+        ).scalar()
+    
+    def reindex_app_embeddings(self, app_name: str, batch_size: int = 256) -> int:
+        """按应用当前的Embedding维度重建该应用所有有效记忆的向量
+        
+        修改应用的embedding_dimension后调用，删除旧维度的向量，再按新维度写入。
+        完整维度的Embedding在缓存中时不会重新请求Embedding服务。
+        
+        Args:
+            app_name: 应用名称
+            batch_size: 每批生成Embedding的记忆数
             
-            # 构建结果
-            results = []
-            for result in chroma_results:
-                # 获取记忆详情
-                memory = self.get_memory(result["memory_id"])
-                if memory:
-                    similarity = 1 - result["similarity"]  # Chroma返回的是距离，转换为相似度
-                    # 确保相似度在合理范围内
-                    similarity = max(0.0, min(1.0, similarity))
-                    results.append({
-                        "memory_id": memory.id,
-                        "memory_content": memory.memory_content,
-                        "extracted_elements": memory.extracted_elements,
-                        "similarity": similarity,
-                        "created_at": memory.created_at
-                    })
+        Returns:
+            重建的向量数量
+        """
+        return MemoryReindexer(self.db, batch_size=batch_size, workers=1).run(app_name=app_name, resume=False, clear=True)
+    
+    @staticmethod
+    def memory_filter_conditions(filters: Optional[Dict[str, Any]] = None) -> List[Any]:
+        """将元数据过滤条件转换为SQL条件
+        
+        Args:
+            filters: 元数据过滤条件（tags、min_priority、max_priority、created_after、created_before、is_archived）
             
-            # 如果Chroma查询返回空结果，进入降级方案
-            if not results:
-                logger.info("Chroma query returned empty results, falling back to keyword-based query")
-                raise Exception("Chroma query returned empty results")
+        Returns:
+            SQL条件列表
+        """
+        filters = filters or {}
+        conditions = []
+        if filters.get("tags"):
+            # memory_tags为JSON数组，包含任一标签即匹配
+            tags = func.json_each(UserMemory.memory_tags).table_valued("value")
+            conditions.append(select(tags.c.value).where(tags.c.value.in_(filters["tags"])).exists())
+        if filters.get("min_priority") is not None:
+            conditions.append(UserMemory.memory_priority >= filters["min_priority"])
+        if filters.get("max_priority") is not None:
+            conditions.append(UserMemory.memory_priority <= filters["max_priority"])
+        if filters.get("created_after") is not None:
+            conditions.append(UserMemory.created_at >= filters["created_after"])
+        if filters.get("created_before") is not None:
+            conditions.append(UserMemory.created_at <= filters["created_before"])
+        if filters.get("is_archived") is not None:
+            conditions.append(UserMemory.is_archived == filters["is_archived"])
+        return conditions
+    
+    @staticmethod
+    def memory_metadata_statement(memory_ids: List[int]):
+        """构建查询记忆用于向量过滤的字段的语句，结果行可直接传给VectorStore.memory_metadata
+        
+        Args:
+            memory_ids: 记忆ID列表
             
-            return results
-        except Exception as e:
-            logger.error(f"Failed to query memories with embedding: {e}")
-            # 如果嵌入查询失败或返回空结果，回退到基于关键词的查询作为降级方案
-            # 获取该用户该应用下的所有记忆
-            memories = self.db.query(UserMemory).filter(
-                and_(
-                    UserMemory.user_id == user_id,
-                    UserMemory.app_name == app_name,
-                    UserMemory.is_active == True
-                )
-            ).all()
+        Returns:
+            SELECT语句
+        """
+        return select(
+            UserMemory.id,
+            UserMemory.memory_priority,
+            UserMemory.memory_tags,
+            UserMemory.is_archived,
+            UserMemory.created_at
+        ).where(UserMemory.id.in_(memory_ids))
+    
+    @classmethod
+    def memory_rows_statement(cls,
+                              memory_ids: Optional[List[int]] = None,
+                              user_id: Optional[str] = None,
+                              app_name: Optional[str] = None,
+                              filters: Optional[Dict[str, Any]] = None):
+        """构建只查询结果所需字段的活跃记忆查询语句
+        
+        Args:
+            memory_ids: 记忆ID列表，提供时按ID过滤
+            user_id: 用户ID，提供时按用户过滤
+            app_name: 应用名称，提供时按应用过滤
+            filters: 元数据过滤条件
             
-            # 对所有记忆进行相似度计算
-            memory_scores = []
+        Returns:
+            SELECT语句
+        """
+        conditions = [UserMemory.is_active == True]
+        if memory_ids is not None:
+            conditions.append(UserMemory.id.in_(memory_ids))
+        if user_id is not None:
+            conditions.append(UserMemory.user_id == user_id)
+        if app_name is not None:
+            conditions.append(UserMemory.app_name == app_name)
+        conditions.extend(cls.memory_filter_conditions(filters))
+        
+        return select(
+            UserMemory.id,
+            UserMemory.memory_content,
+            UserMemory.extracted_elements,
+            UserMemory.created_at,
+            UserMemory.memory_priority,
+            UserMemory.memory_tags,
+            UserMemory.is_archived
+        ).where(and_(*conditions))
+    
+    @staticmethod
+    def build_query_results(chroma_results: List[Dict[str, Any]], rows: List[Any], filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """按Chroma返回的顺序将查询到的记忆字段组装为结果
+        
+        Args:
+            chroma_results: Chroma查询结果
+            rows: memory_rows_statement查询到的行
+            filters: 元数据过滤条件，向量存储中的元数据可能滞后于数据库，按数据库字段再检查一次
             
-            for memory in memories:
-                # 初始化相似度
-                similarity = 0.0
-                
-                # 只有当查询不为空时才计算相似度
-                if query:
-                    # 改进的文本匹配算法
-                    query_lower = query.lower()
-                    memory_lower = memory.memory_content.lower()
-                    
-                    # 完全匹配
-                    if query_lower == memory_lower:
-                        similarity = 1.0
-                    # 包含匹配
-                    elif query_lower in memory_lower:
-                        similarity = 0.8
-                    # 关键词匹配
-                    else:
-                        # 提取关键词
-                        query_words = set(query_lower.split())
-                        memory_words = set(memory_lower.split())
-                        
-                        if query_words or memory_words:
-                            # Jaccard相似度
-                            intersection = len(query_words.intersection(memory_words))
-                            union = len(query_words.union(memory_words))
-                            jaccard_similarity = intersection / union
-                            
-                            # 余弦相似度（基于词频）
-                            from collections import Counter
-                            query_counter = Counter(query_words)
-                            memory_counter = Counter(memory_words)
-                            
-                            # 计算点积
-                            dot_product = sum(query_counter[word] * memory_counter[word] for word in query_counter if word in memory_counter)
-                            
-                            # 计算模长
-                            query_norm = sum(count ** 2 for count in query_counter.values()) ** 0.5
-                            memory_norm = sum(count ** 2 for count in memory_counter.values()) ** 0.5
-                            
-                            # 计算余弦相似度
-                            cosine_similarity = dot_product / (query_norm * memory_norm) if query_norm * memory_norm > 0 else 0.0
-                            
-                            # 综合相似度：Jaccard相似度占40%，余弦相似度占60%
-                            similarity = 0.4 * jaccard_similarity + 0.6 * cosine_similarity
-                            
-                            # 确保相似度至少为0.1，避免返回0%相似度
-                            similarity = max(0.1, similarity)
-                        else:
-                            # 至少返回0.1的相似度，避免返回0%相似度
-                            similarity = 0.1
-                else:
-                    # 如果查询为空，返回所有记忆，相似度为0.5
-                    similarity = 0.5
-                
-                memory_scores.append({
-                    "memory": memory,
-                    "similarity": similarity
-                })
+        Returns:
+            查询结果列表，已删除或不满足过滤条件的记忆会被跳过
+        """
+        rows_by_id = {row.id: row for row in rows}
+        results = []
+        for result in chroma_results:
+            row = rows_by_id.get(result["memory_id"])
+            if row is None:
+                continue
+            if filters and not VectorStore.match_filters(VectorStore.memory_metadata(row), filters):
+                continue
+            similarity = 1 - result["similarity"]  # Chroma返回的是距离，转换为相似度
+            # 确保相似度在合理范围内
+            similarity = max(0.0, min(1.0, similarity))
+            results.append({
+                "memory_id": row.id,
+                "memory_content": row.memory_content,
+                "extracted_elements": row.extracted_elements,
+                "similarity": similarity,
+                "created_at": row.created_at
+            })
+        return results
+    
+    @classmethod
+    def rank_rows_by_keyword(cls, query: str, rows: List[Any], top_k: int) -> List[Dict[str, Any]]:
+        """基于关键词相似度对记忆排序，作为向量查询不可用时的降级方案
+        
+        Args:
+            query: 查询内容
+            rows: memory_rows_statement查询到的行
+            top_k: 返回结果数量
             
-            # 按相似度降序排序
-            memory_scores.sort(key=lambda x: x["similarity"], reverse=True)
+        Returns:
+            按相似度降序排列的前top_k个结果
+        """
+        memory_scores = [(row, cls.keyword_similarity(query, row.memory_content)) for row in rows]
+        
+        # 按相似度降序排序，取前top_k个结果
+        memory_scores.sort(key=lambda item: item[1], reverse=True)
+        
+        return [{
+            "memory_id": row.id,
+            "memory_content": row.memory_content,
+            "extracted_elements": row.extracted_elements,
+            "similarity": similarity,
+            "created_at": row.created_at
+        } for row, similarity in memory_scores[:top_k]]
+    
+    @staticmethod
+    def keyword_similarity(query: str, memory_content: str) -> float:
+        """基于关键词计算查询与记忆内容的相似度，作为向量查询不可用时的降级方案
+        
+        Args:
+            query: 查询内容
+            memory_content: 记忆内容
             
-            # 取前top_k个结果
-            top_results = memory_scores[:top_k]
+        Returns:
+            相似度（0-1）
+        """
+        # 初始化相似度
+        similarity = 0.0
+        
+        # 只有当查询不为空时才计算相似度
+        if query:
+            # 改进的文本匹配算法
+            query_lower = query.lower()
+            memory_lower = memory_content.lower()
             
-            # 构建最终结果
-            results = []
-            for item in top_results:
-                memory = item["memory"]
-                similarity = item["similarity"]
+            # 完全匹配
+            if query_lower == memory_lower:
+                similarity = 1.0
+            # 包含匹配
+            elif query_lower in memory_lower:
+                similarity = 0.8
+            # 关键词匹配
+            else:
+                # 提取关键词
+                query_words = set(query_lower.split())
+                memory_words = set(memory_lower.split())
                 
-                # 更新最后访问时间
-                memory.last_accessed_at = datetime.utcnow()
-                self.db.commit()
-                self.db.refresh(memory)
-                
-                results.append({
-                    "memory_id": memory.id,
-                    "memory_content": memory.memory_content,
-                    "extracted_elements": memory.extracted_elements,
-                    "similarity": similarity,
-                    "created_at": memory.created_at
-                })
-            
-            return results
+                if query_words or memory_words:
+                    # Jaccard相似度
+                    intersection = len(query_words.intersection(memory_words))
+                    union = len(query_words.union(memory_words))
+                    jaccard_similarity = intersection / union
+                    
+                    # 余弦相似度（基于词频）
+                    from collections import Counter
+                    query_counter = Counter(query_words)
+                    memory_counter = Counter(memory_words)
+                    
+                    # 计算点积
+                    dot_product = sum(query_counter[word] * memory_counter[word] for word in query_counter if word in memory_counter)
+                    
+                    # 计算模长
+                    query_norm = sum(count ** 2 for count in query_counter.values()) ** 0.5
+                    memory_norm = sum(count ** 2 for count in memory_counter.values()) ** 0.5
+                    
+                    # 计算余弦相似度
+                    cosine_similarity = dot_product / (query_norm * memory_norm) if query_norm * memory_norm > 0 else 0.0
+                    
+                    # 综合相似度：Jaccard相似度占40%，余弦相似度占60%
+                    similarity = 0.4 * jaccard_similarity + 0.6 * cosine_similarity
+                    
+                    # 确保相似度至少为0.1，避免返回0%相似度
+                    similarity = max(0.1, similarity)
+                else:
+                    # 至少返回0.1的相似度，避免返回0%相似度
+                    similarity = 0.1
+        else:
+            # 如果查询为空，返回所有记忆，相似度为0.5
+            similarity = 0.5
+        
+        return similarity
     
     def delete_memory(self, memory_id: int) -> bool:
         """删除记忆
@@ -633,8 +1329,8 @@ class MemoryManager:
             memory.is_active = False
             self.db.commit()
             
-            # 从Chroma中删除Embedding
-            self.chroma_client.delete_embedding(memory_id)
+            # 从向量存储中删除Embedding
+            self.vector_store.delete_embedding(memory_id, memory.user_id, memory.app_name)
             
             return True
         
@@ -5,7 +5,11 @@ from sqlalchemy import and_
 import numpy as np
 
 from app.models import UserMemory, AppConfig
-from app.services.embedding import EmbeddingServiceFactory
+from app.core.config import settings
+from app.core.container import service_container
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
 
 
 class MemoryMerger:
@@ -13,7 +17,8 @@ class MemoryMerger:
     
     def __init__(self, db: Session):
         self.db = db
-        self.embedding_service = EmbeddingServiceFactory.get_embedding_service()
+        self.embedding_service = service_container.embedding_service
+        self.vector_store = service_container.vector_store
     
     def calculate_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
         """计算两个Embedding向量的相似度
@@ -31,6 +36,54 @@ class MemoryMerger:
         similarity = np.dot(embedding1, embedding2) / (np.linalg.norm(embedding1) * np.linalg.norm(embedding2))
         return float(similarity)
     
+    def get_memory_embeddings(self, memories: List[UserMemory]) -> List[Any]:
+        """获取同一应用下记忆的Embedding
+        
+        优先读取记忆表embedding列中保存的向量（零拷贝解码），没有保存或维度与应用配置不一致的记忆
+        再生成Embedding（使用缓存）并截断到应用的维度。等待补写Embedding的记忆由补写任务生成向量，
+        这里不读取也不生成，不参与本次合并。
+        
+        Args:
+            memories: 同一用户和应用的记忆列表
+            
+        Returns:
+            与记忆顺序一致的向量列表，Embedding生成失败的记忆对应None
+        """
+        dimension = self.get_embedding_dimension(memories[0].app_name)
+        
+        embeddings = []
+        for memory in memories:
+            if memory.embedding_pending:
+                # 保存的向量可能对应合并前的内容
+                embeddings.append(None)
+                continue
+            vector = self.embedding_service.unpack_embedding(memory.embedding, memory.embedding_dtype)
+            # float32保存的向量不复制，float16保存的向量转换为float32再计算相似度
+            embeddings.append(None if vector is None else np.asarray(vector, dtype=np.float32))
+        missing = [
+            index for index, embedding in enumerate(embeddings)
+            if not memories[index].embedding_pending and (embedding is None or len(embedding) != dimension)
+        ]
+        if missing:
+            generated = self.embedding_service.get_cached_embeddings([memories[index].memory_content for index in missing])
+            for index, embedding in zip(missing, generated):
+                embeddings[index] = None if embedding is None else self.embedding_service.reduce_embedding(embedding, dimension)
+        return embeddings
+    
+    @staticmethod
+    def drop_missing_embeddings(memories: List[UserMemory], embeddings: List[Any]) -> tuple:
+        """去掉没有Embedding的记忆
+        
+        Args:
+            memories: 记忆列表
+            embeddings: 与记忆顺序一致的向量列表
+            
+        Returns:
+            (记忆列表, 向量列表)
+        """
+        pairs = [(memory, embedding) for memory, embedding in zip(memories, embeddings) if embedding is not None]
+        return [memory for memory, _ in pairs], [embedding for _, embedding in pairs]
+    
     def get_all_active_memories(self) -> List[UserMemory]:
         """获取所有活跃的记忆
         
@@ -69,9 +122,9 @@ class MemoryMerger:
             return
         
         try:
-            # 生成所有记忆的Embedding
-            memory_contents = [memory.memory_content for memory in memories]
-            embeddings = self.embedding_service.generate_embeddings(memory_contents)
+            # 获取所有记忆的Embedding，生成失败的记忆不参与本次合并
+            embeddings = self.get_memory_embeddings(memories)
+            memories, embeddings = self.drop_missing_embeddings(memories, embeddings)
             
             # 建立记忆和Embedding的映射
             memory_embeddings = dict(zip(memories, embeddings))
@@ -155,9 +208,9 @@ class MemoryMerger:
             return
         
         try:
-            # 生成所有记忆的Embedding
-            memory_contents = [memory.memory_content for memory in memories]
-            embeddings = self.embedding_service.generate_embeddings(memory_contents)
+            # 获取所有记忆的Embedding，生成失败的记忆不参与本次合并
+            embeddings = self.get_memory_embeddings(memories)
+            memories, embeddings = self.drop_missing_embeddings(memories, embeddings)
             
             # 简单的基于距离的聚类
             clusters = []
@@ -258,7 +311,51 @@ class MemoryMerger:
             memory.is_active = False
             memory.updated_at = datetime.utcnow()
         
+        # 内容已变化，为合并后的内容重新生成Embedding；生成失败时交给补写任务
+        embedding = self.embedding_service.get_cached_embeddings(
+            [main_memory.memory_content], self.get_embedding_dimension(main_memory.app_name)
+        )[0]
+        if embedding is None:
+            main_memory.embedding_pending = True
+        else:
+            main_memory.embedding, main_memory.embedding_dtype = self.embedding_service.pack_embedding(embedding)
+            main_memory.embedding_pending = False
+        main_memory.embedding_attempts = 0
+        main_memory.embedding_retry_at = None
         self.db.commit()
+        
+        if embedding is None:
+            # 优先级和标签已变化，同步向量存储中用于过滤的元数据，向量由补写任务覆盖
+            self.vector_store.update_metadata(
+                [main_memory.id], [self.vector_store.memory_metadata(main_memory)], [main_memory.user_id], [main_memory.app_name]
+            )
+            return
+        try:
+            # 以upsert方式写入合并后的向量和元数据
+            self.vector_store.add_embeddings(
+                embeddings=[embedding],
+                documents=[main_memory.memory_content],
+                memory_ids=[main_memory.id],
+                user_ids=[main_memory.user_id],
+                app_names=[main_memory.app_name],
+                metadatas=[self.vector_store.memory_metadata(main_memory)]
+            )
+        except Exception as e:
+            logger.error(f"Failed to write merged embedding of memory {main_memory.id}, deferring to backfill: {str(e)}")
+            main_memory.embedding_pending = True
+            self.db.commit()
+    
+    def get_embedding_dimension(self, app_name: str) -> int:
+        """获取应用的Embedding维度
+        
+        Args:
+            app_name: 应用名称
+            
+        Returns:
+            应用配置的维度，未配置时使用全局维度
+        """
+        app_config = self.get_app_config(app_name)
+        return (app_config.embedding_dimension if app_config else None) or settings.embedding.dimension
     
     def get_app_config(self, app_name: str) -> AppConfig:
         """获取应用配置
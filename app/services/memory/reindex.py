@@ -0,0 +1,233 @@
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.models import UserMemory, AppConfig
+from app.core.config import settings
+from app.core.container import service_container
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class MemoryReindexer:
+    """从user_memories流式重建向量存储
+
+    按ID顺序分页读取有效记忆（不一次加载全部记忆），优先使用记忆表embedding列中保存的向量，
+    没有保存或维度不足的记忆再合并生成Embedding（复用缓存）并回写到embedding列，
+    按应用的Embedding维度截断后，通过add_embeddings连同用于过滤的元数据批量覆盖写入。
+    Embedding生成在线程池中并行执行，向量写入串行执行。
+    提供检查点文件时，记录已连续完成的最大记忆ID，中断后可从该位置继续。
+    """
+
+    def __init__(self,
+                 db: Session,
+                 batch_size: int = 256,
+                 workers: int = 4,
+                 checkpoint_path: Optional[str] = None,
+                 regenerate: bool = False):
+        """初始化重建任务
+
+        Args:
+            db: 数据库会话，只在调用线程中使用
+            batch_size: 每批读取和生成Embedding的记忆数
+            workers: 并行生成Embedding的线程数
+            checkpoint_path: 检查点文件路径，为空时不记录检查点
+            regenerate: 忽略embedding列中保存的向量，全部重新生成并回写（切换Embedding服务或模型后使用）
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.checkpoint_path = checkpoint_path
+        self.regenerate = regenerate
+        self.embedding_service = service_container.embedding_service
+        self.vector_store = service_container.vector_store
+        self._write_lock = threading.Lock()
+
+    def load_checkpoint(self, user_id: Optional[str], app_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        """读取与本次重建范围一致的检查点
+
+        Args:
+            user_id: 用户ID
+            app_name: 应用名称
+
+        Returns:
+            检查点内容，不存在或范围不一致时返回None
+        """
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return None
+
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if (checkpoint.get("user_id"), checkpoint.get("app_name")) != (user_id, app_name):
+            logger.warning(f"Checkpoint {self.checkpoint_path} was written for a different scope, ignored")
+            return None
+        return checkpoint
+
+    def save_checkpoint(self, user_id: Optional[str], app_name: Optional[str], last_id: int, processed: int) -> None:
+        """原子写入检查点"""
+        if not self.checkpoint_path:
+            return
+
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "user_id": user_id,
+                "app_name": app_name,
+                "last_id": last_id,
+                "processed": processed,
+                "updated_at": datetime.utcnow().isoformat()
+            }, f, ensure_ascii=False)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def index_chunk(self, rows: List[Any], dimensions: Dict[str, Optional[int]]) -> List[Dict[str, Any]]:
+        """为一批记忆准备Embedding并写入向量存储
+
+        Args:
+            rows: 记忆行（id、user_id、app_name、memory_content、embedding列及用于过滤的字段）
+            dimensions: 应用名称到Embedding维度的映射
+
+        Returns:
+            新生成Embedding的记忆的embedding列取值（生成失败的记忆为待补写标记），由调用线程回写到数据库
+        """
+        contents = [row.memory_content for row in rows]
+        embeddings: List[Optional[List[float]]] = []
+        for row in rows:
+            dimension = dimensions.get(row.app_name) or settings.embedding.dimension
+            stored = None if self.regenerate else self.embedding_service.unpack_embedding(row.embedding, row.embedding_dtype)
+            if stored is not None and len(stored) >= dimension:
+                # 已保存的向量维度足够时直接截断使用，不调用Embedding接口
+                embeddings.append(np.asarray(self.embedding_service.reduce_embedding(stored, dimension), dtype=np.float32).tolist())
+            else:
+                embeddings.append(None)
+
+        # 一次调用生成缺失向量的完整Embedding（使用缓存），再按各应用的维度截断
+        missing = [position for position, embedding in enumerate(embeddings) if embedding is None]
+        backfill = []
+        if missing:
+            generated = self.embedding_service.get_cached_embeddings([contents[position] for position in missing])
+            for position, embedding in zip(missing, generated):
+                if embedding is None:
+                    # 生成失败的记忆标记为待补写，不写入向量存储
+                    backfill.append({"id": rows[position].id, "embedding_pending": True})
+                    continue
+                embeddings[position] = self.embedding_service.reduce_embedding(embedding, dimensions.get(rows[position].app_name))
+                data, dtype = self.embedding_service.pack_embedding(embeddings[position])
+                backfill.append({
+                    "id": rows[position].id,
+                    "embedding": data,
+                    "embedding_dtype": dtype,
+                    "embedding_pending": False,
+                    "embedding_attempts": 0,
+                    "embedding_retry_at": None
+                })
+
+        indexed = [position for position, embedding in enumerate(embeddings) if embedding is not None]
+        if indexed:
+            with self._write_lock:
+                self.vector_store.add_embeddings(
+                    embeddings=[embeddings[position] for position in indexed],
+                    documents=[contents[position] for position in indexed],
+                    memory_ids=[rows[position].id for position in indexed],
+                    user_ids=[rows[position].user_id for position in indexed],
+                    app_names=[rows[position].app_name for position in indexed],
+                    metadatas=[self.vector_store.memory_metadata(rows[position]) for position in indexed]
+                )
+        return backfill
+
+    def run(self,
+            user_id: Optional[str] = None,
+            app_name: Optional[str] = None,
+            resume: bool = True,
+            clear: bool = False) -> int:
+        """重建向量
+
+        Args:
+            user_id: 只重建该用户的记忆
+            app_name: 只重建该应用的记忆
+            resume: 是否从检查点继续
+            clear: 开始前是否删除重建范围内已有的向量，从检查点继续时忽略
+
+        Returns:
+            本次及之前中断的运行累计写入的向量数量
+        """
+        checkpoint = self.load_checkpoint(user_id, app_name) if resume else None
+        last_id = checkpoint["last_id"] if checkpoint else 0
+        processed = checkpoint["processed"] if checkpoint else 0
+        if checkpoint:
+            logger.info(f"Resuming reindex after memory {last_id}, {processed} embeddings already written")
+        elif clear:
+            if user_id or app_name:
+                self.vector_store.delete_embeddings_by_filter(user_id=user_id, app_name=app_name)
+            else:
+                self.vector_store.reset()
+
+        dimensions = dict(self.db.execute(select(AppConfig.app_name, AppConfig.embedding_dimension)).all())
+
+        statement = select(
+            UserMemory.id,
+            UserMemory.user_id,
+            UserMemory.app_name,
+            UserMemory.memory_content,
+            UserMemory.embedding,
+            UserMemory.embedding_dtype,
+            UserMemory.memory_priority,
+            UserMemory.memory_tags,
+            UserMemory.is_archived,
+            UserMemory.created_at
+        ).where(UserMemory.is_active == True)
+        if user_id:
+            statement = statement.where(UserMemory.user_id == user_id)
+        if app_name:
+            statement = statement.where(UserMemory.app_name == app_name)
+        statement = statement.order_by(UserMemory.id).limit(self.batch_size)
+
+        def read_chunks():
+            # 按ID分页读取，每页查询完成后不保留游标，回写embedding列的提交不影响后续读取
+            cursor = last_id
+            while True:
+                rows = self.db.execute(statement.where(UserMemory.id > cursor)).all()
+                if not rows:
+                    return
+                yield rows
+                cursor = rows[-1].id
+
+        # 按提交顺序保存在途批次，只有前面的批次都完成后才推进检查点
+        pending = deque()
+
+        def complete_first() -> None:
+            nonlocal processed
+            chunk_last_id, count, future = pending.popleft()
+            backfill = future.result()
+            if backfill:
+                self.db.execute(update(UserMemory), backfill)
+                self.db.commit()
+            processed += count
+            self.save_checkpoint(user_id, app_name, chunk_last_id, processed)
+            logger.info(f"Reindexed {processed} embeddings, up to memory {chunk_last_id}")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for rows in read_chunks():
+                pending.append((rows[-1].id, len(rows), executor.submit(self.index_chunk, rows, dimensions)))
+                # 限制在途批次数，避免读取远快于Embedding生成时占用过多内存
+                while len(pending) >= self.workers * 2 or (pending and pending[0][2].done()):
+                    complete_first()
+            while pending:
+                complete_first()
+
+        # 全部完成后删除检查点，下次运行重新开始
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        logger.info(f"Reindex finished, {processed} embeddings written")
+        return processed
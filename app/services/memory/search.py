@@ -0,0 +1,233 @@
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, column, func, literal_column, or_, select, table, text
+from sqlalchemy.engine import Engine
+
+from app.models import UserMemory
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class MemoryFullTextIndex:
+    """记忆内容全文索引（SQLite FTS5）
+
+    使用trigram分词器对memory_content建立外部内容FTS5索引，由触发器在写入时同步，
+    向量查询不可用时按BM25返回前top_k条记忆，无需加载用户全部记忆，且对中文等无空格文本有效。
+    trigram无法匹配短于3个字符的词（如中文双字词、英文缩写），这些词通过LIKE子串匹配召回候选。
+    数据库不是SQLite或不支持FTS5 trigram时不可用，调用方应退回关键词扫描。
+    """
+
+    table_name = "user_memories_fts"
+
+    # trigram分词器可匹配的最小长度
+    min_term_length = 3
+
+    # 单次MATCH表达式包含的最大三元组数量
+    max_match_terms = 64
+
+    def __init__(self):
+        self.available = False
+
+    def setup(self, engine: Engine) -> bool:
+        """创建全文索引和同步触发器，首次创建时根据已有记忆重建索引
+
+        Args:
+            engine: 数据库引擎
+
+        Returns:
+            全文索引是否可用
+        """
+        if engine.dialect.name != "sqlite":
+            logger.info("Full-text index requires SQLite, keyword fallback will scan memories")
+            self.available = False
+            return False
+
+        source = UserMemory.__tablename__
+        fts = self.table_name
+        statements = [
+            f"CREATE VIRTUAL TABLE {fts} USING fts5("
+            f"memory_content, content='{source}', content_rowid='id', tokenize='trigram')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN "
+            f"INSERT INTO {fts}(rowid, memory_content) VALUES (new.id, new.memory_content); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, memory_content) VALUES ('delete', old.id, old.memory_content); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF memory_content ON {source} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, memory_content) VALUES ('delete', old.id, old.memory_content); "
+            f"INSERT INTO {fts}(rowid, memory_content) VALUES (new.id, new.memory_content); END",
+        ]
+
+        try:
+            with engine.begin() as connection:
+                exists = connection.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {"name": fts}
+                ).first() is not None
+                if exists:
+                    statements = statements[1:]
+                for statement in statements:
+                    connection.execute(text(statement))
+                if not exists:
+                    # 为创建索引前已存在的记忆建立索引
+                    connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+                    logger.info(f"Full-text index {fts} created")
+        except Exception as e:
+            logger.warning(f"SQLite FTS5 trigram index unavailable, keyword fallback will scan memories: {e}")
+            self.available = False
+            return False
+
+        self.available = True
+        return True
+
+    def split_terms(self, query: str) -> Tuple[List[str], List[str]]:
+        """按空白拆分查询内容
+
+        Args:
+            query: 查询内容
+
+        Returns:
+            (可用三元组匹配的词, 短于min_term_length的词)，均为小写且已去重
+        """
+        words = list(dict.fromkeys(query.lower().split()))
+        return (
+            [word for word in words if len(word) >= self.min_term_length],
+            [word for word in words if len(word) < self.min_term_length]
+        )
+
+    def build_match_query(self, query: str) -> Optional[str]:
+        """将查询内容拆分为三元组并组合为FTS5 MATCH表达式
+
+        Args:
+            query: 查询内容
+
+        Returns:
+            以OR连接的三元组表达式，查询中没有可匹配的三元组时返回None
+        """
+        terms = []
+        seen = set()
+        for word in self.split_terms(query)[0]:
+            for start in range(len(word) - self.min_term_length + 1):
+                term = word[start:start + self.min_term_length]
+                if term in seen:
+                    continue
+                seen.add(term)
+                terms.append('"' + term.replace('"', '""') + '"')
+                if len(terms) >= self.max_match_terms:
+                    return " OR ".join(terms)
+
+        return " OR ".join(terms) if terms else None
+
+    def search_statement(self, user_id: str, app_name: str, query: str, top_k: int, conditions: Optional[List[Any]] = None):
+        """构建按BM25排序的全文检索语句
+
+        Args:
+            user_id: 用户ID
+            app_name: 应用名称
+            query: 查询内容
+            top_k: 返回结果数量
+            conditions: 附加的记忆表过滤条件
+
+        Returns:
+            SELECT语句，索引不可用或查询过短时返回None
+        """
+        if not self.available or not query:
+            return None
+
+        match_query = self.build_match_query(query)
+        if match_query is None:
+            return None
+
+        fts = table(self.table_name, column("rowid"))
+        rank = func.bm25(literal_column(self.table_name)).label("rank")
+        return select(
+            UserMemory.id,
+            UserMemory.memory_content,
+            UserMemory.extracted_elements,
+            UserMemory.created_at,
+            rank
+        ).select_from(
+            fts.join(UserMemory.__table__, UserMemory.id == fts.c.rowid)
+        ).where(and_(
+            text(f"{self.table_name} MATCH :match_query").bindparams(match_query=match_query),
+            UserMemory.user_id == user_id,
+            UserMemory.app_name == app_name,
+            UserMemory.is_active == True,
+            *(conditions or [])
+        )).order_by(rank).limit(top_k)
+
+    def short_term_statement(self, user_id: str, app_name: str, query: str, conditions: Optional[List[Any]] = None):
+        """构建按子串匹配短词的候选查询语句，候选由调用方按关键词相似度排序
+
+        Args:
+            user_id: 用户ID
+            app_name: 应用名称
+            query: 查询内容
+            conditions: 附加的记忆表过滤条件
+
+        Returns:
+            SELECT语句，索引不可用或查询中没有短词时返回None
+        """
+        if not self.available or not query:
+            return None
+
+        short_terms = self.split_terms(query)[1]
+        if not short_terms:
+            return None
+
+        return select(
+            UserMemory.id,
+            UserMemory.memory_content,
+            UserMemory.extracted_elements,
+            UserMemory.created_at
+        ).where(and_(
+            or_(*(UserMemory.memory_content.contains(term, autoescape=True) for term in short_terms)),
+            UserMemory.user_id == user_id,
+            UserMemory.app_name == app_name,
+            UserMemory.is_active == True,
+            *(conditions or [])
+        ))
+
+    @staticmethod
+    def merge_results(result_lists: List[List[Dict[str, Any]]], top_k: int) -> List[Dict[str, Any]]:
+        """合并全文检索和短词匹配的结果，同一记忆取较高的相似度
+
+        Args:
+            result_lists: 多组查询结果
+            top_k: 返回结果数量
+
+        Returns:
+            按相似度降序排列的前top_k个结果
+        """
+        merged: Dict[int, Dict[str, Any]] = {}
+        for results in result_lists:
+            for result in results:
+                existing = merged.get(result["memory_id"])
+                if existing is None or result["similarity"] > existing["similarity"]:
+                    merged[result["memory_id"]] = result
+        return sorted(merged.values(), key=lambda result: result["similarity"], reverse=True)[:top_k]
+
+    @staticmethod
+    def build_results(rows: List[Any]) -> List[Dict[str, Any]]:
+        """将全文检索的行组装为查询结果
+
+        Args:
+            rows: search_statement查询到的行
+
+        Returns:
+            查询结果列表，BM25分数映射为0-1的相似度
+        """
+        results = []
+        for row in rows:
+            # FTS5的bm25越小越相关，取反后映射到0-1
+            score = max(0.0, -row.rank)
+            results.append({
+                "memory_id": row.id,
+                "memory_content": row.memory_content,
+                "extracted_elements": row.extracted_elements,
+                "similarity": score / (1 + score),
+                "created_at": row.created_at
+            })
+        return results
+
+
+# 初始化全文索引实例
+memory_fulltext_index = MemoryFullTextIndex()
@@ -0,0 +1,13 @@
+from app.services.vector_store.base import (
+    VectorStore,
+    VectorStoreFactory
+)
+from app.services.vector_store.numpy_store import NumpyVectorStore
+from app.services.vector_store.shared import SharedEmbeddingStore
+
+__all__ = [
+    "VectorStore",
+    "VectorStoreFactory",
+    "NumpyVectorStore",
+    "SharedEmbeddingStore"
+]
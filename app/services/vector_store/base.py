@@ -0,0 +1,288 @@
+import calendar
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Union
+
+
+class VectorStore(ABC):
+    """向量存储基类
+
+    按记忆ID存储Embedding向量，查询时只在同一user_id和app_name下检索。
+    query_embeddings返回的similarity字段为余弦距离（1 - 余弦相似度）。
+
+    按记忆ID读写的方法可附带记忆所属的用户和应用，分区存储的后端据此直接定位记忆所在的分区。
+
+    写入时可附带记忆的元数据（memory_metadata生成），查询时通过filters在检索阶段过滤，支持的条件：
+    tags（包含任一标签）、min_priority、max_priority、created_after、created_before、is_archived，
+    未写入元数据的向量不会匹配任何过滤条件。
+    """
+
+    # 标签在元数据中展开为 tag:{标签} 的布尔字段
+    tag_prefix = "tag:"
+
+    @staticmethod
+    def to_timestamp(value: Union[datetime, int, float]) -> int:
+        """将时间转换为Unix时间戳，不带时区的时间按UTC处理"""
+        if isinstance(value, datetime):
+            return calendar.timegm(value.utctimetuple())
+        return int(value)
+
+    @classmethod
+    def memory_metadata(cls, memory: Any) -> Dict[str, Any]:
+        """根据记忆生成可用于过滤的元数据
+
+        Args:
+            memory: 记忆对象或包含memory_priority、memory_tags、is_archived、created_at字段的行
+
+        Returns:
+            元数据字典，只包含标量值
+        """
+        metadata = {
+            "memory_priority": memory.memory_priority,
+            "is_archived": bool(memory.is_archived)
+        }
+        if memory.created_at is not None:
+            metadata["created_at"] = cls.to_timestamp(memory.created_at)
+        for tag in memory.memory_tags or []:
+            metadata[f"{cls.tag_prefix}{tag}"] = True
+        return metadata
+
+    @classmethod
+    def match_filters(cls, metadata: Optional[Dict[str, Any]], filters: Optional[Dict[str, Any]]) -> bool:
+        """判断元数据是否满足过滤条件，供不支持原生过滤的后端使用
+
+        Args:
+            metadata: memory_metadata生成的元数据
+            filters: 过滤条件
+
+        Returns:
+            是否满足
+        """
+        if not filters:
+            return True
+        if metadata is None:
+            return False
+
+        if filters.get("tags") and not any(metadata.get(f"{cls.tag_prefix}{tag}") for tag in filters["tags"]):
+            return False
+        priority = metadata.get("memory_priority")
+        if filters.get("min_priority") is not None and (priority is None or priority < filters["min_priority"]):
+            return False
+        if filters.get("max_priority") is not None and (priority is None or priority > filters["max_priority"]):
+            return False
+        created_at = metadata.get("created_at")
+        if filters.get("created_after") is not None and (created_at is None or created_at < cls.to_timestamp(filters["created_after"])):
+            return False
+        if filters.get("created_before") is not None and (created_at is None or created_at > cls.to_timestamp(filters["created_before"])):
+            return False
+        if filters.get("is_archived") is not None and metadata.get("is_archived") != filters["is_archived"]:
+            return False
+        return True
+
+    @abstractmethod
+    def add_embedding(self,
+                      embedding: List[float],
+                      document: str,
+                      memory_id: int,
+                      user_id: str,
+                      app_name: str,
+                      similarity_threshold: float = 0.95,
+                      nearest_results: Optional[List[Dict[str, Any]]] = None,
+                      metadata: Optional[Dict[str, Any]] = None) -> None:
+        """添加或覆盖单个Embedding向量
+
+        Args:
+            embedding: Embedding向量
+            document: 文档内容
+            memory_id: 记忆ID
+            user_id: 用户ID
+            app_name: 应用名称
+            similarity_threshold: 相似Embedding的阈值，超过此阈值则共享
+            nearest_results: 调用方已用同一向量执行过的query_embeddings结果，提供时不再重复查询
+            metadata: 用于过滤的元数据
+        """
+        pass
+
+    @abstractmethod
+    def add_embeddings(self,
+                       embeddings: List[List[float]],
+                       documents: List[str],
+                       memory_ids: List[int],
+                       user_ids: List[str],
+                       app_names: List[str],
+                       metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
+        """添加或覆盖多个Embedding向量，记忆ID已存在时覆盖
+
+        Args:
+            embeddings: Embedding向量列表
+            documents: 文档内容列表
+            memory_ids: 记忆ID列表
+            user_ids: 用户ID列表
+            app_names: 应用名称列表
+            metadatas: 用于过滤的元数据列表
+        """
+        pass
+
+    @abstractmethod
+    def query_embeddings(self,
+                         query_embedding: List[float],
+                         user_id: str,
+                         app_name: str,
+                         top_k: int = 5,
+                         filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """查询相似Embedding向量
+
+        Args:
+            query_embedding: 查询Embedding向量
+            user_id: 用户ID
+            app_name: 应用名称
+            top_k: 返回结果数量
+            filters: 元数据过滤条件，在检索阶段过滤，不占用top_k名额
+
+        Returns:
+            按距离升序排列的结果列表，每个结果包含memory_id、similarity和document（后端未存储文档时为None）
+        """
+        pass
+
+    def query_embeddings_batch(self,
+                               query_embeddings: List[List[float]],
+                               user_ids: List[str],
+                               app_names: List[str],
+                               top_ks: List[int],
+                               filters: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[List[Dict[str, Any]]]:
+        """批量查询相似Embedding向量，默认逐个查询，子类可覆盖为合并查询
+
+        Args:
+            query_embeddings: 查询Embedding向量列表
+            user_ids: 用户ID列表
+            app_names: 应用名称列表
+            top_ks: 每个查询的返回结果数量
+            filters: 每个查询的元数据过滤条件
+
+        Returns:
+            与输入顺序一致的查询结果列表，格式同query_embeddings
+        """
+        filters = filters or [None] * len(query_embeddings)
+        return [
+            self.query_embeddings(query_embedding=query_embedding, user_id=user_id, app_name=app_name, top_k=top_k, filters=query_filters)
+            for query_embedding, user_id, app_name, top_k, query_filters in zip(query_embeddings, user_ids, app_names, top_ks, filters)
+        ]
+
+    @abstractmethod
+    def update_embedding(self,
+                         memory_id: int,
+                         embedding: Optional[List[float]] = None,
+                         document: Optional[str] = None,
+                         user_id: Optional[str] = None,
+                         app_name: Optional[str] = None) -> None:
+        """更新Embedding向量
+
+        Args:
+            memory_id: 记忆ID
+            embedding: 新的Embedding向量
+            document: 新的文档内容
+            user_id: 新的用户ID
+            app_name: 新的应用名称
+        """
+        pass
+
+    @abstractmethod
+    def update_embeddings(self,
+                          memory_ids: List[int],
+                          embeddings: List[List[float]],
+                          documents: List[str],
+                          user_ids: Optional[List[str]] = None,
+                          app_names: Optional[List[str]] = None) -> None:
+        """批量更新Embedding向量
+
+        Args:
+            memory_ids: 记忆ID列表
+            embeddings: 新的Embedding向量列表
+            documents: 新的文档内容列表
+            user_ids: 记忆所属的用户ID列表（可选）
+            app_names: 记忆所属的应用名称列表（可选）
+        """
+        pass
+
+    @abstractmethod
+    def update_metadata(self,
+                        memory_ids: List[int],
+                        metadatas: List[Dict[str, Any]],
+                        user_ids: Optional[List[str]] = None,
+                        app_names: Optional[List[str]] = None) -> None:
+        """更新记忆用于过滤的元数据，不存在的记忆会被跳过
+
+        Args:
+            memory_ids: 记忆ID列表
+            metadatas: memory_metadata生成的完整元数据列表
+            user_ids: 记忆所属的用户ID列表（可选）
+            app_names: 记忆所属的应用名称列表（可选）
+        """
+        pass
+
+    @abstractmethod
+    def get_embeddings(self,
+                       memory_ids: List[int],
+                       user_ids: Optional[List[str]] = None,
+                       app_names: Optional[List[str]] = None) -> Dict[int, List[float]]:
+        """批量获取已存储的Embedding向量
+
+        Args:
+            memory_ids: 记忆ID列表
+            user_ids: 记忆所属的用户ID列表（可选）
+            app_names: 记忆所属的应用名称列表（可选）
+
+        Returns:
+            记忆ID到Embedding向量的映射，不存在的记忆不包含在结果中
+        """
+        pass
+
+    @abstractmethod
+    def delete_embedding(self, memory_id: int, user_id: Optional[str] = None, app_name: Optional[str] = None) -> None:
+        """删除Embedding向量
+
+        Args:
+            memory_id: 记忆ID
+            user_id: 记忆所属的用户ID（可选）
+            app_name: 记忆所属的应用名称（可选）
+        """
+        pass
+
+    @abstractmethod
+    def delete_embeddings_by_filter(self, user_id: Optional[str] = None, app_name: Optional[str] = None) -> None:
+        """根据条件删除Embedding向量
+
+        Args:
+            user_id: 用户ID
+            app_name: 应用名称
+        """
+        pass
+
+    @abstractmethod
+    def reset(self) -> None:
+        """删除所有数据"""
+        pass
+
+
+class VectorStoreFactory:
+    """向量存储工厂类"""
+
+    @staticmethod
+    def get_vector_store(store_type: str = "chroma", **kwargs) -> VectorStore:
+        """获取向量存储实例
+
+        Args:
+            store_type: 向量存储类型：chroma, numpy
+            kwargs: 存储配置参数
+
+        Returns:
+            向量存储实例
+        """
+        if store_type == "chroma":
+            from app.services.chroma import ChromaClient
+            return ChromaClient(**kwargs)
+        elif store_type == "numpy":
+            from app.services.vector_store.numpy_store import NumpyVectorStore
+            return NumpyVectorStore(**kwargs)
+        else:
+            raise ValueError(f"不支持的向量存储类型: {store_type}")
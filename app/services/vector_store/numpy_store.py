@@ -0,0 +1,1048 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, Iterator, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.vector_store.base import VectorStore
+
+try:
+    import fcntl
+except ImportError:
+    # 没有fcntl的平台只支持单个进程使用同一数据目录
+    fcntl = None
+
+logger = get_logger(__name__)
+
+
+class NumpyVectorStore(VectorStore):
+    """基于NumPy内存映射文件的嵌入式向量存储
+
+    每个(user_id, app_name)分片对应一个目录，向量以连续的float32矩阵保存在vectors.f32中，
+    记忆ID保存在并列的ids.i64中，查询时通过np.memmap映射文件，不需要把向量读入堆内存。
+    检索为精确检索：对分片做一次矩阵乘法后用argpartition取top_k。
+    写入只做追加或原地覆盖，删除将ID标记为-1，已删除的行过多时再重写分片。
+
+    多个进程（如gunicorn的多个worker）可以共用同一数据目录：写入持有数据目录下.lock文件的排他锁，
+    完成后在journal.log中追加一行本次变化的分片；读取持有共享锁，发现日志增长时只重新加载变化的分片
+    和元数据日志的新增部分，日志被重写（轮转或重置）时重新加载全部分片。
+
+    vector_store.quantization为int8时，另外保存每行一个缩放系数的int8标量量化编码（codes.i8、scales.f32），
+    检索先在编码上粗排出top_k * rescore_factor个候选，再读取候选行的float32向量精确重排，
+    检索扫描的数据量约为float32矩阵的1/4。vector_store.store_float32为False时不保存float32向量，
+    直接按编码排序，磁盘占用约为float32的1/4；加载时删除已有的float32文件，删除前在其上测量并记录召回率。
+
+    用于过滤的元数据以追加日志的形式保存在数据目录下的metadata.jsonl中，启动时回放到内存；
+    带过滤条件的查询按分片缓存的元数据列（优先级、创建时间、归档状态、标签所在行）向量化生成行掩码，
+    不满足条件的行在排序前排除。
+    """
+
+    vectors_file = "vectors.f32"
+    ids_file = "ids.i64"
+    codes_file = "codes.i8"
+    scales_file = "scales.f32"
+    meta_file = "meta.json"
+    metadata_file = "metadata.jsonl"
+    journal_file = "journal.log"
+    lock_file = ".lock"
+
+    # 已删除行的ID标记
+    deleted_id = -1
+
+    # 已删除行占比超过该值时重写分片
+    compact_ratio = 0.5
+
+    # 粗排时每次转换为float32计算的编码行数，限制临时内存
+    scan_block_rows = 4096
+
+    # 元数据日志的记录数超过有效元数据数的倍数时重写日志
+    metadata_compact_ratio = 2
+
+    # 变更日志超过该字节数时清空，其他进程随之重新加载全部分片
+    journal_max_bytes = 1 << 20
+
+    def __init__(self,
+                 directory: Optional[str] = None,
+                 quantization: Optional[str] = None,
+                 rescore_factor: Optional[int] = None,
+                 store_float32: Optional[bool] = None):
+        """初始化向量存储
+
+        Args:
+            directory: 数据目录
+            quantization: 量化方式：none, int8
+            rescore_factor: 量化粗排的候选数为top_k的倍数
+            store_float32: int8量化时是否保存float32向量用于精确重排，未量化时始终保存
+        """
+        self.directory = directory or settings.vector_store.numpy_directory
+        self.quantization = quantization or settings.vector_store.quantization
+        self.rescore_factor = rescore_factor or settings.vector_store.rescore_factor
+        if self.quantization not in ("none", "int8"):
+            raise ValueError(f"不支持的向量量化方式: {self.quantization}")
+        if store_float32 is None:
+            store_float32 = settings.vector_store.store_float32
+        self.store_float32 = self.quantization == "none" or store_float32
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        # 分片键 -> {"user_id", "app_name", "dimension", "deleted"}
+        self._shards: Dict[str, Dict[str, Any]] = {}
+        # 分片键 -> 加载到内存的ID数组，与本进程最近一次加载或写入后的文件内容一致
+        self._ids: Dict[str, np.ndarray] = {}
+        # 记忆ID -> 分片键
+        self._locations: Dict[int, str] = {}
+        # 分片键 -> 向量矩阵内存映射缓存
+        self._views: Dict[str, np.ndarray] = {}
+        # 分片键 -> (codes, scales) 内存映射缓存
+        self._code_views: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # 分片键 -> 按行对齐的元数据列缓存
+        self._columns: Dict[str, Dict[str, Any]] = {}
+        # 记忆ID -> 用于过滤的元数据
+        self._metadata: Dict[int, Dict[str, Any]] = {}
+        # 元数据日志中的记录数
+        self._metadata_records = 0
+        # 已读取到的(inode, 偏移量)，用于增量读取其他进程追加的内容
+        self._metadata_position: Tuple[int, int] = (0, 0)
+        self._journal_position: Optional[Tuple[int, int]] = None
+        # 写入的嵌套层数和本次写入变化的分片
+        self._write_depth = 0
+        self._touched: Set[str] = set()
+        # 加载时重建编码或删除float32向量的分片，加载完成后测量召回率
+        self._quantized: List[Tuple[str, bool]] = []
+
+        logger.info(f"Initializing NumpyVectorStore at {self.directory}, quantization: {self.quantization}")
+        with self._write_lock():
+            # 首次进入时加载全部分片，并在持有排他锁时修复中断写入留下的不一致
+            pass
+        logger.info(f"NumpyVectorStore loaded {len(self._shards)} shards, {len(self._locations)} embeddings")
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        """持有数据目录的文件锁，每次重新打开锁文件，fork出的子进程不会共享父进程的锁"""
+        handle = open(os.path.join(self.directory, self.lock_file), "a")
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            # 关闭文件即释放锁
+            handle.close()
+
+    @contextmanager
+    def _read_lock(self) -> Iterator[None]:
+        """持有进程内锁和共享文件锁，先加载其他进程的写入再读取"""
+        with self._lock:
+            if self._write_depth:
+                yield
+                return
+            with self._file_lock(exclusive=False):
+                self._refresh()
+                yield
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        """持有进程内锁和排他文件锁，可嵌套；最外层开始时加载其他进程的写入，结束时记录变化的分片"""
+        with self._lock:
+            if self._write_depth:
+                self._write_depth += 1
+                try:
+                    yield
+                finally:
+                    self._write_depth -= 1
+                return
+
+            with self._file_lock(exclusive=True):
+                self._write_depth = 1
+                self._touched = set()
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    self._write_depth = 0
+                    self._append_journal()
+
+    def _append_journal(self) -> None:
+        """在变更日志中追加本次写入变化的分片，调用方需持有排他文件锁"""
+        path = os.path.join(self.directory, self.journal_file)
+        with open(path, "ab") as f:
+            f.write((json.dumps(sorted(self._touched)) + "\n").encode("utf-8"))
+        stat = os.stat(path)
+        if stat.st_size > self.journal_max_bytes:
+            temp_path = path + ".tmp"
+            open(temp_path, "wb").close()
+            os.replace(temp_path, path)
+            stat = os.stat(path)
+        self._journal_position = (stat.st_ino, stat.st_size)
+
+    def _refresh(self) -> None:
+        """变更日志增长时重新加载其他进程写入的分片和元数据，调用方需持有self._lock和文件锁"""
+        path = os.path.join(self.directory, self.journal_file)
+        try:
+            stat = os.stat(path)
+            position = (stat.st_ino, stat.st_size)
+        except FileNotFoundError:
+            position = (0, 0)
+        if position == self._journal_position:
+            return
+
+        if self._journal_position is None or position[0] != self._journal_position[0] or position[1] < self._journal_position[1]:
+            self._reload()
+            return
+
+        with open(path, "rb") as f:
+            f.seek(self._journal_position[1])
+            data = f.read()
+        # 只处理完整的行，正在写入的行留到下次读取
+        end = data.rfind(b"\n") + 1
+        keys: Set[str] = set()
+        for line in data[:end].splitlines():
+            try:
+                keys.update(json.loads(line))
+            except ValueError:
+                continue
+        self._journal_position = (position[0], self._journal_position[1] + end)
+
+        for key in keys:
+            self._load_shard(key)
+        self._load_metadata()
+
+    def _reload(self) -> None:
+        """重新加载全部分片和元数据，持有排他锁时修复中断写入留下的不一致"""
+        path = os.path.join(self.directory, self.journal_file)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            self._journal_position = (os.stat(path).st_ino, data.rfind(b"\n") + 1)
+        else:
+            self._journal_position = (0, 0)
+
+        self._shards.clear()
+        self._ids.clear()
+        self._locations.clear()
+        self._views.clear()
+        self._code_views.clear()
+        self._columns.clear()
+        self._metadata = {}
+        self._metadata_records = 0
+        self._metadata_position = (0, 0)
+
+        for key in os.listdir(self.directory):
+            if os.path.isdir(os.path.join(self.directory, key)):
+                self._load_shard(key, repair=self._write_depth > 0)
+        self._load_metadata()
+        if self._quantized:
+            self._report_recall()
+
+    def _load_shard(self, key: str, repair: bool = False) -> None:
+        """从文件加载分片，更新记忆ID位置；分片已被删除时移除
+
+        Args:
+            key: 分片键
+            repair: 是否截断或重建中断写入留下的不一致文件，需持有排他文件锁
+        """
+        meta_path = self._path(key, self.meta_file)
+        if not os.path.exists(meta_path):
+            self._drop_shard(key)
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        ids_path = self._path(key, self.ids_file)
+        ids = np.fromfile(ids_path, dtype=np.int64, count=os.path.getsize(ids_path) // np.dtype(np.int64).itemsize)
+        vectors_path = self._path(key, self.vectors_file)
+        has_float32 = os.path.exists(vectors_path)
+        if repair and not has_float32 and self.quantization == "none":
+            # 关闭量化时只有int8编码的分片还原为float32向量
+            self._restore_float32(key, meta["dimension"], len(ids))
+            has_float32 = True
+        if repair and has_float32:
+            # 追加写入中断时向量文件可能多出未记录ID的行，截断到与ID数一致
+            row_bytes = meta["dimension"] * np.dtype(np.float32).itemsize
+            if os.path.getsize(vectors_path) != len(ids) * row_bytes:
+                with open(vectors_path, "r+b") as f:
+                    f.truncate(len(ids) * row_bytes)
+
+        meta["deleted"] = int(np.count_nonzero(ids == self.deleted_id))
+        meta["float32"] = has_float32
+        self._relocate(key, self._ids.get(key), ids)
+        self._shards[key] = meta
+        self._ids[key] = ids
+        self._invalidate(key)
+
+        if repair and self.quantization == "int8":
+            codes_path = self._path(key, self.codes_file)
+            scales_path = self._path(key, self.scales_file)
+            if (not os.path.exists(codes_path) or os.path.getsize(codes_path) != len(ids) * meta["dimension"]
+                    or not os.path.exists(scales_path) or os.path.getsize(scales_path) != len(ids) * 4):
+                if has_float32:
+                    # 编码与ID数不一致（中断写入或新开启量化）时，根据float32向量重建编码
+                    self._rebuild_codes(key)
+                    self._quantized.append((key, self.store_float32))
+                else:
+                    # 没有float32向量时编码是唯一的数据，只截断中断写入多出的行
+                    for path, row_bytes in ((codes_path, meta["dimension"]), (scales_path, 4)):
+                        if os.path.getsize(path) > len(ids) * row_bytes:
+                            with open(path, "r+b") as f:
+                                f.truncate(len(ids) * row_bytes)
+            if has_float32 and not self.store_float32 and (key, False) not in self._quantized:
+                self._quantized.append((key, False))
+
+    def _drop_shard(self, key: str) -> None:
+        """从内存中移除分片及其记忆ID位置"""
+        self._relocate(key, self._ids.pop(key, None), None)
+        self._shards.pop(key, None)
+        self._invalidate(key)
+
+    def _relocate(self, key: str, old_ids: Optional[np.ndarray], new_ids: Optional[np.ndarray]) -> None:
+        """根据分片前后的ID数组更新记忆ID位置，只遍历变化的ID"""
+        old_live = old_ids[old_ids != self.deleted_id] if old_ids is not None else np.empty(0, dtype=np.int64)
+        new_live = new_ids[new_ids != self.deleted_id] if new_ids is not None else np.empty(0, dtype=np.int64)
+        for memory_id in np.setdiff1d(old_live, new_live).tolist():
+            # 记忆可能已被加载到其他分片
+            if self._locations.get(memory_id) == key:
+                del self._locations[memory_id]
+        for memory_id in np.setdiff1d(new_live, old_live).tolist():
+            self._locations[memory_id] = key
+
+    def _load_metadata(self) -> None:
+        """回放元数据日志中尚未读取的记录，日志被重写后从头回放，只保留仍存在的记忆的元数据"""
+        path = os.path.join(self.directory, self.metadata_file)
+        if not os.path.exists(path):
+            return
+
+        stat = os.stat(path)
+        inode, offset = self._metadata_position
+        replay = stat.st_ino != inode or stat.st_size < offset
+        if replay:
+            offset = 0
+            self._metadata = {}
+            self._metadata_records = 0
+            self._columns.clear()
+        if stat.st_size == offset:
+            self._metadata_position = (stat.st_ino, offset)
+            return
+
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        # 只处理完整的行，正在写入的行留到下次读取
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 追加写入中断时可能留下不完整的行
+                continue
+            self._metadata_records += 1
+            if record["metadata"] is None:
+                self._metadata.pop(record["memory_id"], None)
+            else:
+                self._metadata[record["memory_id"]] = record["metadata"]
+            if not replay:
+                self._columns.pop(self._locations.get(record["memory_id"]), None)
+        self._metadata_position = (stat.st_ino, offset + end)
+
+        if replay:
+            self._metadata = {
+                memory_id: metadata for memory_id, metadata in self._metadata.items()
+                if memory_id in self._locations
+            }
+
+    def _write_metadata(self, records: Dict[int, Optional[Dict[str, Any]]]) -> None:
+        """更新内存中的元数据并追加到日志，值为None表示删除，调用方需持有排他文件锁"""
+        if not records:
+            return
+
+        for memory_id, metadata in records.items():
+            if metadata is None:
+                self._metadata.pop(memory_id, None)
+            else:
+                self._metadata[memory_id] = metadata
+            self._columns.pop(self._locations.get(memory_id), None)
+
+        path = os.path.join(self.directory, self.metadata_file)
+        if self._metadata_records + len(records) > max(len(self._metadata), 1000) * self.metadata_compact_ratio:
+            # 日志中过期的记录过多，按当前元数据重写
+            temp_path = path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for memory_id, metadata in self._metadata.items():
+                    f.write(json.dumps({"memory_id": memory_id, "metadata": metadata}, ensure_ascii=False) + "\n")
+            os.replace(temp_path, path)
+            self._metadata_records = len(self._metadata)
+        else:
+            with open(path, "a", encoding="utf-8") as f:
+                for memory_id, metadata in records.items():
+                    f.write(json.dumps({"memory_id": memory_id, "metadata": metadata}, ensure_ascii=False) + "\n")
+            self._metadata_records += len(records)
+        stat = os.stat(path)
+        self._metadata_position = (stat.st_ino, stat.st_size)
+
+    def _metadata_columns(self, key: str) -> Dict[str, Any]:
+        """获取分片按行对齐的元数据列，分片行或元数据变化后重新生成
+
+        Returns:
+            present（是否有元数据）、priority、created_at（缺失为NaN）、archived（缺失为-1）、
+            tags（标签到所在行号数组的映射）
+        """
+        columns = self._columns.get(key)
+        if columns is not None:
+            return columns
+
+        ids = self._ids[key]
+        present = np.zeros(len(ids), dtype=bool)
+        priority = np.full(len(ids), np.nan)
+        created_at = np.full(len(ids), np.nan)
+        archived = np.full(len(ids), -1, dtype=np.int8)
+        tags: Dict[str, List[int]] = {}
+        for row, memory_id in enumerate(ids.tolist()):
+            metadata = self._metadata.get(memory_id)
+            if metadata is None:
+                continue
+            present[row] = True
+            if metadata.get("memory_priority") is not None:
+                priority[row] = metadata["memory_priority"]
+            if metadata.get("created_at") is not None:
+                created_at[row] = metadata["created_at"]
+            if metadata.get("is_archived") is not None:
+                archived[row] = bool(metadata["is_archived"])
+            for name, value in metadata.items():
+                if value and name.startswith(self.tag_prefix):
+                    tags.setdefault(name[len(self.tag_prefix):], []).append(row)
+
+        columns = {
+            "present": present,
+            "priority": priority,
+            "created_at": created_at,
+            "archived": archived,
+            "tags": {tag: np.asarray(rows, dtype=np.int64) for tag, rows in tags.items()}
+        }
+        self._columns[key] = columns
+        return columns
+
+    def _filter_mask(self, key: str, filters: Dict[str, Any]) -> np.ndarray:
+        """按元数据过滤条件生成分片的行掩码，与match_filters的语义一致，已删除和没有元数据的行不满足条件"""
+        columns = self._metadata_columns(key)
+        mask = columns["present"].copy()
+        if filters.get("tags"):
+            tagged = np.zeros(len(mask), dtype=bool)
+            for tag in filters["tags"]:
+                rows = columns["tags"].get(tag)
+                if rows is not None:
+                    tagged[rows] = True
+            mask &= tagged
+        # 缺失值为NaN，比较结果为False
+        if filters.get("min_priority") is not None:
+            mask &= columns["priority"] >= filters["min_priority"]
+        if filters.get("max_priority") is not None:
+            mask &= columns["priority"] <= filters["max_priority"]
+        if filters.get("created_after") is not None:
+            mask &= columns["created_at"] >= self.to_timestamp(filters["created_after"])
+        if filters.get("created_before") is not None:
+            mask &= columns["created_at"] <= self.to_timestamp(filters["created_before"])
+        if filters.get("is_archived") is not None:
+            mask &= columns["archived"] == int(bool(filters["is_archived"]))
+        return mask
+
+    def _path(self, key: str, name: str) -> str:
+        return os.path.join(self.directory, key, name)
+
+    def _invalidate(self, key: str) -> None:
+        """分片文件变化后丢弃内存映射和元数据列缓存"""
+        self._views.pop(key, None)
+        self._code_views.pop(key, None)
+        self._columns.pop(key, None)
+
+    @staticmethod
+    def _quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """按行做int8标量量化
+
+        Args:
+            vectors: 归一化后的float32矩阵
+
+        Returns:
+            (int8编码矩阵, 每行的float32缩放系数)
+        """
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _report_recall(self) -> None:
+        """测量加载时重新量化的分片的召回率并记录日志，再删除不再保存的float32向量"""
+        for rescore in (True, False):
+            keys = [key for key, key_rescore in self._quantized if key_rescore == rescore and key in self._shards]
+            if not keys:
+                continue
+            recall = self.measure_recall(keys=keys, rescore=rescore)
+            if recall is not None:
+                logger.info(f"int8 quantization recall@10 over {len(keys)} shards"
+                            f"{' with float32 rescoring' if rescore else ' without float32 rescoring'}: {recall:.4f}")
+            if not rescore:
+                for key in keys:
+                    os.remove(self._path(key, self.vectors_file))
+                    self._shards[key]["float32"] = False
+                    self._invalidate(key)
+                    self._touched.add(key)
+                logger.info(f"Removed float32 vectors of {len(keys)} shards, vector_store.store_float32 is disabled")
+        self._quantized = []
+
+    def _restore_float32(self, key: str, dimension: int, count: int) -> None:
+        """根据int8编码还原分片的float32向量文件"""
+        codes = np.fromfile(self._path(key, self.codes_file), dtype=np.int8, count=count * dimension).reshape(-1, dimension)
+        scales = np.fromfile(self._path(key, self.scales_file), dtype=np.float32, count=count)
+        vectors = self._normalize(codes.astype(np.float32) * scales[:, None])
+        temp_path = self._path(key, self.vectors_file + ".tmp")
+        with open(temp_path, "wb") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        os.replace(temp_path, self._path(key, self.vectors_file))
+        self._touched.add(key)
+        logger.info(f"Restored float32 vectors from int8 codes for shard {key}: {len(vectors)} vectors")
+
+    def _rebuild_codes(self, key: str) -> None:
+        """根据分片的float32向量重建量化编码"""
+        self._invalidate(key)
+        ids, vectors = self._view(key)
+        codes, scales = self._quantize(np.asarray(vectors, dtype=np.float32))
+        for name, data in ((self.codes_file, codes), (self.scales_file, scales)):
+            temp_path = self._path(key, name + ".tmp")
+            with open(temp_path, "wb") as f:
+                f.write(np.ascontiguousarray(data).tobytes())
+            os.replace(temp_path, self._path(key, name))
+        self._invalidate(key)
+        self._touched.add(key)
+        logger.info(f"Rebuilt int8 codes for shard {key}: {len(ids)} vectors")
+
+    @staticmethod
+    def _shard_key(user_id: str, app_name: str, dimension: Optional[int] = None) -> str:
+        # 应用使用非默认的Embedding维度时，向量写入单独的分片
+        parts = [user_id, app_name]
+        if dimension and dimension != settings.embedding.dimension:
+            parts.append(dimension)
+        return hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _normalize(embeddings: List[List[float]]) -> np.ndarray:
+        """转换为float32矩阵并做L2归一化，使点积等于余弦相似度"""
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _ensure_shard(self, user_id: str, app_name: str, dimension: int) -> str:
+        """获取分片键，分片不存在时创建"""
+        key = self._shard_key(user_id, app_name, dimension)
+        meta = self._shards.get(key)
+        if meta is None:
+            os.makedirs(os.path.join(self.directory, key), exist_ok=True)
+            names = [self.ids_file, self.codes_file, self.scales_file]
+            if self.store_float32:
+                names.append(self.vectors_file)
+            for name in names:
+                open(self._path(key, name), "ab").close()
+            # 分片描述文件最后写入，其他进程看到它时数据文件都已存在
+            meta = {"user_id": user_id, "app_name": app_name, "dimension": dimension}
+            temp_path = self._path(key, self.meta_file + ".tmp")
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(temp_path, self._path(key, self.meta_file))
+            self._shards[key] = dict(meta, deleted=0, float32=self.store_float32)
+            self._ids[key] = np.empty(0, dtype=np.int64)
+            self._touched.add(key)
+        elif meta["dimension"] != dimension:
+            raise ValueError(f"Embedding dimension {dimension} does not match shard dimension {meta['dimension']}")
+        return key
+
+    def _view(self, key: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """获取分片的ID数组和float32向量矩阵的内存映射，分片未保存float32向量时矩阵为None"""
+        ids = self._ids[key]
+        if not self._shards[key].get("float32", True):
+            return ids, None
+        vectors = self._views.get(key)
+        if vectors is None:
+            dimension = self._shards[key]["dimension"]
+            if not len(ids):
+                vectors = np.empty((0, dimension), dtype=np.float32)
+            else:
+                vectors = np.memmap(self._path(key, self.vectors_file), dtype=np.float32, mode="r", shape=(len(ids), dimension))
+            self._views[key] = vectors
+        return ids, vectors
+
+    def _code_view(self, key: str) -> Tuple[np.ndarray, np.ndarray]:
+        """获取分片的量化编码矩阵和缩放系数的内存映射"""
+        view = self._code_views.get(key)
+        if view is None:
+            dimension = self._shards[key]["dimension"]
+            count = len(self._ids[key])
+            if count == 0:
+                view = (np.empty((0, dimension), dtype=np.int8), np.empty(0, dtype=np.float32))
+            else:
+                view = (
+                    np.memmap(self._path(key, self.codes_file), dtype=np.int8, mode="r", shape=(count, dimension)),
+                    np.memmap(self._path(key, self.scales_file), dtype=np.float32, mode="r", shape=(count,))
+                )
+            self._code_views[key] = view
+        return view
+
+    def _rows(self, key: str, memory_ids: List[int]) -> List[int]:
+        """查找记忆ID在分片中的行号"""
+        ids = self._ids[key]
+        rows = {int(ids[row]): int(row) for row in np.flatnonzero(np.isin(ids, memory_ids))}
+        return [rows[memory_id] for memory_id in memory_ids]
+
+    def _append(self, key: str, memory_ids: List[int], vectors: np.ndarray) -> None:
+        """在分片末尾追加向量，先写向量和编码再写ID，中断时多出的行在加载时截断"""
+        if self._shards[key]["float32"]:
+            with open(self._path(key, self.vectors_file), "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        if self.quantization == "int8":
+            codes, scales = self._quantize(vectors)
+            with open(self._path(key, self.codes_file), "ab") as f:
+                f.write(codes.tobytes())
+            with open(self._path(key, self.scales_file), "ab") as f:
+                f.write(scales.tobytes())
+        appended = np.asarray(memory_ids, dtype=np.int64)
+        with open(self._path(key, self.ids_file), "ab") as f:
+            f.write(appended.tobytes())
+        self._ids[key] = np.concatenate([self._ids[key], appended])
+        self._invalidate(key)
+        self._touched.add(key)
+        for memory_id in memory_ids:
+            self._locations[memory_id] = key
+
+    def _overwrite(self, key: str, rows: List[int], vectors: np.ndarray) -> None:
+        """原地覆盖分片中的向量行"""
+        count = len(self._ids[key])
+        if self._shards[key]["float32"]:
+            matrix = np.memmap(self._path(key, self.vectors_file), dtype=np.float32, mode="r+",
+                               shape=(count, self._shards[key]["dimension"]))
+            matrix[rows] = vectors
+            matrix.flush()
+
+        if self.quantization == "int8":
+            codes, scales = self._quantize(vectors)
+            code_matrix = np.memmap(self._path(key, self.codes_file), dtype=np.int8, mode="r+",
+                                    shape=(count, self._shards[key]["dimension"]))
+            code_matrix[rows] = codes
+            code_matrix.flush()
+            scale_array = np.memmap(self._path(key, self.scales_file), dtype=np.float32, mode="r+", shape=(count,))
+            scale_array[rows] = scales
+            scale_array.flush()
+        self._touched.add(key)
+
+    def _delete(self, memory_ids: List[int], keep_metadata: bool = False) -> None:
+        """将记忆ID标记为已删除，已删除行过多时重写分片；移动到其他分片时保留元数据"""
+        grouped: Dict[str, List[int]] = {}
+        for memory_id in memory_ids:
+            key = self._locations.pop(memory_id, None)
+            if key is not None:
+                grouped.setdefault(key, []).append(memory_id)
+        if not keep_metadata:
+            self._write_metadata({
+                memory_id: None for memory_id in memory_ids
+                if memory_id not in self._locations and memory_id in self._metadata
+            })
+
+        for key, shard_ids in grouped.items():
+            rows = self._rows(key, shard_ids)
+            ids = np.memmap(self._path(key, self.ids_file), dtype=np.int64, mode="r+", shape=(len(self._ids[key]),))
+            ids[rows] = self.deleted_id
+            ids.flush()
+            # 替换为新数组，正在其他线程中检索的旧数组不受影响
+            live_ids = self._ids[key].copy()
+            live_ids[rows] = self.deleted_id
+            self._ids[key] = live_ids
+            self._touched.add(key)
+
+            meta = self._shards[key]
+            meta["deleted"] += len(rows)
+            if meta["deleted"] > len(ids) * self.compact_ratio:
+                self._compact(key)
+
+    def _compact(self, key: str) -> None:
+        """去除已删除的行，重写分片文件；分片为空时删除分片目录"""
+        ids, vectors = self._view(key)
+        keep = ids != self.deleted_id
+        files = [(self.ids_file, ids[keep])]
+        if vectors is not None:
+            files.insert(0, (self.vectors_file, vectors[keep]))
+        if self.quantization == "int8":
+            codes, scales = self._code_view(key)
+            # ID文件最后替换，中断时较长的其他文件在加载时截断或重建
+            files = [(self.codes_file, codes[keep]), (self.scales_file, scales[keep])] + files
+        self._invalidate(key)
+        self._touched.add(key)
+
+        if not keep.any():
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+            del self._shards[key]
+            del self._ids[key]
+            return
+
+        for name, data in files:
+            temp_path = self._path(key, name + ".tmp")
+            with open(temp_path, "wb") as f:
+                f.write(np.ascontiguousarray(data).tobytes())
+            os.replace(temp_path, self._path(key, name))
+        self._ids[key] = ids[keep]
+        self._shards[key]["deleted"] = 0
+
+    def add_embedding(self,
+                      embedding: List[float],
+                      document: str,
+                      memory_id: int,
+                      user_id: str,
+                      app_name: str,
+                      similarity_threshold: float = 0.95,
+                      nearest_results: Optional[List[Dict[str, Any]]] = None,
+                      metadata: Optional[Dict[str, Any]] = None) -> None:
+        """添加或覆盖单个Embedding向量，不保存文档内容"""
+        self.add_embeddings([embedding], [document], [memory_id], [user_id], [app_name], [metadata] if metadata else None)
+
+    def add_embeddings(self,
+                       embeddings: List[List[float]],
+                       documents: List[str],
+                       memory_ids: List[int],
+                       user_ids: List[str],
+                       app_names: List[str],
+                       metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
+        """添加或覆盖多个Embedding向量，不保存文档内容；未提供元数据时保留已有的元数据"""
+        if not memory_ids:
+            return
+
+        with self._write_lock():
+            grouped: Dict[str, List[int]] = {}
+            moved = []
+            for position, (memory_id, user_id, app_name) in enumerate(zip(memory_ids, user_ids, app_names)):
+                key = self._ensure_shard(user_id, app_name, len(embeddings[position]))
+                if self._locations.get(memory_id) not in (None, key):
+                    moved.append(memory_id)
+                grouped.setdefault(key, []).append(position)
+            if moved:
+                self._delete(moved, keep_metadata=True)
+
+            for key, positions in grouped.items():
+                # 不同应用的向量维度可能不同，按分片分别转换为矩阵
+                existing = [position for position in positions if self._locations.get(memory_ids[position]) == key]
+                if existing:
+                    vectors = self._normalize([embeddings[position] for position in existing])
+                    self._overwrite(key, self._rows(key, [memory_ids[position] for position in existing]), vectors)
+                appended = [position for position in positions if self._locations.get(memory_ids[position]) != key]
+                if appended:
+                    vectors = self._normalize([embeddings[position] for position in appended])
+                    self._append(key, [memory_ids[position] for position in appended], vectors)
+
+            if metadatas:
+                self._write_metadata(dict(zip(memory_ids, metadatas)))
+
+    def query_embeddings(self,
+                         query_embedding: List[float],
+                         user_id: str,
+                         app_name: str,
+                         top_k: int = 5,
+                         filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """检索分片内最相似的Embedding向量"""
+        return self.query_embeddings_batch([query_embedding], [user_id], [app_name], [top_k], [filters])[0]
+
+    def query_embeddings_batch(self,
+                               query_embeddings: List[List[float]],
+                               user_ids: List[str],
+                               app_names: List[str],
+                               top_ks: List[int],
+                               filters: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[List[Dict[str, Any]]]:
+        """批量检索，同一分片的查询合并为一次矩阵乘法"""
+        filters = filters or [None] * len(query_embeddings)
+        grouped: Dict[str, List[int]] = {}
+        for position, (user_id, app_name) in enumerate(zip(user_ids, app_names)):
+            grouped.setdefault(self._shard_key(user_id, app_name, len(query_embeddings[position])), []).append(position)
+
+        batch_results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+        for key, positions in grouped.items():
+            queries = self._normalize([query_embeddings[position] for position in positions])
+            shard_results = self._search(
+                key, queries, [top_ks[position] for position in positions],
+                filters=[filters[position] for position in positions]
+            )
+            for position, results in zip(positions, shard_results):
+                batch_results[position] = results
+
+        return batch_results
+
+    def _search(self,
+                key: str,
+                queries: np.ndarray,
+                top_ks: List[int],
+                exact: bool = False,
+                filters: Optional[List[Optional[Dict[str, Any]]]] = None,
+                rescore: bool = True) -> List[List[Dict[str, Any]]]:
+        """在一个分片内检索多个查询
+
+        Args:
+            key: 分片键
+            queries: 归一化后的查询矩阵
+            top_ks: 每个查询的返回结果数量
+            exact: 是否忽略量化编码，直接对float32矩阵精确检索，分片未保存float32向量时无效
+            filters: 每个查询的元数据过滤条件
+            rescore: 是否读取候选行的float32向量精确重排，分片未保存float32向量时无效
+
+        Returns:
+            与查询顺序一致的结果列表
+        """
+        with self._read_lock():
+            if key not in self._shards:
+                return [[] for _ in top_ks]
+            # 内存映射引用的是当前的文件，其他进程之后重写分片也不影响本次检索
+            ids, vectors = self._view(key)
+            if vectors is None:
+                exact = rescore = False
+            quantized = self.quantization == "int8" and not exact
+            if quantized:
+                codes, scales = self._code_view(key)
+            # 相同的过滤条件只生成一次掩码
+            masks: Dict[str, np.ndarray] = {}
+            excluded = []
+            for query_filters in filters or [None] * len(top_ks):
+                if not query_filters:
+                    excluded.append(None)
+                    continue
+                filter_key = json.dumps(query_filters, sort_keys=True, default=str)
+                if filter_key not in masks:
+                    masks[filter_key] = ~self._filter_mask(key, query_filters)
+                excluded.append(masks[filter_key])
+        if not len(ids):
+            return [[] for _ in top_ks]
+
+        deleted = ids == self.deleted_id
+        candidate_count = max(top_ks) * self.rescore_factor
+        if not quantized or (rescore and len(ids) <= candidate_count):
+            # 一次矩阵乘法计算组内所有查询的余弦相似度，已删除和不满足过滤条件的行不参与排序
+            scores = queries @ vectors.T
+            scores[:, deleted] = -np.inf
+            for row_scores, mask in zip(scores, excluded):
+                if mask is not None:
+                    row_scores[mask] = -np.inf
+            return [self._top_results(ids, row_scores, top_k) for row_scores, top_k in zip(scores, top_ks)]
+
+        # 在int8编码上分块粗排，每块临时转换为float32
+        coarse = np.empty((len(queries), len(ids)), dtype=np.float32)
+        for start in range(0, len(ids), self.scan_block_rows):
+            end = start + self.scan_block_rows
+            coarse[:, start:end] = (queries @ codes[start:end].astype(np.float32).T) * scales[start:end]
+        coarse[:, deleted] = -np.inf
+        for row_scores, mask in zip(coarse, excluded):
+            if mask is not None:
+                row_scores[mask] = -np.inf
+        if not rescore:
+            return [self._top_results(ids, row_scores, top_k) for row_scores, top_k in zip(coarse, top_ks)]
+
+        results = []
+        for query, row_scores, top_k in zip(queries, coarse, top_ks):
+            # 读取候选行的float32向量精确重排
+            candidates = np.sort(np.argpartition(-row_scores, candidate_count - 1)[:candidate_count])
+            exact_scores = vectors[candidates] @ query
+            exact_scores[row_scores[candidates] == -np.inf] = -np.inf
+            results.append(self._top_results(ids[candidates], exact_scores, top_k))
+        return results
+
+    def _top_results(self, ids: np.ndarray, scores: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        """从相似度中选出前top_k个结果"""
+        k = min(top_k, len(ids))
+        if k <= 0:
+            return []
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [{
+            "memory_id": int(ids[row]),
+            "similarity": float(1 - scores[row]),  # 与Chroma一致，返回余弦距离
+            "document": None
+        } for row in top if scores[row] != -np.inf]
+
+    def measure_recall(self,
+                       sample_size: int = 100,
+                       top_k: int = 10,
+                       keys: Optional[List[str]] = None,
+                       rescore: bool = True,
+                       reference: Optional[Callable[[List[int]], Dict[int, List[float]]]] = None) -> Optional[float]:
+        """以已存储的向量为查询，衡量量化检索相对精确检索的召回率
+
+        分片未保存float32向量时，需要通过reference提供原始向量（如记忆表中保存的向量）作为精确检索的基准。
+
+        Args:
+            sample_size: 每个分片抽样的查询数
+            top_k: 比较的结果数量
+            keys: 要测量的分片键，为空时测量全部分片
+            rescore: 是否测量float32精确重排后的召回率，为False时只比较int8编码粗排的结果
+            reference: 根据记忆ID列表获取原始向量的函数
+
+        Returns:
+            recall@top_k，未开启量化或没有可比较的数据时返回None
+        """
+        if self.quantization == "none":
+            return None
+
+        hits = 0
+        total = 0
+        rng = np.random.default_rng(0)
+        if keys is None:
+            with self._read_lock():
+                keys = list(self._shards)
+        for key in keys:
+            with self._read_lock():
+                if key not in self._shards:
+                    continue
+                ids, vectors = self._view(key)
+            live_rows = np.flatnonzero(ids != self.deleted_id)
+            if not len(live_rows):
+                continue
+            if vectors is None:
+                if reference is None:
+                    continue
+                originals = reference(ids[live_rows].tolist())
+                live_rows = np.array([row for row in live_rows if int(ids[row]) in originals], dtype=np.int64)
+                if not len(live_rows):
+                    continue
+                exact_ids = ids[live_rows]
+                exact_vectors = self._normalize([originals[int(memory_id)] for memory_id in exact_ids])
+            else:
+                exact_ids = ids[live_rows]
+                exact_vectors = np.asarray(vectors[live_rows], dtype=np.float32)
+
+            sample = np.sort(rng.choice(len(live_rows), size=min(sample_size, len(live_rows)), replace=False))
+            queries = exact_vectors[sample]
+            approximate_results = self._search(key, queries, [top_k] * len(queries), rescore=rescore and vectors is not None)
+            scores = queries @ exact_vectors.T
+            for approximate, exact in zip(approximate_results, scores):
+                expected = {result["memory_id"] for result in self._top_results(exact_ids, exact, top_k)}
+                hits += len(expected & {result["memory_id"] for result in approximate})
+                total += len(expected)
+
+        return hits / total if total else None
+
+    def update_embedding(self,
+                         memory_id: int,
+                         embedding: Optional[List[float]] = None,
+                         document: Optional[str] = None,
+                         user_id: Optional[str] = None,
+                         app_name: Optional[str] = None) -> None:
+        """更新Embedding向量，用户或应用变化时移动到对应分片"""
+        with self._write_lock():
+            key = self._locations.get(memory_id)
+            if key is None:
+                logger.warning(f"Embedding for memory {memory_id} not found, skip update")
+                return
+
+            meta = self._shards[key]
+            target_user_id = user_id or meta["user_id"]
+            target_app_name = app_name or meta["app_name"]
+            if embedding is None:
+                if (target_user_id, target_app_name) == (meta["user_id"], meta["app_name"]):
+                    return
+                embedding = self.get_embeddings([memory_id])[memory_id]
+
+            self.add_embeddings([embedding], [document], [memory_id], [target_user_id], [target_app_name])
+
+    def update_embeddings(self,
+                          memory_ids: List[int],
+                          embeddings: List[List[float]],
+                          documents: List[str],
+                          user_ids: Optional[List[str]] = None,
+                          app_names: Optional[List[str]] = None) -> None:
+        """批量更新Embedding向量，不存在的记忆会被跳过"""
+        with self._write_lock():
+            known = [position for position, memory_id in enumerate(memory_ids) if memory_id in self._locations]
+            if not known:
+                return
+            self.add_embeddings(
+                [embeddings[position] for position in known],
+                [documents[position] for position in known],
+                [memory_ids[position] for position in known],
+                [self._shards[self._locations[memory_ids[position]]]["user_id"] for position in known],
+                [self._shards[self._locations[memory_ids[position]]]["app_name"] for position in known]
+            )
+
+    def update_metadata(self,
+                        memory_ids: List[int],
+                        metadatas: List[Dict[str, Any]],
+                        user_ids: Optional[List[str]] = None,
+                        app_names: Optional[List[str]] = None) -> None:
+        """更新记忆用于过滤的元数据，不存在的记忆会被跳过"""
+        with self._write_lock():
+            self._write_metadata({
+                memory_id: metadata for memory_id, metadata in zip(memory_ids, metadatas)
+                if memory_id in self._locations
+            })
+
+    def get_embeddings(self,
+                       memory_ids: List[int],
+                       user_ids: Optional[List[str]] = None,
+                       app_names: Optional[List[str]] = None) -> Dict[int, List[float]]:
+        """批量获取已存储的（归一化后的）Embedding向量"""
+        results = {}
+        with self._read_lock():
+            grouped: Dict[str, List[int]] = {}
+            for memory_id in memory_ids:
+                key = self._locations.get(memory_id)
+                if key is not None:
+                    grouped.setdefault(key, []).append(memory_id)
+
+            for key, shard_ids in grouped.items():
+                rows = self._rows(key, shard_ids)
+                vectors = self._view(key)[1]
+                if vectors is None:
+                    # 未保存float32向量时返回int8编码还原的向量
+                    codes, scales = self._code_view(key)
+                    vectors = self._normalize(codes[rows].astype(np.float32) * scales[rows, None])
+                    rows = range(len(rows))
+                for memory_id, row in zip(shard_ids, rows):
+                    results[memory_id] = vectors[row].tolist()
+        return results
+
+    def delete_embedding(self, memory_id: int, user_id: Optional[str] = None, app_name: Optional[str] = None) -> None:
+        """删除Embedding向量"""
+        with self._write_lock():
+            self._delete([memory_id])
+
+    def delete_embeddings_by_filter(self, user_id: Optional[str] = None, app_name: Optional[str] = None) -> None:
+        """删除匹配用户和应用的整个分片"""
+        if not user_id and not app_name:
+            return
+
+        with self._write_lock():
+            for key, meta in list(self._shards.items()):
+                if (user_id and meta["user_id"] != user_id) or (app_name and meta["app_name"] != app_name):
+                    continue
+                ids = self._ids[key]
+                removed = ids[ids != self.deleted_id].tolist()
+                self._drop_shard(key)
+                self._write_metadata({memory_id: None for memory_id in removed if memory_id in self._metadata})
+                shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+                self._touched.add(key)
+
+    def reset(self) -> None:
+        """删除所有数据"""
+        with self._write_lock():
+            self._shards.clear()
+            self._ids.clear()
+            self._views.clear()
+            self._code_views.clear()
+            self._columns.clear()
+            self._locations.clear()
+            self._metadata.clear()
+            self._metadata_records = 0
+            self._metadata_position = (0, 0)
+            # 保留锁文件，其他进程可能正在等待它；日志随之删除，其他进程会重新加载全部分片
+            for name in os.listdir(self.directory):
+                if name == self.lock_file:
+                    continue
+                path = os.path.join(self.directory, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
@@ -0,0 +1,519 @@
+import hashlib
+import threading
+from typing import List, Dict, Any, Optional, Set, Tuple
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.session import SessionLocal
+from app.models import SharedEmbedding, MemoryEmbeddingRef, UserMemory
+from app.services.vector_store.base import VectorStore
+
+logger = get_logger(__name__)
+
+
+class SharedEmbeddingStore(VectorStore):
+    """内容寻址的共享向量存储
+
+    包装一个向量存储后端。同一用户和应用下，内容相同（按内容和向量维度哈希）或与已有向量的余弦相似度
+    不低于阈值的记忆不再写入新向量，而是引用已有的共享向量，引用关系保存在数据库中。
+    后端中的记录ID为共享向量ID，查询时把命中的共享向量展开为引用它的所有记忆。
+    共享向量被多条记忆引用，不保存记忆的元数据；带过滤条件的查询多召回一些共享向量，
+    展开后按数据库中记忆的字段过滤，过滤后不足top_k条时加倍召回数重新查询，直到足够或后端没有更多结果。
+    """
+
+    # 带过滤条件时共享向量的首次召回数为top_k的倍数
+    filtered_candidate_factor = 4
+    # 过滤后结果不足时召回数的上限为top_k的倍数
+    max_candidate_factor = 256
+
+    def __init__(self,
+                 store: VectorStore,
+                 similarity_threshold: Optional[float] = None,
+                 session_factory=SessionLocal):
+        """初始化共享向量存储
+
+        Args:
+            store: 实际保存向量的后端
+            similarity_threshold: 批量写入时共用已有向量的相似度阈值
+            session_factory: 数据库会话工厂
+        """
+        self.store = store
+        self.similarity_threshold = similarity_threshold or settings.vector_store.shared_similarity_threshold
+        self.session_factory = session_factory
+        # 写入需要先查找再创建共享向量，进程内串行执行；其他进程并发创建的相同内容由唯一约束发现后复用
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def content_hash(document: str, dimension: int) -> str:
+        """计算内容哈希，不同维度的向量不能共用"""
+        return hashlib.sha256(f"{dimension}:{document}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _detach(db: Session, memory_ids: List[int]) -> Set[int]:
+        """删除记忆的引用
+
+        Returns:
+            记忆原来引用的共享向量ID，提交前交给_release清理不再被引用的记录
+        """
+        embedding_ids = set(db.execute(
+            select(MemoryEmbeddingRef.embedding_id).where(MemoryEmbeddingRef.memory_id.in_(memory_ids))
+        ).scalars().all())
+        if embedding_ids:
+            db.execute(delete(MemoryEmbeddingRef).where(MemoryEmbeddingRef.memory_id.in_(memory_ids)))
+        return embedding_ids
+
+    @staticmethod
+    def _release(db: Session, embedding_ids: Set[int]) -> List[Tuple[int, str, str]]:
+        """删除不再被引用的共享向量记录
+
+        后端中的向量要在事务提交后再删除，事务回滚时引用和向量都保持不变。
+
+        Args:
+            db: 数据库会话
+            embedding_ids: 可能不再被引用的共享向量ID
+
+        Returns:
+            已删除记录的(共享向量ID, 用户ID, 应用名称)列表
+        """
+        if not embedding_ids:
+            return []
+
+        db.flush()
+        referenced = set(db.execute(
+            select(MemoryEmbeddingRef.embedding_id).where(MemoryEmbeddingRef.embedding_id.in_(embedding_ids))
+        ).scalars().all())
+        orphaned = embedding_ids - referenced
+        if not orphaned:
+            return []
+
+        rows = db.execute(select(SharedEmbedding.id, SharedEmbedding.user_id, SharedEmbedding.app_name).where(
+            SharedEmbedding.id.in_(orphaned)
+        )).all()
+        db.execute(delete(SharedEmbedding).where(SharedEmbedding.id.in_(orphaned)))
+        return [(row.id, row.user_id, row.app_name) for row in rows]
+
+    def _delete_vectors(self, orphans: List[Tuple[int, str, str]]) -> None:
+        """事务提交后从后端删除不再被引用的共享向量"""
+        for embedding_id, user_id, app_name in orphans:
+            self.store.delete_embedding(embedding_id, user_id, app_name)
+
+    def _attach(self,
+                db: Session,
+                embeddings: List[List[float]],
+                documents: List[Optional[str]],
+                memory_ids: List[int],
+                user_ids: List[str],
+                app_names: List[str],
+                hashes: List[str],
+                targets: List[Optional[int]],
+                similarity_threshold: float,
+                detached: Set[int],
+                query_nearest: bool = True) -> None:
+        """为记忆写入引用并提交
+
+        targets中为None的记忆依次按内容哈希、近似向量查找同一用户和应用下的共享向量，
+        都找不到时创建新的共享向量，同一批次中内容相同的记忆只创建一次。
+        原来引用的共享向量仍可被复用，提交前删除不再被引用的记录，提交后再从后端删除向量。
+
+        Args:
+            db: 数据库会话
+            embeddings: Embedding向量列表
+            documents: 文档内容列表
+            memory_ids: 记忆ID列表
+            user_ids: 用户ID列表
+            app_names: 应用名称列表
+            hashes: 内容哈希列表
+            targets: 已确定引用的共享向量ID，未确定的为None
+            similarity_threshold: 共用近似向量的相似度阈值
+            detached: 记忆解除引用前引用的共享向量ID
+            query_nearest: 是否查询近似向量，调用方已查询过时为False
+        """
+        unresolved = [position for position, target in enumerate(targets) if target is None]
+        if unresolved:
+            rows = db.execute(select(
+                SharedEmbedding.id,
+                SharedEmbedding.user_id,
+                SharedEmbedding.app_name,
+                SharedEmbedding.content_hash
+            ).where(SharedEmbedding.content_hash.in_({hashes[position] for position in unresolved}))).all()
+            by_hash = {(row.user_id, row.app_name, row.content_hash): row.id for row in rows}
+            for position in unresolved:
+                targets[position] = by_hash.get((user_ids[position], app_names[position], hashes[position]))
+
+        unresolved = [position for position, target in enumerate(targets) if target is None]
+        if unresolved and query_nearest:
+            # 后端返回的memory_id即共享向量ID
+            nearest = self.store.query_embeddings_batch(
+                [embeddings[position] for position in unresolved],
+                [user_ids[position] for position in unresolved],
+                [app_names[position] for position in unresolved],
+                [1] * len(unresolved)
+            )
+            for position, results in zip(unresolved, nearest):
+                if results and 1 - results[0]["similarity"] >= similarity_threshold:
+                    targets[position] = results[0]["memory_id"]
+
+        first_positions: Dict[tuple, int] = {}
+        for position, target in enumerate(targets):
+            key = (user_ids[position], app_names[position], hashes[position])
+            if target is None and key not in first_positions:
+                first_positions[key] = position
+        created, new_keys = self._create_shared(db, list(first_positions))
+        new_positions = [first_positions[key] for key in first_positions if key in new_keys]
+        for position, target in enumerate(targets):
+            if target is None:
+                targets[position] = created[(user_ids[position], app_names[position], hashes[position])]
+
+        db.add_all([
+            MemoryEmbeddingRef(memory_id=memory_id, embedding_id=target)
+            for memory_id, target in zip(memory_ids, targets)
+        ])
+        if new_positions:
+            self.store.add_embeddings(
+                embeddings=[embeddings[position] for position in new_positions],
+                documents=[documents[position] or "" for position in new_positions],
+                memory_ids=[targets[position] for position in new_positions],
+                user_ids=[user_ids[position] for position in new_positions],
+                app_names=[app_names[position] for position in new_positions]
+            )
+        orphans = self._release(db, detached)
+        db.commit()
+        self._delete_vectors(orphans)
+
+        if len(new_positions) < len(memory_ids):
+            logger.info(f"{len(memory_ids) - len(new_positions)} of {len(memory_ids)} embeddings shared with existing vectors")
+
+    @staticmethod
+    def _create_shared(db: Session, keys: List[Tuple[str, str, str]]) -> Tuple[Dict[tuple, int], Set[tuple]]:
+        """创建共享向量记录，其他进程已提交相同内容的记录时复用已有记录
+
+        插入时忽略违反唯一约束的记录，不依赖保存点（pysqlite默认的事务处理下保存点不可靠），
+        再重新查询所有内容键的ID。数据库不支持INSERT ... RETURNING时无法区分并发创建的记录，
+        全部视为新建，后端按相同内容的向量覆盖写入一次。
+
+        Args:
+            db: 数据库会话
+            keys: (用户ID, 应用名称, 内容哈希)列表
+
+        Returns:
+            (内容键到共享向量ID的映射, 本次新建的内容键集合)
+        """
+        if not keys:
+            return {}, set()
+
+        dialect = db.get_bind().dialect
+        if dialect.name == "mysql":
+            statement = mysql_insert(SharedEmbedding).prefix_with("IGNORE")
+        else:
+            insert = postgresql_insert if dialect.name == "postgresql" else sqlite_insert
+            statement = insert(SharedEmbedding).on_conflict_do_nothing(
+                index_elements=["user_id", "app_name", "content_hash"]
+            )
+        values = [{"user_id": key[0], "app_name": key[1], "content_hash": key[2]} for key in keys]
+        if dialect.insert_returning:
+            inserted = db.execute(statement.returning(
+                SharedEmbedding.user_id, SharedEmbedding.app_name, SharedEmbedding.content_hash
+            ), values).all()
+            new_keys = {tuple(row) for row in inserted}
+        else:
+            db.execute(statement, values)
+            new_keys = set(keys)
+
+        rows = db.execute(select(
+            SharedEmbedding.id,
+            SharedEmbedding.user_id,
+            SharedEmbedding.app_name,
+            SharedEmbedding.content_hash
+        ).where(SharedEmbedding.content_hash.in_({key[2] for key in keys}))).all()
+        existing = {(row.user_id, row.app_name, row.content_hash): row.id for row in rows}
+        if len(new_keys) < len(keys):
+            logger.info(f"{len(keys) - len(new_keys)} shared embeddings were created concurrently, reusing them")
+        return {key: existing[key] for key in keys}, new_keys
+
+    def add_embedding(self,
+                      embedding: List[float],
+                      document: str,
+                      memory_id: int,
+                      user_id: str,
+                      app_name: str,
+                      similarity_threshold: float = 0.95,
+                      nearest_results: Optional[List[Dict[str, Any]]] = None,
+                      metadata: Optional[Dict[str, Any]] = None) -> None:
+        """添加单个Embedding向量，相同或近似的内容引用已有的共享向量；元数据不写入后端"""
+        with self._lock, self.session_factory() as db:
+            detached = self._detach(db, [memory_id])
+
+            # 调用方的最近邻结果中为记忆ID，共用其引用的共享向量
+            target = None
+            if nearest_results and 1 - nearest_results[0]["similarity"] >= similarity_threshold:
+                target = db.execute(select(MemoryEmbeddingRef.embedding_id).where(
+                    MemoryEmbeddingRef.memory_id == nearest_results[0]["memory_id"]
+                )).scalar()
+
+            self._attach(
+                db, [embedding], [document], [memory_id], [user_id], [app_name],
+                [self.content_hash(document, len(embedding))], [target],
+                similarity_threshold, detached, query_nearest=nearest_results is None
+            )
+
+    def add_embeddings(self,
+                       embeddings: List[List[float]],
+                       documents: List[str],
+                       memory_ids: List[int],
+                       user_ids: List[str],
+                       app_names: List[str],
+                       metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
+        """添加或覆盖多个Embedding向量，相同或近似的内容引用已有的共享向量；元数据不写入后端"""
+        if not memory_ids:
+            return
+
+        with self._lock, self.session_factory() as db:
+            detached = self._detach(db, memory_ids)
+            self._attach(
+                db, embeddings, documents, memory_ids, user_ids, app_names,
+                [self.content_hash(document, len(embedding)) for document, embedding in zip(documents, embeddings)],
+                [None] * len(memory_ids),
+                self.similarity_threshold,
+                detached
+            )
+
+    def query_embeddings(self,
+                         query_embedding: List[float],
+                         user_id: str,
+                         app_name: str,
+                         top_k: int = 5,
+                         filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """查询相似Embedding向量，命中的共享向量展开为引用它的记忆"""
+        return self.query_embeddings_batch([query_embedding], [user_id], [app_name], [top_k], [filters])[0]
+
+    def query_embeddings_batch(self,
+                               query_embeddings: List[List[float]],
+                               user_ids: List[str],
+                               app_names: List[str],
+                               top_ks: List[int],
+                               filters: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[List[Dict[str, Any]]]:
+        """批量查询相似Embedding向量，一次查询展开所有命中的共享向量
+
+        过滤后不足top_k条且后端返回了全部召回数的查询，加倍召回数再次批量查询。
+        """
+        filters = filters or [None] * len(query_embeddings)
+        candidate_counts = [
+            top_k * self.filtered_candidate_factor if query_filters else top_k
+            for top_k, query_filters in zip(top_ks, filters)
+        ]
+        expanded_results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+        pending = list(range(len(query_embeddings)))
+        with self.session_factory() as db:
+            while pending:
+                batch_results = self.store.query_embeddings_batch(
+                    [query_embeddings[position] for position in pending],
+                    [user_ids[position] for position in pending],
+                    [app_names[position] for position in pending],
+                    [candidate_counts[position] for position in pending]
+                )
+                expanded = self._expand(db, batch_results, [filters[position] for position in pending])
+
+                retry = []
+                for position, results, memory_results in zip(pending, batch_results, expanded):
+                    expanded_results[position] = memory_results[:top_ks[position]]
+                    exhausted = len(results) < candidate_counts[position]
+                    limit = top_ks[position] * self.max_candidate_factor
+                    if len(memory_results) < top_ks[position] and not exhausted and candidate_counts[position] < limit:
+                        candidate_counts[position] = min(candidate_counts[position] * 2, limit)
+                        retry.append(position)
+                pending = retry
+        return expanded_results
+
+    def _expand(self,
+                db: Session,
+                batch_results: List[List[Dict[str, Any]]],
+                filters: List[Optional[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+        """把命中的共享向量展开为引用它的记忆，并按数据库中记忆的字段过滤
+
+        Args:
+            db: 数据库会话
+            batch_results: 后端返回的每个查询的共享向量结果
+            filters: 每个查询的过滤条件
+
+        Returns:
+            每个查询展开并过滤后的全部记忆结果
+        """
+        embedding_ids = {result["memory_id"] for results in batch_results for result in results}
+        if not embedding_ids:
+            return [[] for _ in batch_results]
+
+        rows = db.execute(select(MemoryEmbeddingRef.memory_id, MemoryEmbeddingRef.embedding_id).where(
+            MemoryEmbeddingRef.embedding_id.in_(embedding_ids)
+        ).order_by(MemoryEmbeddingRef.memory_id.desc())).all()
+        metadatas = {}
+        if any(filters):
+            # 一次查询加载展开后记忆的过滤字段
+            metadatas = {
+                memory.id: self.memory_metadata(memory)
+                for memory in db.execute(select(
+                    UserMemory.id,
+                    UserMemory.memory_priority,
+                    UserMemory.memory_tags,
+                    UserMemory.is_archived,
+                    UserMemory.created_at
+                ).where(UserMemory.id.in_([row.memory_id for row in rows]))).all()
+            }
+        references: Dict[int, List[int]] = {}
+        for row in rows:
+            references.setdefault(row.embedding_id, []).append(row.memory_id)
+
+        # 引用同一共享向量的记忆距离相同，较新的记忆排在前面
+        return [
+            [
+                {"memory_id": memory_id, "similarity": result["similarity"], "document": result["document"]}
+                for result in results
+                for memory_id in references.get(result["memory_id"], [])
+                if not query_filters or self.match_filters(metadatas.get(memory_id), query_filters)
+            ]
+            for results, query_filters in zip(batch_results, filters)
+        ]
+
+    def update_embedding(self,
+                         memory_id: int,
+                         embedding: Optional[List[float]] = None,
+                         document: Optional[str] = None,
+                         user_id: Optional[str] = None,
+                         app_name: Optional[str] = None) -> None:
+        """更新Embedding向量，记忆解除原有引用后重新查找或创建共享向量"""
+        with self._lock, self.session_factory() as db:
+            shared = db.execute(select(SharedEmbedding).join(
+                MemoryEmbeddingRef, MemoryEmbeddingRef.embedding_id == SharedEmbedding.id
+            ).where(MemoryEmbeddingRef.memory_id == memory_id)).scalars().first()
+            if shared is None:
+                logger.warning(f"Embedding for memory {memory_id} not found, skip update")
+                return
+
+            target_user_id = user_id or shared.user_id
+            target_app_name = app_name or shared.app_name
+            if embedding is None:
+                if document is None and (target_user_id, target_app_name) == (shared.user_id, shared.app_name):
+                    return
+                embedding = self.store.get_embeddings([shared.id], [shared.user_id], [shared.app_name]).get(shared.id)
+                if embedding is None:
+                    logger.warning(f"Shared embedding {shared.id} for memory {memory_id} not found, skip update")
+                    return
+            content_hash = self.content_hash(document, len(embedding)) if document is not None else shared.content_hash
+
+            detached = self._detach(db, [memory_id])
+            self._attach(
+                db, [embedding], [document], [memory_id], [target_user_id], [target_app_name],
+                [content_hash], [None], self.similarity_threshold, detached
+            )
+
+    def update_embeddings(self,
+                          memory_ids: List[int],
+                          embeddings: List[List[float]],
+                          documents: List[str],
+                          user_ids: Optional[List[str]] = None,
+                          app_names: Optional[List[str]] = None) -> None:
+        """批量更新Embedding向量，不存在的记忆会被跳过，用户和应用以共享向量的记录为准"""
+        with self._lock, self.session_factory() as db:
+            scopes = {
+                row.memory_id: (row.user_id, row.app_name)
+                for row in db.execute(select(
+                    MemoryEmbeddingRef.memory_id,
+                    SharedEmbedding.user_id,
+                    SharedEmbedding.app_name
+                ).join(
+                    SharedEmbedding, MemoryEmbeddingRef.embedding_id == SharedEmbedding.id
+                ).where(MemoryEmbeddingRef.memory_id.in_(memory_ids))).all()
+            }
+            known = [position for position, memory_id in enumerate(memory_ids) if memory_id in scopes]
+            if not known:
+                return
+
+            known_ids = [memory_ids[position] for position in known]
+            detached = self._detach(db, known_ids)
+            self._attach(
+                db,
+                [embeddings[position] for position in known],
+                [documents[position] for position in known],
+                known_ids,
+                [scopes[memory_id][0] for memory_id in known_ids],
+                [scopes[memory_id][1] for memory_id in known_ids],
+                [self.content_hash(documents[position], len(embeddings[position])) for position in known],
+                [None] * len(known),
+                self.similarity_threshold,
+                detached
+            )
+
+    def update_metadata(self,
+                        memory_ids: List[int],
+                        metadatas: List[Dict[str, Any]],
+                        user_ids: Optional[List[str]] = None,
+                        app_names: Optional[List[str]] = None) -> None:
+        """过滤条件直接读取数据库中的记忆字段，无需更新"""
+        pass
+
+    def get_embeddings(self,
+                       memory_ids: List[int],
+                       user_ids: Optional[List[str]] = None,
+                       app_names: Optional[List[str]] = None) -> Dict[int, List[float]]:
+        """批量获取记忆引用的共享向量"""
+        if not memory_ids:
+            return {}
+
+        with self.session_factory() as db:
+            rows = db.execute(select(
+                MemoryEmbeddingRef.memory_id,
+                SharedEmbedding.id,
+                SharedEmbedding.user_id,
+                SharedEmbedding.app_name
+            ).join(
+                SharedEmbedding, MemoryEmbeddingRef.embedding_id == SharedEmbedding.id
+            ).where(MemoryEmbeddingRef.memory_id.in_(memory_ids))).all()
+        references = {row.memory_id: row.id for row in rows}
+        scopes = {row.id: (row.user_id, row.app_name) for row in rows}
+        vectors = self.store.get_embeddings(
+            list(scopes.keys()),
+            [user_id for user_id, _ in scopes.values()],
+            [app_name for _, app_name in scopes.values()]
+        )
+        return {
+            memory_id: vectors[embedding_id]
+            for memory_id, embedding_id in references.items()
+            if embedding_id in vectors
+        }
+
+    def delete_embedding(self, memory_id: int, user_id: Optional[str] = None, app_name: Optional[str] = None) -> None:
+        """删除记忆的引用，共享向量不再被引用时一并删除"""
+        with self._lock, self.session_factory() as db:
+            orphans = self._release(db, self._detach(db, [memory_id]))
+            db.commit()
+            self._delete_vectors(orphans)
+
+    def delete_embeddings_by_filter(self, user_id: Optional[str] = None, app_name: Optional[str] = None) -> None:
+        """根据条件删除共享向量及其引用"""
+        if not user_id and not app_name:
+            return
+
+        with self._lock, self.session_factory() as db:
+            self.store.delete_embeddings_by_filter(user_id=user_id, app_name=app_name)
+            conditions = []
+            if user_id:
+                conditions.append(SharedEmbedding.user_id == user_id)
+            if app_name:
+                conditions.append(SharedEmbedding.app_name == app_name)
+            db.execute(delete(MemoryEmbeddingRef).where(
+                MemoryEmbeddingRef.embedding_id.in_(select(SharedEmbedding.id).where(*conditions))
+            ))
+            db.execute(delete(SharedEmbedding).where(*conditions))
+            db.commit()
+
+    def reset(self) -> None:
+        """删除所有数据"""
+        with self._lock, self.session_factory() as db:
+            self.store.reset()
+            db.execute(delete(MemoryEmbeddingRef))
+            db.execute(delete(SharedEmbedding))
+            db.commit()
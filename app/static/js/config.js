@@ -119,8 +119,11 @@ function loadAppConfig() {
         $('#conversationRounds').val(config.conversation_rounds);
         $('#maxSummaryLength').val(config.max_summary_length);
         $('#similarityThreshold').val(config.similarity_threshold);
+        $('#embeddingDimension').val(config.embedding_dimension || '');
         $('#enableAutoSummarize').prop('checked', config.enable_auto_summarize);
         $('#enableElementExtraction').prop('checked', config.enable_element_extraction);
+        $('#enableCombinedExtraction').prop('checked', config.enable_combined_extraction);
+        $('#enableHybridSearch').prop('checked', config.enable_hybrid_search);
         
         // 填充权重配置
         if (config.priority_weights) {
@@ -255,8 +258,11 @@ function saveAppConfig() {
     const conversationRounds = parseInt($('#conversationRounds').val());
     const maxSummaryLength = parseInt($('#maxSummaryLength').val());
     const similarityThreshold = parseFloat($('#similarityThreshold').val());
+    const embeddingDimension = $('#embeddingDimension').val() ? parseInt($('#embeddingDimension').val()) : null;
     const enableAutoSummarize = $('#enableAutoSummarize').is(':checked');
     const enableElementExtraction = $('#enableElementExtraction').is(':checked');
+    const enableCombinedExtraction = $('#enableCombinedExtraction').is(':checked');
+    const enableHybridSearch = $('#enableHybridSearch').is(':checked');
     
     // 获取权重配置
     const contentLengthWeight = parseFloat($('#contentLengthWeight').val());
@@ -406,6 +412,9 @@ function saveAppConfig() {
         similarity_threshold: similarityThreshold,
         enable_auto_summarize: enableAutoSummarize,
         enable_element_extraction: enableElementExtraction,
+        enable_combined_extraction: enableCombinedExtraction,
+        enable_hybrid_search: enableHybridSearch,
+        embedding_dimension: embeddingDimension,
         priority_weights: {
             content_length: contentLengthWeight,
             element_count: elementCountWeight,
@@ -113,7 +113,7 @@ function submitChatHistory() {
     
     // 发送请求
     makeRequest('/api/memory/submit', 'POST', data, function(response) {
-        showSuccess('聊天历史提交成功！记忆ID: ' + response.data.memory_id);
+        showSuccess('聊天历史提交成功！任务ID: ' + response.data.job_id);
         // 重置表单
         clearSubmitForm();
     });
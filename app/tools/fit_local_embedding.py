@@ -0,0 +1,46 @@
+"""
+本地Embedding模型拟合工具，在user_memories中的记忆内容上拟合local服务的IDF权重和SVD投影
+
+用法:
+    python -m app.tools.fit_local_embedding [--app-name myapp] [--limit 5000] [--output ./data/local_embedding.npz]
+"""
+
+import argparse
+import time
+from sqlalchemy import select
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models import UserMemory
+from app.services.embedding import LocalEmbeddingService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="拟合本地Embedding服务的SVD投影")
+    parser.add_argument("--app-name", help="只使用该应用的记忆")
+    parser.add_argument("--limit", type=int, default=5000, help="最多使用的记忆数，拟合时的内存占用约为limit×features×4字节")
+    parser.add_argument("--features", type=int, default=16384, help="哈希特征空间维度")
+    parser.add_argument("--output", default=settings.embedding.local_model_path, help="模型文件路径")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        statement = select(UserMemory.memory_content).where(UserMemory.is_active == True)
+        if args.app_name:
+            statement = statement.where(UserMemory.app_name == args.app_name)
+        statement = statement.order_by(UserMemory.id.desc()).limit(args.limit)
+        texts = list(db.execute(statement).scalars().all())
+    finally:
+        db.close()
+
+    print(f"语料: {len(texts)} 条记忆, 目标维度: {settings.embedding.dimension}")
+    started_at = time.time()
+    # 从哈希向量开始拟合，不加载已有的模型文件
+    service = LocalEmbeddingService(model_path="")
+    service.fit(texts, n_features=args.features)
+    service.save_model(args.output)
+    print(f"\n🎉 拟合完成，模型已保存到 {args.output}，耗时 {time.time() - started_at:.1f} 秒")
+    print("切换模型后请运行 python3 -m app.tools.reindex --clear --regenerate 重建向量")
+
+
+if __name__ == "__main__":
+    main()
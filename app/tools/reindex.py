@@ -0,0 +1,88 @@
+"""
+向量存储重建工具，从user_memories流式读取有效记忆，批量生成Embedding并写入当前配置的向量存储
+
+用法:
+    python -m app.tools.reindex [--app-name myapp] [--user-id user123] [--workers 4] [--clear] [--regenerate]
+"""
+
+import argparse
+import time
+from typing import Dict, List
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.container import service_container
+from app.db.session import SessionLocal
+from app.models import UserMemory, MemoryEmbeddingRef
+from app.services.memory import MemoryReindexer
+from app.services.vector_store import NumpyVectorStore, SharedEmbeddingStore
+
+
+def stored_embeddings(db, record_ids: List[int], shared: bool) -> Dict[int, List[float]]:
+    """读取记忆表中保存的向量，作为测量量化召回率的精确基准
+
+    Args:
+        db: 数据库会话
+        record_ids: 向量存储中的记录ID，共享向量存储中为共享向量ID
+        shared: 是否为共享向量存储
+
+    Returns:
+        记录ID到向量的映射，共享向量取任一引用记忆的向量
+    """
+    key = MemoryEmbeddingRef.embedding_id if shared else UserMemory.id
+    query = select(key, UserMemory.embedding, UserMemory.embedding_dtype).where(UserMemory.embedding.isnot(None))
+    if shared:
+        query = query.join(MemoryEmbeddingRef, MemoryEmbeddingRef.memory_id == UserMemory.id)
+    vectors = {}
+    for chunk in range(0, len(record_ids), 500):
+        for record_id, data, dtype in db.execute(query.where(key.in_(record_ids[chunk:chunk + 500]))).all():
+            vectors.setdefault(record_id, service_container.embedding_service.unpack_embedding(data, dtype).tolist())
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从数据库重建向量存储")
+    parser.add_argument("--app-name", help="只重建该应用的记忆")
+    parser.add_argument("--user-id", help="只重建该用户的记忆")
+    parser.add_argument("--batch-size", type=int, default=256, help="每批读取和生成Embedding的记忆数")
+    parser.add_argument("--workers", type=int, default=4, help="并行生成Embedding的线程数")
+    parser.add_argument("--checkpoint", default="./data/reindex_checkpoint.json", help="检查点文件路径")
+    parser.add_argument("--no-resume", action="store_true", help="忽略已有检查点，从头开始重建")
+    parser.add_argument("--regenerate", action="store_true", help="忽略记忆表中保存的向量，全部重新生成（切换Embedding服务或模型后使用）")
+    parser.add_argument("--clear", action="store_true", help="开始前删除重建范围内已有的向量，未指定范围时清空向量存储")
+    args = parser.parse_args()
+
+    print(f"向量存储: {settings.vector_store.backend}")
+    print(f"范围: app_name={args.app_name or '全部'}, user_id={args.user_id or '全部'}")
+
+    db = SessionLocal()
+    try:
+        started_at = time.time()
+        reindexer = MemoryReindexer(
+            db,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            checkpoint_path=args.checkpoint,
+            regenerate=args.regenerate
+        )
+        processed = reindexer.run(
+            user_id=args.user_id,
+            app_name=args.app_name,
+            resume=not args.no_resume,
+            clear=args.clear
+        )
+        print(f"\n🎉 重建完成，共写入 {processed} 条向量，耗时 {time.time() - started_at:.1f} 秒")
+
+        vector_store = service_container.vector_store
+        shared = isinstance(vector_store, SharedEmbeddingStore)
+        store = vector_store.store if shared else vector_store
+        if isinstance(store, NumpyVectorStore) and store.quantization != "none":
+            recall = store.measure_recall(reference=lambda record_ids: stored_embeddings(db, record_ids, shared))
+            if recall is not None:
+                print(f"int8量化召回率 recall@10: {recall:.4f}"
+                      f"（{'float32精确重排' if store.store_float32 else '未保存float32向量，按编码排序'}）")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
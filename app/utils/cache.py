@@ -1,10 +1,23 @@
+from abc import ABC, abstractmethod
 from functools import lru_cache
 from typing import Any, Dict, Optional, Callable, Tuple, List, Union
 from datetime import datetime, timedelta
+import calendar
 import hashlib
+import os
 import pickle
 import json
+import re
+import sqlite3
+import threading
+import time
 from collections import OrderedDict
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
 
 
 class CacheItem:
@@ -27,11 +40,296 @@ class CacheItem:
         self.access_count += 1
 
 
+class CacheTier(ABC):
+    """二级缓存接口
+
+    MemoryCache的进程内缓存（L1）未命中时从二级缓存读取（read-through），
+    写入L1时同步写入二级缓存（write-through），使多个工作进程共享缓存并在重启后保留。
+    二级缓存不可用时各方法不应抛出异常，由实现记录日志后按未命中处理。
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[Any, Optional[datetime]]]:
+        """获取缓存值
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            (缓存值, 过期时间)，不存在或已过期时返回None
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, expiry_time: Optional[datetime] = None) -> None:
+        """设置缓存值
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            expiry_time: 过期时间（UTC），None表示永不过期
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, keys: List[str]) -> int:
+        """删除缓存值
+
+        Args:
+            keys: 缓存键列表
+
+        Returns:
+            删除的数量
+        """
+        pass
+
+    @abstractmethod
+    def keys(self) -> List[str]:
+        """获取所有未过期的缓存键"""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """清空缓存"""
+        pass
+
+
+class SQLiteCacheTier(CacheTier):
+    """基于本地SQLite文件的二级缓存
+
+    同一台机器上的多个工作进程（如gunicorn -w 4）共用一个数据库文件，开启WAL模式，读写互不阻塞。
+    值按紧凑格式保存：浮点数列表（Embedding）保存为float32原始字节，读取时用np.frombuffer解码；
+    其他值保存为JSON，无法JSON序列化的值只保存在L1中。
+    条目数超过max_entries时按最近访问时间淘汰，读取命中时最多每touch_interval秒更新一次访问时间，
+    避免每次读取都写库。
+    """
+
+    # 值的编码方式
+    KIND_FLOAT32 = 1
+    KIND_JSON = 2
+
+    # 同一条目两次更新访问时间的最小间隔（秒）
+    touch_interval = 60
+
+    def __init__(self,
+                 path: str = "./data/cache.db",
+                 purge_interval: int = 1000,
+                 timeout: float = 5.0,
+                 max_entries: int = 0):
+        """初始化SQLite二级缓存
+
+        Args:
+            path: 数据库文件路径
+            purge_interval: 每写入多少次清理一次过期缓存
+            timeout: 等待其他进程释放写锁的秒数
+            max_entries: 最大条目数，0表示不限制
+        """
+        self.path = path
+        self.purge_interval = purge_interval
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._writes = 0
+        # 估计的条目数，清理时重新统计，其间按本进程的写入次数累加
+        self._count: Optional[int] = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 初始化时建表，文件无法打开时直接抛出，由调用方决定是否降级
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前进程的数据库连接
+
+        gunicorn等预加载应用后fork的工作进程不能复用父进程的连接，进程ID变化时重新连接。
+        """
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, kind INTEGER NOT NULL, value BLOB NOT NULL, expiry REAL, "
+                "accessed_at REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(cache_entries)")}
+            if "accessed_at" not in columns:
+                # 旧版本创建的缓存文件没有访问时间列，已有条目视为最早访问
+                connection.execute("ALTER TABLE cache_entries ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed_at ON cache_entries (accessed_at)")
+            connection.commit()
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    @classmethod
+    def encode(cls, value: Any) -> Optional[Tuple[int, bytes]]:
+        """编码缓存值
+
+        Args:
+            value: 缓存值
+
+        Returns:
+            (编码方式, 字节)，无法编码时返回None
+        """
+        if isinstance(value, list) and value and all(type(item) is float for item in value):
+            return cls.KIND_FLOAT32, np.asarray(value, dtype=np.float32).tobytes()
+        try:
+            return cls.KIND_JSON, json.dumps(value, ensure_ascii=False).encode("utf-8")
+        except (TypeError, ValueError):
+            return None
+
+    @classmethod
+    def decode(cls, kind: int, data: bytes) -> Any:
+        """解码缓存值
+
+        Args:
+            kind: 编码方式
+            data: 字节
+
+        Returns:
+            缓存值
+        """
+        if kind == cls.KIND_FLOAT32:
+            return np.frombuffer(data, dtype=np.float32).tolist()
+        return json.loads(data.decode("utf-8"))
+
+    def get(self, key: str) -> Optional[Tuple[Any, Optional[datetime]]]:
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._connect()
+                row = connection.execute(
+                    "SELECT kind, value, expiry, accessed_at FROM cache_entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and (row[2] is None or row[2] > now) and now - row[3] >= self.touch_interval:
+                    connection.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+                    connection.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"L2 cache read failed: {str(e)}")
+            return None
+
+        if row is None:
+            return None
+        kind, data, expiry, _ = row
+        if expiry is not None and expiry <= now:
+            return None
+        expiry_time = datetime.utcfromtimestamp(expiry) if expiry is not None else None
+        return self.decode(kind, data), expiry_time
+
+    def set(self, key: str, value: Any, expiry_time: Optional[datetime] = None) -> None:
+        encoded = self.encode(value)
+        if encoded is None:
+            return
+        kind, data = encoded
+        expiry = calendar.timegm(expiry_time.utctimetuple()) + expiry_time.microsecond / 1e6 if expiry_time else None
+
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO cache_entries (key, kind, value, expiry, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, kind, data, expiry, time.time())
+                )
+                self._writes += 1
+                if self._count is not None:
+                    self._count += 1
+                over_limit = self.max_entries and (self._count is None or self._count > self.max_entries)
+                if self._writes % self.purge_interval == 0 or over_limit:
+                    self._purge(connection)
+                connection.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"L2 cache write failed: {str(e)}")
+
+    def _purge(self, connection: sqlite3.Connection) -> None:
+        """删除过期条目，条目数超过max_entries时淘汰最久未访问的条目，调用方需持有self._lock
+
+        每次多淘汰max_entries的1/10，避免此后每次写入都触发淘汰。
+        """
+        connection.execute("DELETE FROM cache_entries WHERE expiry IS NOT NULL AND expiry <= ?", (time.time(),))
+        if not self.max_entries:
+            return
+        count = connection.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        if count > self.max_entries:
+            evicted = count - self.max_entries + self.max_entries // 10
+            connection.execute(
+                "DELETE FROM cache_entries WHERE key IN "
+                "(SELECT key FROM cache_entries ORDER BY accessed_at LIMIT ?)",
+                (evicted,)
+            )
+            count -= evicted
+            logger.info(f"L2 cache evicted {evicted} least recently accessed entries")
+        self._count = count
+
+    def delete(self, keys: List[str]) -> int:
+        if not keys:
+            return 0
+        try:
+            with self._lock:
+                connection = self._connect()
+                cursor = connection.executemany("DELETE FROM cache_entries WHERE key = ?", [(key,) for key in keys])
+                connection.commit()
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"L2 cache delete failed: {str(e)}")
+            return 0
+
+    def keys(self) -> List[str]:
+        try:
+            with self._lock:
+                rows = self._connect().execute(
+                    "SELECT key FROM cache_entries WHERE expiry IS NULL OR expiry > ?", (time.time(),)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"L2 cache read failed: {str(e)}")
+            return []
+        return [row[0] for row in rows]
+
+    def clear(self) -> None:
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute("DELETE FROM cache_entries")
+                connection.commit()
+                self._count = 0
+        except sqlite3.Error as e:
+            logger.warning(f"L2 cache clear failed: {str(e)}")
+
+
+class CacheTierFactory:
+    """二级缓存工厂类"""
+
+    @staticmethod
+    def get_cache_tier(tier_type: str = "sqlite", **kwargs) -> Optional[CacheTier]:
+        """获取二级缓存实例
+
+        Args:
+            tier_type: 二级缓存类型，none表示只使用进程内缓存
+            kwargs: 二级缓存的初始化参数
+
+        Returns:
+            二级缓存实例，tier_type为none时返回None
+        """
+        if tier_type == "none":
+            return None
+        elif tier_type == "sqlite":
+            return SQLiteCacheTier(**kwargs)
+        else:
+            raise ValueError(f"不支持的二级缓存类型: {tier_type}")
+
+
 class MemoryCache:
-    """增强的内存缓存类，支持过期时间、LRU淘汰策略和复杂数据结构"""
+    """增强的内存缓存类，支持过期时间、LRU淘汰策略和复杂数据结构
+
+    可选的二级缓存（CacheTier）在进程内缓存未命中时读取，并在写入时同步写入。
+    """
     
-    def __init__(self, max_size: int = 2000):
+    def __init__(self, max_size: int = 2000, l2: Optional[CacheTier] = None):
         self.max_size = max_size
+        self.l2 = l2
         # 使用OrderedDict实现LRU，最新访问的放在末尾
         self.cache: Dict[str, CacheItem] = {}
         self.access_order = OrderedDict()  # 用于LRU淘汰，最新访问的放在末尾
@@ -40,7 +338,8 @@ class MemoryCache:
             "misses": 0,
             "evictions": 0,
             "sets": 0,
-            "gets": 0
+            "gets": 0,
+            "l2_hits": 0
         }
     
     def _get_cache_key(self, func: Callable, *args, **kwargs) -> str:
@@ -76,6 +375,16 @@ class MemoryCache:
                 self.stats["hits"] += 1
                 return item.value
         
+        if self.l2 is not None:
+            # L1未命中时读取二级缓存，命中后按剩余有效期写回L1
+            entry = self.l2.get(key)
+            if entry is not None:
+                value, expiry_time = entry
+                self._store(key, value, expiry_time)
+                self.stats["hits"] += 1
+                self.stats["l2_hits"] += 1
+                return value
+        
         self.stats["misses"] += 1
         return default
     
@@ -90,7 +399,20 @@ class MemoryCache:
         """
         self.stats["sets"] += 1
         expiry_time = datetime.utcnow() + expiry if expiry else None
+        self._store(key, value, expiry_time, metadata)
         
+        if self.l2 is not None:
+            self.l2.set(key, value, expiry_time)
+    
+    def _store(self, key: str, value: Any, expiry_time: Optional[datetime], metadata: Optional[Dict[str, Any]] = None) -> None:
+        """写入进程内缓存
+        
+        Args:
+            key: 缓存键
+            value: 缓存值
+            expiry_time: 过期时间，None表示永不过期
+            metadata: 缓存项的元数据
+        """
         # 检查是否超过最大大小，超过则删除最久未访问的
         if key not in self.cache and len(self.cache) >= self.max_size:
             self._evict_lru()
@@ -131,10 +453,13 @@ class MemoryCache:
         Returns:
             是否成功删除
         """
+        deleted = False
         if key in self.cache:
             self._remove_key(key)
-            return True
-        return False
+            deleted = True
+        if self.l2 is not None and self.l2.delete([key]):
+            deleted = True
+        return deleted
     
     def delete_many(self, keys: List[str]) -> int:
         """删除多个缓存值
@@ -160,9 +485,11 @@ class MemoryCache:
         Returns:
             成功删除的数量
         """
-        import re
         regex = re.compile(pattern)
-        keys_to_delete = [key for key in self.cache if regex.match(key)]
+        keys = set(self.cache)
+        if self.l2 is not None:
+            keys.update(self.l2.keys())
+        keys_to_delete = [key for key in keys if regex.match(key)]
         return self.delete_many(keys_to_delete)
     
     def exists(self, key: str) -> bool:
@@ -174,19 +501,24 @@ class MemoryCache:
         Returns:
             是否存在且未过期
         """
-        return key in self.cache and not self.cache[key].is_expired()
+        if key in self.cache and not self.cache[key].is_expired():
+            return True
+        return self.l2 is not None and self.l2.get(key) is not None
     
     def clear(self) -> None:
-        """清空缓存"""
+        """清空缓存，包括二级缓存"""
         self.cache.clear()
         self.access_order.clear()
+        if self.l2 is not None:
+            self.l2.clear()
         # 重置统计
         self.stats = {
             "hits": 0,
             "misses": 0,
             "evictions": 0,
             "sets": 0,
-            "gets": 0
+            "gets": 0,
+            "l2_hits": 0
         }
     
     def cache(self, expiry: Optional[timedelta] = None, **cache_kwargs):
@@ -257,7 +589,7 @@ class MemoryCache:
         return self.stats.copy()
     
     def get_items(self, prefix: str = "") -> Dict[str, Any]:
-        """获取所有缓存项，可选前缀过滤
+        """获取进程内缓存的所有缓存项，可选前缀过滤
         
         Args:
             prefix: 缓存键前缀
@@ -313,8 +645,19 @@ class MemoryCache:
         return f"MemoryCache(size={len(self.cache)}, max_size={self.max_size}, stats={self.stats})"
 
 
+def create_cache_tier() -> Optional[CacheTier]:
+    """按配置创建全局缓存的二级缓存，创建失败时只使用进程内缓存"""
+    try:
+        return CacheTierFactory.get_cache_tier(
+            settings.cache.l2_backend, path=settings.cache.l2_path, max_entries=settings.cache.l2_max_entries
+        )
+    except Exception as e:
+        logger.warning(f"L2 cache unavailable, falling back to in-process cache only: {str(e)}")
+        return None
+
+
 # 创建全局缓存实例
-cache = MemoryCache(max_size=2000)
+cache = MemoryCache(max_size=settings.cache.max_size, l2=create_cache_tier())
 
 # 便捷的缓存装饰器
 def cached(expiry: Optional[timedelta] = None, **cache_kwargs):
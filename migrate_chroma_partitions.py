@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Chroma集合分区迁移脚本，按当前配置的 chroma.partition_strategy 将已有向量移动到对应的分区集合
+"""
+
+import argparse
+from app.core.config import settings
+from app.services.chroma import ChromaClient
+
+
+def migrate_chroma_partitions(batch_size: int):
+    """迁移Chroma向量到当前分区策略对应的集合"""
+    print(f"分区策略: {settings.chroma.partition_strategy}")
+    if settings.chroma.partition_strategy == "user_bucket":
+        print(f"分桶数: {settings.chroma.partition_buckets}")
+    
+    chroma_client = ChromaClient()
+    migrated = chroma_client.migrate_partitions(batch_size=batch_size)
+    
+    print(f"\n🎉 迁移完成，共移动 {migrated} 条向量")
+    for collection in chroma_client.partition_collections():
+        print(f"- {collection.name}: {collection.count()} 条")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chroma集合分区迁移")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批读取的向量数")
+    args = parser.parse_args()
+    migrate_chroma_partitions(args.batch_size)
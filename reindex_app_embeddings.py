@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+应用Embedding重建脚本，修改应用的 embedding_dimension 后按新的维度重建该应用所有记忆的向量
+"""
+
+import argparse
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services.memory import MemoryManager
+
+
+def reindex_app_embeddings(app_name: str, batch_size: int):
+    """按应用当前的Embedding维度重建向量"""
+    db = SessionLocal()
+    try:
+        memory_manager = MemoryManager(db)
+        dimension = memory_manager.get_embedding_dimension(app_name) or settings.embedding.dimension
+        print(f"应用: {app_name}")
+        print(f"Embedding维度: {dimension}")
+        
+        reindexed = memory_manager.reindex_app_embeddings(app_name, batch_size=batch_size)
+        print(f"\n🎉 重建完成，共写入 {reindexed} 条向量")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按应用的Embedding维度重建向量")
+    parser.add_argument("--app-name", required=True, help="应用名称")
+    parser.add_argument("--batch-size", type=int, default=100, help="每批生成Embedding的记忆数")
+    args = parser.parse_args()
+    reindex_app_embeddings(args.app_name, args.batch_size)
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import tempfile
+from typing import List, Optional
+
+# 导入app之前隔离配置：不读取工作目录的config.yaml，数据库和缓存写入临时目录
+_data_directory = tempfile.mkdtemp(prefix="beememory-tests-")
+os.environ["CONFIG_PATH"] = os.path.join(_data_directory, "config.yaml")
+os.environ.setdefault("DATABASE__URL", f"sqlite:///{_data_directory}/memory.db")
+os.environ.setdefault("CACHE__L2_BACKEND", "none")
+os.environ.setdefault("LOGGING__LEVEL", "WARNING")
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+import app.models  # noqa: F401  注册所有表
+from app.core.container import service_container
+from app.db.base import Base
+from app.services.embedding.base import EmbeddingService
+from app.services.vector_store import NumpyVectorStore
+from app.utils.cache import MemoryCache
+
+
+class FakeEmbeddingService(EmbeddingService):
+    """确定性的Embedding服务
+
+    vectors中预设的文本返回预设向量，其余文本返回由内容哈希生成的随机向量；
+    failing中的文本生成失败。使用独立的进程内缓存，记录每次批量请求的文本。
+    """
+
+    dimension = 16
+
+    def __init__(self):
+        super().__init__()
+        self.cache = MemoryCache(max_size=1000)
+        self.vectors = {}
+        self.failing = set()
+        self.requests: List[List[str]] = []
+
+    def generate_embedding(self, text: str) -> List[float]:
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        self.requests.append(list(texts))
+        return [None if text in self.failing else self.vector(text) for text in texts]
+
+    def vector(self, text: str) -> List[float]:
+        if text in self.vectors:
+            return list(self.vectors[text])
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dimension).tolist()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """独立SQLite文件上的数据库会话，每个测试重新建表"""
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def async_session_factory(db):
+    """与db相同数据库文件的异步会话工厂，不复用连接，可在多次asyncio.run中使用"""
+    engine = create_async_engine(
+        str(db.get_bind().url).replace("sqlite://", "sqlite+aiosqlite://"), poolclass=NullPool
+    )
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+@pytest.fixture
+def embedding_service():
+    return FakeEmbeddingService()
+
+
+@pytest.fixture
+def vector_store(tmp_path):
+    return NumpyVectorStore(str(tmp_path / "vectors"))
+
+
+@pytest.fixture
+def services(embedding_service, vector_store, monkeypatch):
+    """让服务容器使用假Embedding服务和NumPy向量存储，测试不应调用大模型"""
+    monkeypatch.setattr(service_container, "_embedding_service", embedding_service)
+    monkeypatch.setattr(service_container, "_vector_store", vector_store)
+    monkeypatch.setattr(service_container, "_llm_service", object())
+    return service_container
+
+
+@pytest.fixture
+def memory_manager(db, services):
+    from app.services.memory import MemoryManager
+
+    return MemoryManager(db)
@@ -0,0 +1,82 @@
+import sqlite3
+import time
+from datetime import timedelta
+
+import pytest
+
+from app.utils.cache import MemoryCache, SQLiteCacheTier
+
+
+@pytest.fixture
+def tier(tmp_path):
+    return SQLiteCacheTier(str(tmp_path / "cache.db"))
+
+
+def test_l1_miss_reads_through_to_l2(tier):
+    writer = MemoryCache(max_size=10, l2=tier)
+    writer.set("embedding:a", [0.5, -0.25], timedelta(minutes=5))
+    writer.set("llm:a", {"text": "中文", "items": [1, 2]})
+
+    # 另一个工作进程的L1为空，从共享的L2读取并写回L1
+    reader = MemoryCache(max_size=10, l2=tier)
+    assert reader.get("embedding:a") == [0.5, -0.25]
+    assert reader.get("llm:a") == {"text": "中文", "items": [1, 2]}
+    assert reader.get_stats()["l2_hits"] == 2
+
+    assert reader.get("embedding:a") == [0.5, -0.25]
+    assert reader.get_stats()["l2_hits"] == 2
+    assert "embedding:a" in reader.cache
+
+
+def test_expired_and_deleted_entries_miss(tier):
+    writer = MemoryCache(max_size=10, l2=tier)
+    writer.set("expired", [1.0], timedelta(seconds=-1))
+    writer.set("llm:deleted", "value")
+    writer.set("llm:kept", "value")
+
+    assert writer.delete_pattern("^llm:del") == 1
+    reader = MemoryCache(max_size=10, l2=tier)
+    assert reader.get("expired") is None
+    assert reader.get("llm:deleted") is None
+    assert reader.get("llm:kept") == "value"
+
+
+def test_unencodable_values_stay_in_l1(tier):
+    cache = MemoryCache(max_size=10, l2=tier)
+    value = object()
+    cache.set("object", value)
+
+    assert cache.get("object") is value
+    assert tier.get("object") is None
+
+
+def test_l2_evicts_least_recently_accessed_entries(tmp_path):
+    tier = SQLiteCacheTier(str(tmp_path / "cache.db"), max_entries=10)
+    tier.touch_interval = 0
+    for index in range(10):
+        tier.set(f"key{index}", [float(index)])
+        time.sleep(0.002)
+    tier.get("key0")
+
+    for index in range(10, 13):
+        tier.set(f"key{index}", [float(index)])
+
+    keys = set(tier.keys())
+    assert len(keys) <= 10
+    assert "key0" in keys
+    assert {"key1", "key2"}.isdisjoint(keys)
+    assert {"key10", "key11", "key12"} <= keys
+
+
+def test_l2_upgrades_tables_without_access_time(tmp_path):
+    path = str(tmp_path / "cache.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE cache_entries (key TEXT PRIMARY KEY, kind INTEGER NOT NULL, value BLOB NOT NULL, expiry REAL)")
+    connection.execute("INSERT INTO cache_entries VALUES ('old', ?, ?, NULL)", (SQLiteCacheTier.KIND_JSON, b'"value"'))
+    connection.commit()
+    connection.close()
+
+    tier = SQLiteCacheTier(path, max_entries=1)
+    assert tier.get("old") == ("value", None)
+    tier.set("new", "value")
+    assert tier.keys() == ["new"]
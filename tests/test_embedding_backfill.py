@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.models import AppConfig, UserMemory
+from app.services.memory.backfill import MemoryEmbeddingBackfill
+
+
+@pytest.fixture
+def backfill(db, services):
+    return MemoryEmbeddingBackfill(db, batch_size=10, retry_base_seconds=10, retry_max_seconds=1000)
+
+
+def add_pending(db, content: str, attempts: int = 0, retry_at=None) -> UserMemory:
+    memory = UserMemory(
+        user_id="user",
+        app_name="app",
+        memory_content=content,
+        embedding_pending=True,
+        embedding_attempts=attempts,
+        embedding_retry_at=retry_at
+    )
+    db.add(memory)
+    db.commit()
+    return memory
+
+
+def test_whole_batch_failure_keeps_attempts(db, backfill, embedding_service, vector_store):
+    memories = [add_pending(db, "content a", attempts=1), add_pending(db, "content b")]
+    embedding_service.failing = {"content a", "content b"}
+
+    assert backfill.run() == 0
+
+    db.expire_all()
+    assert [(memory.embedding_attempts, memory.embedding_retry_at) for memory in memories] == [(1, None), (0, None)]
+    assert all(memory.embedding_pending for memory in memories)
+    assert vector_store.get_embeddings([memory.id for memory in memories]) == {}
+
+
+def test_partial_failure_backs_off_exponentially(db, backfill, embedding_service):
+    first_failure = add_pending(db, "content a")
+    third_failure = add_pending(db, "content b", attempts=2)
+    filled = add_pending(db, "content c")
+    embedding_service.failing = {"content a", "content b"}
+
+    started_at = datetime.utcnow()
+    assert backfill.run() == 1
+    finished_at = datetime.utcnow()
+
+    db.expire_all()
+    assert (first_failure.embedding_attempts, third_failure.embedding_attempts) == (1, 3)
+    for memory, delay in [(first_failure, timedelta(seconds=10)), (third_failure, timedelta(seconds=40))]:
+        assert memory.embedding_pending
+        assert started_at + delay <= memory.embedding_retry_at <= finished_at + delay
+    assert not filled.embedding_pending
+
+    # 未到重试时间的记忆不会被再次请求
+    embedding_service.requests.clear()
+    assert backfill.run() == 0
+    assert embedding_service.requests == []
+    assert backfill.retry_delay(20) == timedelta(seconds=1000)
+
+
+def test_success_clears_pending_state_and_upserts_vector(db, backfill, embedding_service, vector_store):
+    db.add(AppConfig(app_name="app", embedding_dimension=8))
+    db.commit()
+    memory = add_pending(db, "merged content", attempts=2, retry_at=datetime.utcnow() - timedelta(seconds=1))
+    # 合并时生成失败的记忆在向量存储中仍是旧向量
+    vector_store.add_embeddings([[1.0] + [0.0] * 7], ["old content"], [memory.id], ["user"], ["app"])
+
+    assert backfill.run() == 1
+
+    db.expire_all()
+    assert (memory.embedding_pending, memory.embedding_attempts, memory.embedding_retry_at) == (False, 0, None)
+    expected = np.asarray(embedding_service.reduce_embedding(embedding_service.vector("merged content"), 8))
+    stored = embedding_service.unpack_embedding(memory.embedding, memory.embedding_dtype)
+    assert np.allclose(stored, expected, atol=1e-3)
+    assert np.allclose(vector_store.get_embeddings([memory.id])[memory.id], expected / np.linalg.norm(expected), atol=1e-5)
+    assert MemoryEmbeddingBackfill.get_backlog(db)["pending"] == 0
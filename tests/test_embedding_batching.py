@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import pytest
+
+from app.services.embedding import EmbeddingError
+from app.services.embedding import batching as batching_module
+from app.services.embedding.base import EmbeddingService
+from app.services.embedding.batching import BatchingEmbeddingService
+
+
+class RecordingEmbeddingService(EmbeddingService):
+    """记录每次批量请求的文本，内容为fail的文本生成失败"""
+
+    def __init__(self):
+        super().__init__()
+        self.requests: List[List[str]] = []
+        self._lock = threading.Lock()
+
+    def generate_embedding(self, text: str) -> List[float]:
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        with self._lock:
+            self.requests.append(list(texts))
+        return [None if text == "fail" else [float(len(text)), 1.0] for text in texts]
+
+
+class FakeClock:
+    """只在测试推进时前进的时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def service():
+    return RecordingEmbeddingService()
+
+
+def test_concurrent_sync_calls_share_one_request(service, monkeypatch):
+    # 冻结队列使用的时钟，所有请求入队前不会因等待超时提前发送
+    clock = FakeClock()
+    monkeypatch.setattr(batching_module, "time", clock)
+    batching = BatchingEmbeddingService(service, max_wait_ms=50, max_batch_size=100)
+    texts = [f"text {'x' * index}" for index in range(8)]
+
+    with ThreadPoolExecutor(len(texts)) as executor:
+        futures = [executor.submit(batching.generate_embedding, text) for text in texts]
+        deadline = time.monotonic() + 5
+        while batching.get_stats()["requests"] < len(texts) and time.monotonic() < deadline:
+            time.sleep(0.001)
+        assert service.requests == []
+        with batching._condition:
+            clock.now += 1
+            batching._condition.notify_all()
+        results = [future.result(timeout=5) for future in futures]
+
+    assert results == [[float(len(text)), 1.0] for text in texts]
+    assert len(service.requests) == 1
+    assert sorted(service.requests[0]) == sorted(texts)
+    assert batching.get_stats() == {"requests": 8, "batches": 1}
+
+
+def test_full_batch_is_sent_without_waiting(service):
+    batching = BatchingEmbeddingService(service, max_wait_ms=10000, max_batch_size=4)
+    barrier = threading.Barrier(4)
+
+    def embed(text):
+        barrier.wait()
+        return batching.generate_embedding(text)
+
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(embed, ["a", "bb", "ccc", "dddd"]))
+
+    assert time.monotonic() - started_at < 5
+    assert [len(request) for request in service.requests] == [4]
+
+
+def test_duplicate_texts_are_requested_once(service):
+    batching = BatchingEmbeddingService(service, max_wait_ms=1, max_batch_size=100)
+
+    assert batching.generate_embeddings(["same", "other", "same"]) == [[4.0, 1.0], [5.0, 1.0], [4.0, 1.0]]
+    assert service.requests == [["same", "other"]]
+
+
+def test_failed_texts_do_not_fail_the_batch(service):
+    batching = BatchingEmbeddingService(service, max_wait_ms=1, max_batch_size=100)
+
+    assert batching.generate_embeddings(["ok", "fail"]) == [[2.0, 1.0], None]
+    with pytest.raises(EmbeddingError):
+        batching.generate_embedding("fail")
+
+
+def test_large_requests_bypass_the_queue(service):
+    batching = BatchingEmbeddingService(service, max_wait_ms=10000, max_batch_size=2)
+
+    batching.generate_embeddings(["a", "b", "c"])
+
+    assert service.requests == [["a", "b", "c"]]
+    assert batching.get_stats()["batches"] == 0
+
+
+def test_concurrent_async_calls_share_one_request(service):
+    batching = BatchingEmbeddingService(service, max_wait_ms=20, max_batch_size=100)
+
+    async def run():
+        return await asyncio.gather(
+            *(batching.generate_embedding_async(text) for text in ["a", "bb", "a"]),
+            batching.generate_embeddings_async(["ccc", "fail"])
+        )
+
+    first, second, third, many = asyncio.run(run())
+
+    assert (first, second, third) == ([1.0, 1.0], [2.0, 1.0], [1.0, 1.0])
+    assert many == [[3.0, 1.0], None]
+    assert len(service.requests) == 1
+    assert sorted(service.requests[0]) == ["a", "bb", "ccc", "fail"]
+
+
+def test_async_queue_flushes_when_full(service):
+    batching = BatchingEmbeddingService(service, max_wait_ms=10000, max_batch_size=2)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batching.generate_embedding_async(text) for text in ["a", "b", "c", "d"])), timeout=5
+        )
+
+    assert asyncio.run(run()) == [[1.0, 1.0]] * 4
+    assert [len(request) for request in service.requests] == [2, 2]
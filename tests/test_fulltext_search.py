@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+from app.core.container import service_container
+from app.models import UserMemory
+from app.services.memory import async_manager
+from app.services.memory.async_manager import AsyncMemoryManager
+from app.services.memory.search import MemoryFullTextIndex
+
+
+@pytest.fixture
+def index(db):
+    index = MemoryFullTextIndex()
+    assert index.setup(db.get_bind())
+    return index
+
+
+def add_memory(db, content: str, user_id: str = "user") -> UserMemory:
+    memory = UserMemory(user_id=user_id, app_name="app", memory_content=content)
+    db.add(memory)
+    db.commit()
+    return memory
+
+
+def search(db, index: MemoryFullTextIndex, query: str) -> list:
+    return [row.id for row in db.execute(index.search_statement("user", "app", query, 10)).all()]
+
+
+def test_triggers_keep_index_in_sync(db, index):
+    tea = add_memory(db, "用户喜欢喝乌龙茶")
+    add_memory(db, "用户喜欢喝乌龙茶", user_id="other")
+    assert search(db, index, "乌龙茶") == [tea.id]
+
+    tea.memory_content = "用户最近改喝红茶了"
+    db.commit()
+    assert search(db, index, "乌龙茶") == []
+    assert search(db, index, "改喝红茶") == [tea.id]
+
+    db.delete(tea)
+    db.commit()
+    assert search(db, index, "改喝红茶") == []
+
+
+def test_existing_memories_are_indexed_on_setup(db):
+    memory = add_memory(db, "created before the index")
+
+    index = MemoryFullTextIndex()
+    assert index.setup(db.get_bind())
+    assert index.setup(db.get_bind())
+    assert search(db, index, "before") == [memory.id]
+
+
+def test_short_terms_are_matched_by_substring(db, index):
+    coffee = add_memory(db, "我每天早上喝咖啡")
+    add_memory(db, "我每天早上喝茶")
+
+    assert index.build_match_query("咖啡") is None
+    assert index.split_terms("AI 咖啡 model model") == (["model"], ["ai", "咖啡"])
+    rows = db.execute(index.short_term_statement("user", "app", "咖啡")).all()
+    assert [row.id for row in rows] == [coffee.id]
+    # LIKE通配符按字面匹配
+    assert db.execute(index.short_term_statement("user", "app", "%")).all() == []
+
+
+@pytest.fixture
+def keyword_query(async_session_factory, monkeypatch):
+    """返回在测试数据库上执行异步关键词查询的函数，不构建真实的Embedding服务和向量存储"""
+    monkeypatch.setattr(service_container, "_embedding_service", object())
+    monkeypatch.setattr(service_container, "_vector_store", object())
+
+    def query(query: str, top_k: int = 10) -> list:
+        async def run():
+            async with async_session_factory() as session:
+                results = await AsyncMemoryManager(session).query_memories_by_keyword("user", "app", query, top_k)
+            return [result["memory_id"] for result in results]
+        return asyncio.run(run())
+
+    return query
+
+
+def test_keyword_query_merges_short_terms_with_fulltext_results(db, index, keyword_query, monkeypatch):
+    monkeypatch.setattr(async_manager, "memory_fulltext_index", index)
+    coffee = add_memory(db, "我每天早上喝咖啡")
+    tea = add_memory(db, "我每天晚上喝乌龙茶")
+    add_memory(db, "周末去爬山")
+
+    assert keyword_query("咖啡") == [coffee.id]
+    assert set(keyword_query("咖啡 乌龙茶")) == {coffee.id, tea.id}
+    assert len(keyword_query("咖啡 乌龙茶", top_k=1)) == 1
+
+
+def test_keyword_query_scans_when_index_is_unavailable(db, keyword_query, monkeypatch):
+    monkeypatch.setattr(async_manager, "memory_fulltext_index", MemoryFullTextIndex())
+    coffee = add_memory(db, "我每天早上喝咖啡")
+    add_memory(db, "周末去爬山")
+
+    assert keyword_query("咖啡", top_k=1) == [coffee.id]
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.container import service_container
+from app.models import AppConfig, UserMemory
+from app.services.memory import async_manager
+from app.services.memory.async_manager import AsyncMemoryManager
+from app.services.memory.search import MemoryFullTextIndex
+
+
+class FakeEmbeddingService:
+    async def get_cached_embeddings_async(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+    @staticmethod
+    def reduce_embedding(embedding, dimension=None):
+        return embedding
+
+
+class FakeVectorStore:
+    """返回预设的向量检索结果（similarity为距离），记录收到的召回数和过滤条件"""
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def query_embeddings_batch(self, query_embeddings, user_ids, app_names, top_ks, filters=None):
+        self.calls.append({"top_ks": top_ks, "filters": filters})
+        return [list(self.results) for _ in query_embeddings]
+
+
+def add_memory(db, content: str, is_archived: bool = False) -> int:
+    memory = UserMemory(user_id="user", app_name="app", memory_content=content, is_archived=is_archived)
+    db.add(memory)
+    db.commit()
+    return memory.id
+
+
+@pytest.fixture
+def memories(db):
+    db.add(AppConfig(app_name="app", enable_hybrid_search=True))
+    db.commit()
+    return {
+        "vector_first": add_memory(db, "vector only alpha"),
+        "both": add_memory(db, "咖啡 and vector"),
+        "vector_last": add_memory(db, "vector only gamma"),
+        "keyword_only": add_memory(db, "我喜欢咖啡"),
+        "archived": add_memory(db, "咖啡 archived", is_archived=True)
+    }
+
+
+def test_fuse_ranked_results_orders_by_reciprocal_rank():
+    fused = AsyncMemoryManager.fuse_ranked_results(
+        [{"memory_id": 1, "similarity": 0.1}, {"memory_id": 2, "similarity": 0.2}, {"memory_id": 3, "similarity": 0.3}],
+        [{"memory_id": 2, "similarity": 0.8}, {"memory_id": 4, "similarity": 0.5}, {"memory_id": 5, "similarity": 0.0}],
+        top_k=10
+    )
+
+    # 两路都命中的排第一，完全不匹配关键词的结果不参与融合
+    assert [result["memory_id"] for result in fused] == [2, 1, 4, 3]
+    assert fused[0]["similarity"] == pytest.approx(0.2)
+    assert fused[2]["similarity"] == pytest.approx(0.5)
+
+
+def test_hybrid_query_fuses_vector_and_keyword_hits(db, memories, async_session_factory, monkeypatch):
+    vector_store = FakeVectorStore([
+        {"memory_id": memories["vector_first"], "similarity": 0.1},
+        {"memory_id": memories["both"], "similarity": 0.2},
+        {"memory_id": memories["vector_last"], "similarity": 0.3}
+    ])
+    monkeypatch.setattr(service_container, "_embedding_service", FakeEmbeddingService())
+    monkeypatch.setattr(service_container, "_vector_store", vector_store)
+    index = MemoryFullTextIndex()
+    assert index.setup(db.get_bind())
+    monkeypatch.setattr(async_manager, "memory_fulltext_index", index)
+    filters = {"is_archived": False}
+
+    async def run():
+        async with async_session_factory() as session:
+            return await AsyncMemoryManager(session).query_memories_batch(
+                [("user", "app", "咖啡", 3), ("user", "app", "咖啡", 10)], [filters, filters]
+            )
+
+    truncated, complete = asyncio.run(run())
+
+    assert [result["memory_id"] for result in truncated] == [
+        memories["both"], memories["vector_first"], memories["keyword_only"]
+    ]
+    # 过滤条件同时下推到关键词检索，已归档的记忆不会被关键词召回
+    assert {result["memory_id"] for result in complete} == set(memories.values()) - {memories["archived"]}
+    factor = settings.memory.hybrid_candidate_factor
+    assert vector_store.calls == [{"top_ks": [3 * factor, 10 * factor], "filters": [filters, filters]}]
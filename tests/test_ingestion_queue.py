@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.models import IngestionJob
+from app.schemas.memory import ChatHistoryCreate
+from app.services.ingestion import IngestionQueue, ClaimExpiredError
+
+
+def make_history(index: int) -> ChatHistoryCreate:
+    return ChatHistoryCreate(
+        user_id="user",
+        app_name="app",
+        messages=[{"role": "user", "content": f"message {index}"}]
+    )
+
+
+@pytest.fixture
+def queue(db):
+    queue = IngestionQueue(db)
+    queue.config = queue.config.model_copy(update={"max_attempts": 2, "stale_timeout_seconds": 600})
+    return queue
+
+
+def expire_claims(db) -> None:
+    """把处理中任务的领取时间推到超时之前，模拟工作进程失联"""
+    db.execute(update(IngestionJob).values(claimed_at=datetime.utcnow() - timedelta(hours=1)))
+    db.commit()
+
+
+def test_claim_batch_claims_each_job_once(queue):
+    queue.enqueue_many([make_history(index) for index in range(5)])
+
+    first = queue.claim_batch(3)
+    second = queue.claim_batch(3)
+
+    assert [job.id for job in first] == [1, 2, 3]
+    assert [job.id for job in second] == [4, 5]
+    assert len({job.claim_token for job in first}) == 1
+    assert first[0].claim_token != second[0].claim_token
+    assert queue.claim_batch(3) == []
+
+
+def test_mark_completed_rejects_expired_claim(db, queue):
+    queue.enqueue(make_history(0))
+    stale = queue.claim_batch(1)[0]
+    stale_token = stale.claim_token
+
+    expire_claims(db)
+    assert queue.requeue_stale() == 1
+    fresh = queue.claim_batch(1)[0]
+    assert fresh.claim_token != stale_token
+
+    # 失联的工作线程晚些完成时不能再把任务标记为完成
+    with pytest.raises(ClaimExpiredError):
+        queue.mark_completed([stale.id], [42], stale_token)
+    db.rollback()
+
+    queue.mark_completed([fresh.id], [7], fresh.claim_token)
+    db.commit()
+    job = queue.get_job(fresh.job_id)
+    db.refresh(job)
+    assert (job.status, job.memory_id, job.attempts) == ("completed", 7, 2)
+
+
+def test_mark_failed_ignores_jobs_reclaimed_by_another_worker(db, queue):
+    queue.enqueue(make_history(0))
+    stale_token = queue.claim_batch(1)[0].claim_token
+    expire_claims(db)
+    queue.requeue_stale()
+    fresh = queue.claim_batch(1)[0]
+
+    assert queue.mark_failed([fresh.id], "late failure", stale_token) == 0
+    db.refresh(fresh)
+    assert fresh.status == "processing"
+
+
+def test_heartbeat_keeps_running_batch_from_being_requeued(db, queue):
+    queue.enqueue(make_history(0))
+    job = queue.claim_batch(1)[0]
+    expire_claims(db)
+
+    assert queue.heartbeat(job.claim_token) == 1
+    assert queue.requeue_stale() == 0
+    db.refresh(job)
+    assert job.status == "processing"
+
+
+def test_requeue_stale_fails_jobs_out_of_attempts(db, queue):
+    queue.enqueue(make_history(0))
+    for _ in range(2):
+        job = queue.claim_batch(1)[0]
+        expire_claims(db)
+        queue.requeue_stale()
+
+    db.refresh(job)
+    assert (job.status, job.attempts, job.claim_token) == ("failed", 2, None)
+    assert queue.claim_batch(1) == []
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import sessionmaker
+
+from app.core import ingestion_worker
+from app.core.ingestion_worker import IngestionWorkerPool
+from app.models import IngestionJob
+from app.schemas.memory import ChatHistoryCreate
+from app.services.ingestion import IngestionQueue, ClaimExpiredError
+
+
+def make_history(index: int) -> ChatHistoryCreate:
+    return ChatHistoryCreate(
+        user_id="user",
+        app_name="app",
+        messages=[{"role": "user", "content": f"message {index}"}]
+    )
+
+
+class FakeMemoryManager:
+    """按调用记录批次大小，error不为空时抛出该异常，否则为每个任务生成一条记忆"""
+
+    calls = []
+    error = None
+
+    def __init__(self, db):
+        self.db = db
+
+    def create_memories_bulk(self, chat_histories, session_ids=None, before_commit=None):
+        FakeMemoryManager.calls.append(list(session_ids))
+        if FakeMemoryManager.error is not None:
+            raise FakeMemoryManager.error
+        memories = [SimpleNamespace(id=index + 1) for index in range(len(chat_histories))]
+        before_commit(memories)
+        self.db.commit()
+        return memories
+
+
+@pytest.fixture
+def pool(db, monkeypatch):
+    FakeMemoryManager.calls = []
+    FakeMemoryManager.error = None
+    monkeypatch.setattr(ingestion_worker, "MemoryManager", FakeMemoryManager)
+    monkeypatch.setattr(ingestion_worker, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind()))
+    return IngestionWorkerPool()
+
+
+def test_expired_claim_abandons_batch_without_individual_retries(db, pool):
+    queue = IngestionQueue(db)
+    queue.enqueue_many([make_history(index) for index in range(3)])
+    jobs = queue.claim_batch(3)
+    FakeMemoryManager.error = ClaimExpiredError("expired")
+
+    pool.process_jobs(db, jobs, jobs[0].claim_token)
+
+    assert len(FakeMemoryManager.calls) == 1
+    statuses = [job.status for job in db.query(IngestionJob).order_by(IngestionJob.id)]
+    assert statuses == ["processing"] * 3
+
+
+def test_failed_batch_retries_jobs_individually(db, pool):
+    queue = IngestionQueue(db)
+    queue.enqueue_many([make_history(index) for index in range(2)])
+    jobs = queue.claim_batch(2)
+    FakeMemoryManager.error = ValueError("broken")
+
+    pool.process_jobs(db, jobs, jobs[0].claim_token)
+
+    assert [len(call) for call in FakeMemoryManager.calls] == [2, 1, 1]
+    # 未达到最大尝试次数的任务重新入队
+    assert {(job.status, job.error) for job in db.query(IngestionJob)} == {("pending", "broken")}
+
+
+def test_run_once_requeues_stale_jobs_while_backlog_remains(db, pool):
+    queue = IngestionQueue(db)
+    stale = queue.enqueue(make_history(0))
+    queue.claim_batch(1)
+    db.execute(update(IngestionJob).values(claimed_at=datetime.utcnow() - timedelta(hours=1)))
+    db.commit()
+    queue.enqueue(make_history(1))
+
+    # 队列中仍有待处理任务时，失联的任务也要在本次领取前重新入队
+    assert pool.run_once() == 2
+    assert stale.job_id in FakeMemoryManager.calls[0]
+    db.expire_all()
+    assert {job.status for job in db.query(IngestionJob)} == {"completed"}
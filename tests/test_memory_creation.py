@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from app.models import UserMemory
+
+
+def unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=float)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def base_vector(embedding_service):
+    return unit(np.random.default_rng(0).standard_normal(embedding_service.dimension))
+
+
+def near(base_vector, seed: int, scale: float = 0.05) -> list:
+    """与base_vector的余弦相似度约为0.99的向量"""
+    noise = np.random.default_rng(seed).standard_normal(len(base_vector)) * scale / np.sqrt(len(base_vector))
+    return unit(base_vector + noise).tolist()
+
+
+def item(content: str) -> tuple:
+    return ("user", "app", content, {})
+
+
+def test_similar_contents_in_one_batch_create_one_memory(db, memory_manager, embedding_service, vector_store, base_vector):
+    embedding_service.vectors = {
+        "用户喜欢在周末和朋友去爬山": near(base_vector, 1),
+        "用户周末经常和朋友去爬山": near(base_vector, 2)
+    }
+
+    memories = memory_manager.create_memories_from_contents([
+        item("用户喜欢在周末和朋友去爬山"), item("用户最近在上线上的日语课程"), item("用户周末经常和朋友去爬山")
+    ])
+
+    assert memories[0] is memories[2]
+    assert memories[0] is not memories[1]
+    assert memories[0].reinforcement_count == 2
+    assert "用户喜欢在周末和朋友去爬山" in memories[0].memory_content and "用户周末经常和朋友去爬山" in memories[0].memory_content
+    assert db.query(UserMemory).count() == 2
+    stored = vector_store.get_embeddings([memories[0].id, memories[1].id])
+    assert sorted(stored) == sorted([memories[0].id, memories[1].id])
+    assert np.dot(stored[memories[0].id], base_vector) > 0.99
+
+
+def test_similar_content_merges_into_existing_memory(db, memory_manager, embedding_service, vector_store, base_vector):
+    embedding_service.vectors = {
+        "用户平时喜欢喝台湾乌龙茶": near(base_vector, 1),
+        "用户每天下午都喝台湾乌龙茶": near(base_vector, 2)
+    }
+    existing = memory_manager.create_memories_from_contents([item("用户平时喜欢喝台湾乌龙茶")])[0]
+
+    merged = memory_manager.create_memories_from_contents([item("用户每天下午都喝台湾乌龙茶")])[0]
+
+    assert merged.id == existing.id
+    assert merged.reinforcement_count == 2
+    assert merged.memory_content.startswith("用户平时喜欢喝台湾乌龙茶") and merged.memory_content.endswith("用户每天下午都喝台湾乌龙茶")
+    assert db.query(UserMemory).count() == 1
+    # 向量存储和embedding列都更新为两条内容Embedding的质心
+    centroid = unit(np.add(embedding_service.vectors["用户平时喜欢喝台湾乌龙茶"], embedding_service.vectors["用户每天下午都喝台湾乌龙茶"]))
+    assert np.allclose(vector_store.get_embeddings([merged.id])[merged.id], centroid, atol=1e-3)
+    assert np.allclose(embedding_service.unpack_embedding(merged.embedding, merged.embedding_dtype), centroid, atol=1e-3)
+
+
+def test_vector_store_failure_after_commit_marks_memories_pending(db, memory_manager, vector_store):
+    def fail(*args, **kwargs):
+        raise RuntimeError("vector store unavailable")
+    vector_store.add_embeddings = fail
+
+    memories = memory_manager.create_memories_from_contents([item("用户最近在上线上的日语课程"), item("用户喜欢在周末和朋友去爬山")])
+
+    db.expire_all()
+    rows = db.query(UserMemory).order_by(UserMemory.id).all()
+    assert [row.id for row in rows] == [memory.id for memory in memories]
+    assert all(row.embedding_pending and row.embedding_retry_at is None for row in rows)
+    # 记忆已提交，embedding列保留已生成的向量，补写任务无需重新请求
+    assert all(row.embedding is not None for row in rows)
+
+
+def test_failed_embedding_creates_pending_memory(db, memory_manager, embedding_service, vector_store):
+    embedding_service.failing = {"用户最近在上线上的日语课程"}
+
+    memory = memory_manager.create_memories_from_contents([item("用户最近在上线上的日语课程")])[0]
+
+    assert memory.embedding_pending and memory.embedding is None
+    assert vector_store.get_embeddings([memory.id]) == {}
@@ -0,0 +1,129 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.services.vector_store import NumpyVectorStore
+
+
+def random_vectors(count: int, dimension: int = 16, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+
+
+def add(store: NumpyVectorStore, vectors: np.ndarray, first_id: int = 1, user_id: str = "user", app_name: str = "app",
+        metadatas=None) -> list:
+    memory_ids = list(range(first_id, first_id + len(vectors)))
+    store.add_embeddings(
+        embeddings=vectors.tolist(),
+        documents=[f"memory {memory_id}" for memory_id in memory_ids],
+        memory_ids=memory_ids,
+        user_ids=[user_id] * len(vectors),
+        app_names=[app_name] * len(vectors),
+        metadatas=metadatas
+    )
+    return memory_ids
+
+
+@pytest.fixture(params=["none", "int8"])
+def store(request, tmp_path):
+    return NumpyVectorStore(str(tmp_path), quantization=request.param)
+
+
+def test_add_query_and_get_round_trip(store):
+    vectors = random_vectors(50)
+    add(store, vectors)
+
+    results = store.query_embeddings(vectors[7].tolist(), "user", "app", top_k=3)
+    assert results[0]["memory_id"] == 8
+    assert results[0]["similarity"] == pytest.approx(0, abs=1e-3)
+    assert len(results) == 3
+
+    stored = store.get_embeddings([8, 999])
+    assert list(stored) == [8]
+    expected = vectors[7] / np.linalg.norm(vectors[7])
+    assert np.allclose(stored[8], expected, atol=1e-5)
+
+
+def test_queries_are_scoped_to_user_and_app(store):
+    vectors = random_vectors(4)
+    add(store, vectors[:2], first_id=1, user_id="alice")
+    add(store, vectors[2:], first_id=3, user_id="bob")
+
+    results = store.query_embeddings(vectors[2].tolist(), "alice", "app", top_k=5)
+    assert {result["memory_id"] for result in results} == {1, 2}
+    assert store.query_embeddings(vectors[0].tolist(), "carol", "app") == []
+
+
+def test_upsert_replaces_vector(store):
+    vectors = random_vectors(3)
+    add(store, vectors)
+    add(store, vectors[2:3], first_id=1)
+
+    results = store.query_embeddings(vectors[2].tolist(), "user", "app", top_k=3)
+    assert {result["memory_id"] for result in results[:2]} == {1, 3}
+    assert np.allclose(store.get_embeddings([1])[1], store.get_embeddings([3])[3], atol=1e-5)
+
+
+def test_delete_removes_vectors_and_compacts(store):
+    vectors = random_vectors(10)
+    add(store, vectors)
+
+    store.delete_embedding(3)
+    assert 3 not in store.get_embeddings([3])
+    assert all(result["memory_id"] != 3 for result in store.query_embeddings(vectors[2].tolist(), "user", "app", top_k=10))
+
+    for memory_id in range(1, 11):
+        store.delete_embedding(memory_id)
+    assert store.query_embeddings(vectors[0].tolist(), "user", "app") == []
+
+    store.delete_embeddings_by_filter(user_id="user")
+    assert store.get_embeddings(list(range(1, 11))) == {}
+
+
+def test_metadata_filters(store):
+    vectors = random_vectors(6)
+    add(store, vectors, metadatas=[
+        {"memory_priority": priority, f"{NumpyVectorStore.tag_prefix}work": index % 2 == 0}
+        for index, priority in enumerate([1, 2, 3, 4, 5, 5])
+    ])
+
+    results = store.query_embeddings(vectors[0].tolist(), "user", "app", top_k=10, filters={"min_priority": 4})
+    assert {result["memory_id"] for result in results} == {4, 5, 6}
+    results = store.query_embeddings(vectors[0].tolist(), "user", "app", top_k=10, filters={"tags": ["work"]})
+    assert {result["memory_id"] for result in results} == {1, 3, 5}
+
+
+def test_data_survives_reload_and_is_seen_by_other_instances(tmp_path):
+    vectors = random_vectors(20)
+    writer = NumpyVectorStore(str(tmp_path))
+    reader = NumpyVectorStore(str(tmp_path))
+    add(writer, vectors)
+
+    # 另一个实例（另一个工作进程）通过变更日志看到新的写入
+    assert reader.query_embeddings(vectors[4].tolist(), "user", "app", top_k=1)[0]["memory_id"] == 5
+    writer.delete_embedding(5)
+    assert reader.query_embeddings(vectors[4].tolist(), "user", "app", top_k=1)[0]["memory_id"] != 5
+
+    reopened = NumpyVectorStore(str(tmp_path))
+    assert sorted(reopened.get_embeddings(list(range(1, 21)))) == [memory_id for memory_id in range(1, 21) if memory_id != 5]
+
+
+def test_int8_without_float32_keeps_codes_only(tmp_path):
+    vectors = random_vectors(200, dimension=32)
+    with_float32 = NumpyVectorStore(str(tmp_path), quantization="int8", store_float32=True)
+    add(with_float32, vectors)
+    assert with_float32.measure_recall(top_k=5) == pytest.approx(1.0)
+
+    codes_only = NumpyVectorStore(str(tmp_path), quantization="int8", store_float32=False)
+    shard_directories = [entry.path for entry in os.scandir(tmp_path) if entry.is_dir()]
+    assert not any(os.path.exists(os.path.join(path, NumpyVectorStore.vectors_file)) for path in shard_directories)
+
+    assert codes_only.query_embeddings(vectors[10].tolist(), "user", "app", top_k=1)[0]["memory_id"] == 11
+    expected = vectors[10] / np.linalg.norm(vectors[10])
+    assert np.dot(codes_only.get_embeddings([11])[11], expected) > 0.999
+
+    recall = codes_only.measure_recall(top_k=5, reference=lambda memory_ids: {
+        memory_id: vectors[memory_id - 1].tolist() for memory_id in memory_ids
+    })
+    assert recall > 0.9
+    assert codes_only.measure_recall(top_k=5) is None
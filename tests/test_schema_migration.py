@@ -0,0 +1,44 @@
+from sqlalchemy import MetaData, Table, create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+from app.db.migrate import add_missing_columns
+from app.models import AppConfig, UserMemory
+
+# 升级前的user_memories和app_configs没有的列
+NEW_COLUMNS = {
+    "reinforcement_count", "embedding", "embedding_dtype", "embedding_pending", "embedding_attempts",
+    "embedding_retry_at", "enable_combined_extraction", "enable_hybrid_search", "embedding_dimension"
+}
+
+
+def test_add_missing_columns_upgrades_existing_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/old.db")
+    old_metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        if table.name in ("user_memories", "app_configs"):
+            Table(table.name, old_metadata, *[column._copy() for column in table.columns if column.name not in NEW_COLUMNS])
+    old_metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO user_memories (user_id, app_name, memory_content, memory_priority, is_active, is_archived) "
+            "VALUES ('user', 'app', 'old memory', 3, 1, 0)"
+        ))
+        connection.execute(text(
+            "INSERT INTO app_configs (app_name, extraction_template, conversation_rounds, max_summary_length, "
+            "enable_auto_summarize, enable_element_extraction, similarity_threshold, merge_strategy, merge_threshold, "
+            "merge_window_minutes, expiry_strategy, expiry_days, memory_limit, enable_semantic_scoring, "
+            "access_score_weight, priority_score_weight, recency_score_weight) "
+            "VALUES ('app', 't', 3, 500, 1, 1, 0.8, 'similarity', 0.8, 60, 'never', 30, 1000, 0, 0.5, 0.3, 0.2)"
+        ))
+
+    added = add_missing_columns(engine)
+
+    assert {name.split(".")[1] for name in added} == NEW_COLUMNS
+    assert add_missing_columns(engine) == []
+    assert "ix_user_memories_embedding_pending" in {index["name"] for index in inspect(engine).get_indexes("user_memories")}
+    with Session(engine) as db:
+        memory = db.query(UserMemory).filter(UserMemory.embedding_pending == False).one()
+        assert (memory.reinforcement_count, memory.embedding_attempts, memory.embedding) == (1, 0, None)
+        app_config = db.query(AppConfig).one()
+        assert (app_config.enable_hybrid_search, app_config.embedding_dimension) == (False, None)
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.models import SharedEmbedding, MemoryEmbeddingRef
+from app.services.vector_store import NumpyVectorStore
+from app.services.vector_store.shared import SharedEmbeddingStore
+
+
+def random_vector(seed: int, dimension: int = 16) -> list:
+    return np.random.default_rng(seed).standard_normal(dimension).astype(np.float32).tolist()
+
+
+@pytest.fixture
+def session_factory(db):
+    return sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return NumpyVectorStore(str(tmp_path / "vectors"))
+
+
+def shared_store(backend, session_factory) -> SharedEmbeddingStore:
+    return SharedEmbeddingStore(backend, similarity_threshold=0.99, session_factory=session_factory)
+
+
+def add(store: SharedEmbeddingStore, memory_id: int, document: str, embedding: list) -> None:
+    store.add_embeddings([embedding], [document], [memory_id], ["user"], ["app"])
+
+
+def test_two_writers_with_same_content_share_one_vector(db, backend, session_factory):
+    first = shared_store(backend, session_factory)
+    second = shared_store(backend, session_factory)
+    embedding = random_vector(0)
+
+    # 第二个写入方按内容哈希没有找到记录后，第一个写入方提交了相同内容
+    query_embeddings_batch = backend.query_embeddings_batch
+    def query_after_concurrent_write(*args, **kwargs):
+        backend.query_embeddings_batch = query_embeddings_batch
+        add(first, 1, "same content", embedding)
+        return [[] for _ in args[0]]
+    backend.query_embeddings_batch = query_after_concurrent_write
+
+    add(second, 2, "same content", embedding)
+
+    shared_ids = [row.id for row in db.query(SharedEmbedding)]
+    assert len(shared_ids) == 1
+    assert {ref.embedding_id for ref in db.query(MemoryEmbeddingRef)} == set(shared_ids)
+    assert list(backend.get_embeddings(shared_ids)) == shared_ids
+    results = second.query_embeddings(embedding, "user", "app", top_k=5)
+    assert [result["memory_id"] for result in results] == [2, 1]
+
+
+def test_replaced_vector_is_kept_until_commit(db, backend, session_factory):
+    store = shared_store(backend, session_factory)
+    add(store, 1, "old content", random_vector(0))
+    old_id = db.query(SharedEmbedding.id).scalar()
+
+    def failing_add(*args, **kwargs):
+        raise RuntimeError("backend unavailable")
+    backend.add_embeddings = failing_add
+    with pytest.raises(RuntimeError):
+        add(store, 1, "new content", random_vector(1))
+
+    # 事务回滚，原来的引用和后端中的向量都保持不变
+    db.expire_all()
+    assert [(ref.memory_id, ref.embedding_id) for ref in db.query(MemoryEmbeddingRef)] == [(1, old_id)]
+    assert list(backend.get_embeddings([old_id])) == [old_id]
+
+
+def test_orphaned_vectors_are_deleted_after_commit(db, backend, session_factory):
+    store = shared_store(backend, session_factory)
+    add(store, 1, "old content", random_vector(0))
+    add(store, 2, "old content", random_vector(0))
+    old_id = db.query(SharedEmbedding.id).scalar()
+
+    add(store, 1, "new content", random_vector(1))
+    assert old_id in backend.get_embeddings([old_id])
+
+    store.delete_embedding(2)
+    assert backend.get_embeddings([old_id]) == {}
+    db.expire_all()
+    assert db.get(SharedEmbedding, old_id) is None
+    assert [ref.memory_id for ref in db.query(MemoryEmbeddingRef)] == [1]
+
+
+def test_update_with_unchanged_content_keeps_shared_vector(db, backend, session_factory):
+    store = shared_store(backend, session_factory)
+    embedding = random_vector(0)
+    add(store, 1, "content", embedding)
+    old_id = db.query(SharedEmbedding.id).scalar()
+
+    store.update_embeddings([1], [embedding], ["content"])
+
+    db.expire_all()
+    assert [row.id for row in db.query(SharedEmbedding)] == [old_id]
+    assert list(backend.get_embeddings([old_id])) == [old_id]